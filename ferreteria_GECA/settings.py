@@ -26,7 +26,14 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# STATICFILES_STORAGE ya no existe desde Django 5.1. collectstatic pone hash en los nombres y
+# genera variantes .gz y .br (brotli, si está instalado); WhiteNoise sirve las que llevan
+# hash con Cache-Control inmutable de un año, así que una página ya visitada no vuelve a
+# pedir ningún estático.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'ventas.estaticos.EstaticosComprimidos'},
+}
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
@@ -56,12 +63,14 @@ AUTH_USER_MODEL = 'ventas.Usuario'
 
 
 MIDDLEWARE = [
+    'ventas.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ventas.replicas.ReplicasMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -104,6 +113,18 @@ DATABASES = {
 database_url = os.getenv('DATABASE_URL')
 DATABASES['default'] = dj_database_url.parse(database_url)
 
+# Réplicas de lectura: "url1,url2". Las vistas de solo lectura (ventas/replicas.py) consultan
+# una al azar; en pruebas son un espejo de la base principal. Para probarlo en local basta una
+# copia del archivo SQLite como réplica.
+REPLICAS = []
+_urls_replicas = [url.strip() for url in os.getenv('REPLICA_URLS', '').split(',') if url.strip()]
+for _numero, _url in enumerate(_urls_replicas, start=1):
+    DATABASES[f'replica{_numero}'] = {**dj_database_url.parse(_url), 'TEST': {'MIRROR': 'default'}}
+    REPLICAS.append(f'replica{_numero}')
+DATABASE_ROUTERS = ['ventas.replicas.RouterReplicas']
+# Segundos que un navegador lee de la primaria después de escribir (lee lo que acaba de escribir).
+REPLICA_FIJAR_SEGUNDOS = int(os.getenv('REPLICA_FIJAR_SEGUNDOS', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -145,3 +166,69 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# --- Inventario: reintentos ante deadlocks / fallos de serialización ---
+STOCK_REINTENTOS = int(os.getenv('STOCK_REINTENTOS', '5'))
+STOCK_ESPERA_BASE = float(os.getenv('STOCK_ESPERA_BASE', '0.05'))
+STOCK_ESPERA_MAXIMA = float(os.getenv('STOCK_ESPERA_MAXIMA', '1.0'))
+
+# --- Listas paginadas por cursor ---
+PAGINACION_TAMANO = int(os.getenv('PAGINACION_TAMANO', '50'))
+
+# --- Métricas de Prometheus (/metrics) ---
+# Si está vacío, /metrics solo es accesible para superusuarios con sesión.
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+
+# --- Terminales de punto de venta (api/terminal/) ---
+# "sucursal1:token1 sucursal2:token2": cada terminal se identifica con su token Bearer.
+TERMINALES = dict(par.split(':', 1) for par in os.getenv('TERMINALES', '').split() if ':' in par)
+# Ventas por petición de sincronización.
+SINCRONIZACION_MAX_VENTAS = int(os.getenv('SINCRONIZACION_MAX_VENTAS', '500'))
+
+# --- Cola de tareas en segundo plano (ventas/tareas.py, manage.py procesar_tareas) ---
+# Con TAREAS_EN_PROCESO=1 cada worker de gunicorn corre también un trabajador (gunicorn.conf.py).
+TAREAS_EN_PROCESO = os.getenv('TAREAS_EN_PROCESO', '1') == '1'
+TAREAS_HILOS = int(os.getenv('TAREAS_HILOS', '2'))
+TAREAS_INTENTOS = int(os.getenv('TAREAS_INTENTOS', '5'))
+# Segundos antes del primer reintento; se duplica en cada uno.
+TAREAS_ESPERA_BASE = float(os.getenv('TAREAS_ESPERA_BASE', '2'))
+# Una tarea tomada hace más de esto se considera abandonada y otro trabajador la vuelve a tomar.
+TAREAS_VENCIMIENTO = int(os.getenv('TAREAS_VENCIMIENTO', '300'))
+# Cada cuánto mira la cola un trabajador sin trabajo.
+TAREAS_SONDEO = float(os.getenv('TAREAS_SONDEO', '1'))
+# Cada cuánto se rebalancean las franjas de existencia de los productos de alta rotación.
+FRANJAS_REPARTIR_SEGUNDOS = int(os.getenv('FRANJAS_REPARTIR_SEGUNDOS', '3600'))
+
+# --- Caché ---
+# Con varios workers conviene una caché compartida (Redis o archivos); con la caché en
+# memoria cada proceso invalida solo la suya y los demás esperan a que expire.
+if os.getenv('REDIS_URL'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }}
+elif os.getenv('CACHE_DIR'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR'),
+    }}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Vigencia de las listas de Marca/Categoría/Cliente activos (se invalidan al cambiar).
+LISTAS_CACHE_SEGUNDOS = int(os.getenv('LISTAS_CACHE_SEGUNDOS', '300'))
+
+# Vigencia de los reportes de periodos ya cerrados (se invalidan si cambia una venta pasada).
+REPORTES_CACHE_SEGUNDOS = int(os.getenv('REPORTES_CACHE_SEGUNDOS', str(7 * 24 * 3600)))
+
+# Vigencia de los accesos por usuario a TemplateResource (se invalidan al cambiar recursos o grupos).
+ACCESOS_CACHE_SEGUNDOS = int(os.getenv('ACCESOS_CACHE_SEGUNDOS', '3600'))
+
+# --- Archivo frío de ventas (manage.py archivar_ventas) ---
+ARCHIVO_DIR = os.getenv('ARCHIVO_DIR', os.path.join(BASE_DIR, 'archivo'))
+# Años cerrados que se quedan en la base además del actual.
+ARCHIVO_ANIOS_VIVOS = int(os.getenv('ARCHIVO_ANIOS_VIVOS', '2'))
+
+# --- Consultas concurrentes en vistas asíncronas (dashboard, detalle de venta) ---
+CONSULTAS_CONCURRENTES = os.getenv('CONSULTAS_CONCURRENTES', '1') == '1'
+CONSULTAS_HILOS = int(os.getenv('CONSULTAS_HILOS', '8'))
@@ -0,0 +1,38 @@
+# Configuración de gunicorn (se lee automáticamente desde el directorio de trabajo).
+import os
+import shutil
+import tempfile
+
+# Directorio compartido para que /metrics sume los valores de todos los workers.
+# Debe definirse antes de que los workers importen prometheus_client.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'geca_metricas'))
+
+
+def on_starting(server):
+    # Los archivos de una ejecución anterior duplicarían los contadores
+    directorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.makedirs(directorio, exist_ok=True)
+
+
+def post_worker_init(worker):
+    # Las tareas de la cola (resúmenes de ventas) corren en un hilo de cada worker; sin esto
+    # hace falta un `manage.py procesar_tareas` aparte.
+    from django.conf import settings
+    if settings.TAREAS_EN_PROCESO:
+        from ventas.tareas import iniciar_en_proceso
+        iniciar_en_proceso()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+# WSGI por defecto; con GUNICORN_ASGI=1 se atiende con workers de uvicorn y la aplicación ASGI,
+# donde las vistas asíncronas (dashboard, detalle de venta) no bloquean el worker.
+if os.environ.get('GUNICORN_ASGI') == '1':
+    wsgi_app = 'ferreteria_GECA.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'ferreteria_GECA.wsgi:application'
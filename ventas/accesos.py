@@ -0,0 +1,124 @@
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.http import HttpResponseForbidden
+
+from .models import TemplateResource, Usuario
+
+# Acceso a secciones por TemplateResource: un usuario entra a `codename` si lo tiene
+# directo (users) o por alguno de sus grupos (groups). Un codename sin TemplateResource
+# queda abierto a todo usuario con sesión; los superusuarios entran a todo.
+#
+# Por usuario se guarda en la caché (versión, permitidos, controlados). La versión es
+# global y cambia con cualquier cambio de recursos o de grupos: revisar un acceso es
+# un solo get_many (versión + registro del usuario), sin consultas a la base.
+
+CLAVE_VERSION = 'accesos:version'
+
+
+def _clave_usuario(usuario_id):
+    return f'accesos:usuario:{usuario_id}'
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Igual que en las listas: no se vuelve a 1 para no reutilizar registros viejos
+        cache.add(CLAVE_VERSION, int(time.time() * 1000), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def _calcular(usuario):
+    permitidos = frozenset(
+        TemplateResource.objects.filter(Q(users=usuario) | Q(groups__user=usuario))
+        .values_list('codename', flat=True).distinct()
+    )
+    controlados = frozenset(TemplateResource.objects.values_list('codename', flat=True))
+    return permitidos, controlados
+
+
+def recursos_de(usuario):
+    """(permitidos, controlados) del usuario: codenames a los que tiene acceso y todos los registrados."""
+    # Se guarda en el usuario de la petición: varias revisiones cuestan una sola lectura
+    memoria = getattr(usuario, '_recursos', None)
+    if memoria is not None:
+        return memoria
+    clave = _clave_usuario(usuario.pk)
+    guardados = cache.get_many([CLAVE_VERSION, clave])
+    version = guardados.get(CLAVE_VERSION)
+    registro = guardados.get(clave)
+    if version is None or registro is None or registro[0] != version:
+        version = version if version is not None else _version()
+        registro = (version, *_calcular(usuario))
+        cache.set(clave, registro, getattr(settings, 'ACCESOS_CACHE_SEGUNDOS', 3600))
+    usuario._recursos = registro[1:]
+    return usuario._recursos
+
+
+def tiene_acceso(usuario, codename):
+    if not usuario.is_authenticated or not usuario.is_active:
+        return False
+    if usuario.is_superuser:
+        return True
+    permitidos, controlados = recursos_de(usuario)
+    return codename in permitidos or codename not in controlados
+
+
+def requiere_recurso(codename):
+    """Vista accesible solo a usuarios con acceso a `codename`; los demás reciben 403.
+
+    Va debajo de @login_required. Sirve para vistas síncronas y asíncronas.
+    """
+    def decorador(vista):
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura(request, *args, **kwargs):
+                usuario = await request.auser()
+                if not await sync_to_async(tiene_acceso)(usuario, codename):
+                    return HttpResponseForbidden()
+                return await vista(request, *args, **kwargs)
+        else:
+            @wraps(vista)
+            def envoltura(request, *args, **kwargs):
+                if not tiene_acceso(request.user, codename):
+                    return HttpResponseForbidden()
+                return vista(request, *args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def invalidar_accesos():
+    """Cambia la versión global; los registros de todos los usuarios se recalculan al leerse."""
+    def cambiar_version():
+        try:
+            cache.incr(CLAVE_VERSION)
+        except ValueError:
+            _version()
+
+    cambiar_version()
+    # Otra petición pudo recalcular con datos previos al commit: se invalida de nuevo al confirmar
+    if connection.in_atomic_block:
+        transaction.on_commit(cambiar_version)
+
+
+def _al_cambiar(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        invalidar_accesos()
+
+
+# Accesos de recursos a grupos y usuarios, y pertenencia de usuarios a grupos (en ambos sentidos)
+for _relacion in (TemplateResource.groups.through, TemplateResource.users.through, Usuario.groups.through):
+    m2m_changed.connect(_al_cambiar, sender=_relacion, dispatch_uid=f'accesos_{_relacion.__name__}')
+# Un recurso nuevo, renombrado o borrado cambia los controlados; borrar un grupo borra
+# sus filas intermedias sin emitir m2m_changed
+post_save.connect(_al_cambiar, sender=TemplateResource, dispatch_uid='accesos_recurso_save')
+post_delete.connect(_al_cambiar, sender=TemplateResource, dispatch_uid='accesos_recurso_delete')
+post_delete.connect(_al_cambiar, sender=Group, dispatch_uid='accesos_grupo_delete')
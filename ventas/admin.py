@@ -1,3 +1,95 @@
-from django.contrib import admin
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+
+from .importar import importar_productos, TAMANO_LOTE
+from .models import Producto, MovimientoInventario, TemplateResource
 
 # Register your models here.
+class ImportarProductosForm(forms.Form):
+    archivo = forms.FileField(label='Archivo CSV')
+    actualizar_existencia = forms.BooleanField(
+        label='Reemplazar la existencia de los productos ya registrados', required=False,
+    )
+
+
+@admin.register(Producto)
+class ProductoAdmin(admin.ModelAdmin):
+    list_display = ('Codigo', 'NombreProducto', 'Marca', 'Categoria', 'Precio', 'Existencia')
+    list_select_related = ('Marca', 'Categoria')
+    search_fields = ('Codigo', 'NombreProducto')
+    change_list_template = 'admin/ventas/producto/change_list.html'
+
+    def get_readonly_fields(self, request, obj=None):
+        # Una vez creado, la existencia solo cambia por la capa de inventario (y queda en la bitácora)
+        if obj is not None:
+            return ('Existencia',)
+        return ()
+
+    def get_urls(self):
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='ventas_producto_importar'),
+        ] + super().get_urls()
+
+    def importar_view(self, request):
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            return redirect(reverse('admin:ventas_producto_changelist'))
+
+        resultado = None
+        if request.method == 'POST':
+            form = ImportarProductosForm(request.POST, request.FILES)
+            if form.is_valid():
+                archivo = io.TextIOWrapper(form.cleaned_data['archivo'].file, encoding='utf-8-sig', newline='')
+                try:
+                    resultado = importar_productos(
+                        archivo,
+                        tamano_lote=TAMANO_LOTE,
+                        actualizar_existencia=form.cleaned_data['actualizar_existencia'],
+                    )
+                except UnicodeDecodeError:
+                    form.add_error('archivo', 'El archivo debe estar en UTF-8.')
+                else:
+                    nivel = messages.WARNING if resultado.errores else messages.SUCCESS
+                    self.message_user(request, f"Importación terminada: {resultado}", nivel)
+        else:
+            form = ImportarProductosForm()
+
+        contexto = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar productos',
+            'form': form,
+            'resultado': resultado,
+        }
+        return TemplateResponse(request, 'admin/ventas/producto/importar.html', contexto)
+
+
+@admin.register(MovimientoInventario)
+class MovimientoInventarioAdmin(admin.ModelAdmin):
+    list_display = ('Fecha', 'Producto', 'Tipo', 'Cantidad', 'Referencia')
+    list_filter = ('Tipo',)
+    list_select_related = ('Producto',)
+    search_fields = ('Producto__NombreProducto', 'Producto__Codigo')
+    date_hierarchy = 'Fecha'
+    raw_id_fields = ('Producto',)
+
+    # La bitácora es de solo inserción
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TemplateResource)
+class TemplateResourceAdmin(admin.ModelAdmin):
+    list_display = ('codename', 'nombre')
+    search_fields = ('codename', 'nombre')
+    filter_horizontal = ('groups', 'users')
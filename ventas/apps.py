@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class VentasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ventas'
+
+    def ready(self):
+        # Conecta las señales que invalidan la caché de listas de referencia y de reportes,
+        # las que mantienen el resumen diario al borrar ventas, las que cambian la versión de
+        # catálogo de los productos y las de accesos por usuario; registra las tareas de la cola
+        from . import accesos, inventario, listas, particiones, reportes, resumenes, sincronizacion  # noqa: F401
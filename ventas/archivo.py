@@ -0,0 +1,318 @@
+import csv
+import gzip
+import json
+import shutil
+from bisect import bisect_left, bisect_right
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .exportar import FILAS_POR_LOTE, _nombre
+from .models import Categoria, Cliente, Marca, Producto, Venta, VentaDetalle
+
+# Archivo frío de ventas: cada año cerrado se guarda en ARCHIVO_DIR/<año>/ y se borra de
+# la base. Dentro de un año las filas van en grupos de FILAS_POR_GRUPO y cada columna de
+# cada grupo es un CSV de una sola columna comprimido con gzip (los valores repetidos de
+# una columna comprimen mucho mejor juntos). manifiesto.json guarda, por grupo, el rango
+# de Id_Venta y de fechas, así que una búsqueda solo descomprime el grupo y las columnas
+# que necesita. Ambas tablas se ordenan por Id_Venta.
+#
+# Los años se archivan en orden: todo lo anterior a limite() está en el archivo y ya no
+# se lee de la base.
+FILAS_POR_GRUPO = 20_000
+MANIFIESTO = 'manifiesto.json'
+
+COLUMNAS = {
+    'ventas': [
+        ('Id_Venta', int), ('Fecha_Venta', date.fromisoformat), ('Cliente_id', int), ('Cliente', str),
+        ('Total', Decimal),
+    ],
+    'detalles': [
+        ('Venta_id', int), ('id', int), ('Fecha_Venta', date.fromisoformat), ('Cliente_id', int), ('Cliente', str),
+        ('Producto_id', int), ('Producto', str), ('Marca_id', int), ('Marca', str),
+        ('Categoria_id', int), ('Categoria', str),
+        ('CantidadVendida', int), ('PrecioUnitario', Decimal), ('SubTotal', Decimal),
+    ],
+}
+LLAVE = {'ventas': 'Id_Venta', 'detalles': 'Venta_id'}
+
+
+def directorio():
+    return Path(getattr(settings, 'ARCHIVO_DIR', Path(settings.BASE_DIR) / 'archivo'))
+
+
+# --- Lectura ------------------------------------------------------------------
+
+@lru_cache(maxsize=64)
+def _leer_manifiesto(ruta, modificado):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def manifiestos():
+    """{año: manifiesto} de los años archivados."""
+    resultado = {}
+    if not directorio().is_dir():
+        return resultado
+    for ruta in directorio().glob(f'*/{MANIFIESTO}'):
+        if ruta.parent.name.isdigit():
+            resultado[int(ruta.parent.name)] = _leer_manifiesto(str(ruta), ruta.stat().st_mtime_ns)
+    return dict(sorted(resultado.items()))
+
+
+def limite():
+    """Primer día que sigue en la base (None si no hay nada archivado)."""
+    anios = manifiestos()
+    return date(max(anios) + 1, 1, 1) if anios else None
+
+
+def _ruta_columna(carpeta, tabla, grupo, columna):
+    return Path(carpeta) / f'{tabla}-{grupo:04d}.{columna}.csv.gz'
+
+
+def _leer_columna(carpeta, tabla, grupo, columna):
+    tipo = dict(COLUMNAS[tabla])[columna]
+    with gzip.open(_ruta_columna(carpeta, tabla, grupo, columna), 'rt', encoding='utf-8', newline='') as archivo:
+        return [tipo(fila[0]) for fila in csv.reader(archivo)]
+
+
+# Pocos grupos en memoria: uno de líneas con todas sus columnas ocupa decenas de MB
+@lru_cache(maxsize=4)
+def _columnas_grupo(carpeta, modificado, tabla, grupo, columnas):
+    return {columna: _leer_columna(carpeta, tabla, grupo, columna) for columna in columnas}
+
+
+def _grupo(anio, manifiesto, tabla, grupo, columnas):
+    carpeta = directorio() / str(anio)
+    return _columnas_grupo(str(carpeta), manifiesto['creado'], tabla, grupo, tuple(columnas))
+
+
+def buscar_venta(pk):
+    """La venta archivada `pk` y sus líneas como instancias sin guardar, o None.
+
+    Las instancias (con su cliente, productos y marcas) sirven para las mismas
+    plantillas que las de la base; el nombre del cliente va completo en PrimerNombre.
+    """
+    for anio, manifiesto in manifiestos().items():
+        for numero, grupo in enumerate(manifiesto['tablas']['ventas']['grupos']):
+            if not grupo['id_min'] <= pk <= grupo['id_max']:
+                continue
+            columnas = _grupo(anio, manifiesto, 'ventas', numero, [c for c, _ in COLUMNAS['ventas']])
+            fila = bisect_left(columnas['Id_Venta'], pk)
+            if fila == len(columnas['Id_Venta']) or columnas['Id_Venta'][fila] != pk:
+                continue
+            venta = Venta(
+                Id_Venta=pk, Fecha_Venta=columnas['Fecha_Venta'][fila], Total=columnas['Total'][fila],
+                Cliente=Cliente(pk=columnas['Cliente_id'][fila], PrimerNombre=columnas['Cliente'][fila]),
+            )
+            return venta, _detalles_de(anio, manifiesto, venta)
+    return None
+
+
+def _detalles_de(anio, manifiesto, venta):
+    detalles = []
+    for numero, grupo in enumerate(manifiesto['tablas']['detalles']['grupos']):
+        if not grupo['id_min'] <= venta.pk <= grupo['id_max']:
+            continue
+        columnas = _grupo(anio, manifiesto, 'detalles', numero, [c for c, _ in COLUMNAS['detalles']])
+        ids = columnas['Venta_id']
+        for fila in range(bisect_left(ids, venta.pk), bisect_right(ids, venta.pk)):
+            producto = Producto(
+                pk=columnas['Producto_id'][fila], NombreProducto=columnas['Producto'][fila],
+                Marca=Marca(pk=columnas['Marca_id'][fila], NombreMarca=columnas['Marca'][fila]),
+                Categoria=Categoria(pk=columnas['Categoria_id'][fila], NombreCategoria=columnas['Categoria'][fila]),
+            )
+            detalles.append(VentaDetalle(
+                pk=columnas['id'][fila], Venta=venta, Producto=producto, Fecha_Venta=venta.Fecha_Venta,
+                CantidadVendida=columnas['CantidadVendida'][fila],
+                PrecioUnitario=columnas['PrecioUnitario'][fila], SubTotal=columnas['SubTotal'][fila],
+            ))
+    return detalles
+
+
+def filas_detalles(desde, hasta, columnas):
+    """Tuplas con `columnas` de las líneas archivadas con fecha en [desde, hasta].
+
+    Solo se descomprimen los grupos cuyo rango de fechas toca el pedido.
+    """
+    leidas = ['Fecha_Venta', *[c for c in columnas if c != 'Fecha_Venta']]
+    posiciones = [leidas.index(c) for c in columnas]
+    for anio, manifiesto in manifiestos().items():
+        if anio < desde.year or anio > hasta.year:
+            continue
+        for numero, grupo in enumerate(manifiesto['tablas']['detalles']['grupos']):
+            if grupo['hasta'] < desde.isoformat() or grupo['desde'] > hasta.isoformat():
+                continue
+            datos = _grupo(anio, manifiesto, 'detalles', numero, leidas)
+            for fila in zip(*(datos[c] for c in leidas)):
+                if desde <= fila[0] <= hasta:
+                    yield tuple(fila[i] for i in posiciones)
+
+
+# --- Escritura ----------------------------------------------------------------
+
+def _filas_ventas(desde, hasta):
+    ventas = Venta.objects.filter(Fecha_Venta__gte=desde, Fecha_Venta__lte=hasta).order_by('Id_Venta')
+    for id_venta, fecha, id_cliente, nombre1, nombre2, apellido1, apellido2, total in ventas.values_list(
+        'Id_Venta', 'Fecha_Venta', 'Cliente_id',
+        'Cliente__PrimerNombre', 'Cliente__SegundoNombre', 'Cliente__PrimerApellido', 'Cliente__SegundoApellido',
+        'Total',
+    ).iterator(chunk_size=FILAS_POR_LOTE):
+        yield [id_venta, fecha, id_cliente, _nombre(nombre1, nombre2, apellido1, apellido2), total]
+
+
+def _filas_detalles(desde, hasta):
+    detalles = VentaDetalle.objects.filter(Fecha_Venta__gte=desde, Fecha_Venta__lte=hasta).order_by('Venta_id', 'id')
+    for (id_venta, id_detalle, fecha, id_cliente, nombre1, nombre2, apellido1, apellido2,
+         *producto_a_subtotal) in detalles.values_list(
+        'Venta_id', 'id', 'Fecha_Venta', 'Venta__Cliente_id',
+        'Venta__Cliente__PrimerNombre', 'Venta__Cliente__SegundoNombre',
+        'Venta__Cliente__PrimerApellido', 'Venta__Cliente__SegundoApellido',
+        'Producto_id', 'Producto__NombreProducto', 'Producto__Marca_id', 'Producto__Marca__NombreMarca',
+        'Producto__Categoria_id', 'Producto__Categoria__NombreCategoria',
+        'CantidadVendida', 'PrecioUnitario', 'SubTotal',
+    ).iterator(chunk_size=FILAS_POR_LOTE):
+        yield [id_venta, id_detalle, fecha, id_cliente, _nombre(nombre1, nombre2, apellido1, apellido2),
+               *producto_a_subtotal]
+
+
+FILAS = {'ventas': _filas_ventas, 'detalles': _filas_detalles}
+
+
+def _escribir_grupo(carpeta, tabla, numero, filas):
+    nombres = [c for c, _ in COLUMNAS[tabla]]
+    for i, columna in enumerate(nombres):
+        with gzip.open(_ruta_columna(carpeta, tabla, numero, columna), 'wt', encoding='utf-8',
+                       newline='', compresslevel=9) as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerows([fila[i].isoformat() if isinstance(fila[i], date) else fila[i]] for fila in filas)
+    llaves = [fila[nombres.index(LLAVE[tabla])] for fila in filas]
+    fechas = [fila[nombres.index('Fecha_Venta')] for fila in filas]
+    return {
+        'filas': len(filas), 'id_min': llaves[0], 'id_max': llaves[-1],
+        'desde': min(fechas).isoformat(), 'hasta': max(fechas).isoformat(),
+    }
+
+
+def _escribir_tabla(carpeta, tabla, desde, hasta):
+    grupos, filas = [], []
+    for fila in FILAS[tabla](desde, hasta):
+        filas.append(fila)
+        if len(filas) == FILAS_POR_GRUPO:
+            grupos.append(_escribir_grupo(carpeta, tabla, len(grupos), filas))
+            filas = []
+    if filas:
+        grupos.append(_escribir_grupo(carpeta, tabla, len(grupos), filas))
+    return {'columnas': [c for c, _ in COLUMNAS[tabla]], 'grupos': grupos}
+
+
+def _totales_archivados(carpeta, manifiesto):
+    totales = {'ventas': 0, 'detalles': 0, 'monto': Decimal('0.00'), 'unidades': 0}
+    for tabla in ('ventas', 'detalles'):
+        for numero in range(len(manifiesto['tablas'][tabla]['grupos'])):
+            totales[tabla] += len(_leer_columna(carpeta, tabla, numero, LLAVE[tabla]))
+            if tabla == 'detalles':
+                totales['monto'] += sum(_leer_columna(carpeta, tabla, numero, 'SubTotal'))
+                totales['unidades'] += sum(_leer_columna(carpeta, tabla, numero, 'CantidadVendida'))
+    return totales
+
+
+def archivar_anio(anio):
+    """Escribe las ventas de `anio` al archivo y lo verifica contra la base; devuelve el manifiesto.
+
+    No borra nada. El año debe estar cerrado y ser el siguiente sin archivar: no puede
+    quedar en la base ninguna venta de un año anterior fuera del archivo.
+    """
+    if anio >= timezone.localdate().year:
+        raise ValueError("Solo se archivan años cerrados.")
+    desde, hasta = date(anio, 1, 1), date(anio, 12, 31)
+    archivado_hasta = limite()
+    if archivado_hasta and desde < archivado_hasta:
+        raise ValueError(f"El año {anio} ya está archivado.")
+    pendientes = Venta.objects.filter(Fecha_Venta__lt=desde)
+    if archivado_hasta:
+        pendientes = pendientes.filter(Fecha_Venta__gte=archivado_hasta)
+    if pendientes.exists():
+        raise ValueError(f"Hay años anteriores a {anio} sin archivar; se archivan en orden.")
+
+    temporal = directorio() / f'{anio}.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    temporal.mkdir(parents=True)
+    manifiesto = {
+        'anio': anio,
+        'creado': timezone.now().isoformat(),
+        'tablas': {tabla: _escribir_tabla(temporal, tabla, desde, hasta) for tabla in COLUMNAS},
+    }
+    en_base = VentaDetalle.objects.filter(Fecha_Venta__gte=desde, Fecha_Venta__lte=hasta).aggregate(
+        detalles=Count('id'), monto=Sum('SubTotal'), unidades=Sum('CantidadVendida'),
+    )
+    en_base['ventas'] = Venta.objects.filter(Fecha_Venta__gte=desde, Fecha_Venta__lte=hasta).count()
+
+    # Se vuelve a leer lo escrito y se compara con la base: si un año cerrado cambió
+    # mientras se escribía, no cuadra y no se da por bueno
+    archivado = _totales_archivados(temporal, manifiesto)
+    esperado = {
+        'ventas': en_base['ventas'], 'detalles': en_base['detalles'],
+        'monto': Decimal(en_base['monto'] or 0).quantize(Decimal('0.01')), 'unidades': en_base['unidades'] or 0,
+    }
+    if archivado != esperado:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise ValueError(f"El archivo de {anio} no coincide con la base: {archivado} != {esperado}")
+    manifiesto['totales'] = {**archivado, 'monto': str(archivado['monto'])}
+    with open(temporal / MANIFIESTO, 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, indent=1)
+    temporal.rename(directorio() / str(anio))
+    return manifiesto
+
+
+def borrar_archivado(anio, lote=1000):
+    """Borra de la base, en transacciones de `lote` ventas, las ventas de `anio` ya archivadas.
+
+    Se borra por Id_Venta del archivo: una venta del año que no está archivada se queda.
+    Se puede repetir si se interrumpe. Devuelve el número de ventas borradas.
+    """
+    manifiesto = manifiestos().get(anio)
+    if manifiesto is None:
+        raise ValueError(f"El año {anio} no está archivado.")
+    q = connection.ops.quote_name
+    fechas = f"{q('Fecha_Venta')} >= %s AND {q('Fecha_Venta')} <= %s"
+    rango = [date(anio, 1, 1), date(anio, 12, 31)]
+    borradas = 0
+    for numero in range(len(manifiesto['tablas']['ventas']['grupos'])):
+        ids = _leer_columna(directorio() / str(anio), 'ventas', numero, 'Id_Venta')
+        for inicio in range(0, len(ids), lote):
+            parte = ids[inicio:inicio + lote]
+            marcas = ', '.join(['%s'] * len(parte))
+            # SQL directo: el borrado del ORM cargaría cada venta para enviar sus señales
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {q(VentaDetalle._meta.db_table)} WHERE {fechas} AND {q('Venta_id')} IN ({marcas})",
+                    [*rango, *parte],
+                )
+                cursor.execute(
+                    f"DELETE FROM {q(Venta._meta.db_table)} WHERE {fechas} AND {q('Id_Venta')} IN ({marcas})",
+                    [*rango, *parte],
+                )
+                borradas += cursor.rowcount
+    return borradas
+
+
+def anios_para_archivar():
+    """Años cerrados con ventas en la base y más viejos que ARCHIVO_ANIOS_VIVOS años, en orden."""
+    ultimo = timezone.localdate().year - getattr(settings, 'ARCHIVO_ANIOS_VIVOS', 2) - 1
+    ventas = Venta.objects.filter(Fecha_Venta__lte=date(ultimo, 12, 31))
+    if limite():
+        ventas = ventas.filter(Fecha_Venta__gte=limite())
+    primera = ventas.order_by('Fecha_Venta').values_list('Fecha_Venta', flat=True).first()
+    return list(range(primera.year, ultimo + 1)) if primera else []
+
+
+def ventas_fuera_del_archivo(anio):
+    """Ventas de un año archivado que siguen en la base (por ejemplo, capturadas después)."""
+    return Venta.objects.filter(Fecha_Venta__gte=date(anio, 1, 1), Fecha_Venta__lt=date(anio + 1, 1, 1)).count()
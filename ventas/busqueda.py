@@ -0,0 +1,69 @@
+from functools import reduce
+
+from django.db import connection
+from django.db.models import Q, Case, When, Value, IntegerField, FloatField, Func, F
+
+from .models import Producto
+
+RESULTADOS_POR_PAGINA = 20
+
+
+def _filtro_terminos(consulta):
+    """Cada palabra debe aparecer en el nombre, la descripción, la marca o la categoría.
+
+    `icontains` se traduce a UPPER(col) LIKE UPPER('%...%'); en Postgres lo resuelve
+    el índice GIN de trigramas sobre UPPER(col) creado en la migración 0005.
+    """
+    condiciones = [
+        Q(NombreProducto__icontains=termino)
+        | Q(Descripcion__icontains=termino)
+        | Q(Marca__NombreMarca__icontains=termino)
+        | Q(Categoria__NombreCategoria__icontains=termino)
+        for termino in consulta.split()
+    ]
+    return reduce(lambda a, b: a & b, condiciones)
+
+
+def _relevancia(consulta):
+    if connection.vendor == 'postgresql':
+        # pg_trgm: qué tanto se parece la consulta a alguna palabra del nombre
+        return Func(Value(consulta), F('NombreProducto'), function='word_similarity', output_field=FloatField())
+    # Alternativa portable (SQLite en pruebas): primero los que empiezan con la consulta
+    return Case(
+        When(NombreProducto__istartswith=consulta, then=Value(3)),
+        When(NombreProducto__icontains=consulta, then=Value(2)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+
+
+def buscar_productos(consulta, pagina=1, por_pagina=RESULTADOS_POR_PAGINA):
+    """Busca productos ordenados por relevancia. Devuelve (productos, hay_mas)."""
+    consulta = (consulta or '').strip()
+    productos = Producto.objects.select_related('Marca', 'Categoria')
+    if consulta:
+        productos = (
+            productos.filter(_filtro_terminos(consulta))
+            .annotate(relevancia=_relevancia(consulta))
+            .order_by('-relevancia', 'NombreProducto', 'Id_Producto')
+        )
+    else:
+        productos = productos.order_by('NombreProducto', 'Id_Producto')
+
+    inicio = (max(pagina, 1) - 1) * por_pagina
+    filas = list(productos[inicio:inicio + por_pagina + 1])
+    return filas[:por_pagina], len(filas) > por_pagina
+
+
+def producto_a_resultado(producto):
+    """Formato de resultado que espera Select2, con precio y existencia incluidos."""
+    return {
+        'id': producto.Id_Producto,
+        'text': producto.NombreProducto,
+        'descripcion': producto.Descripcion,
+        'marca': producto.Marca.NombreMarca,
+        'categoria': producto.Categoria.NombreCategoria,
+        'precio': str(producto.Precio),
+        'existencia': producto.Existencia,
+        'disabled': producto.Existencia <= 0,
+    }
@@ -0,0 +1,65 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .metricas import medir_en_hilo
+
+# El ORM asíncrono de Django ejecuta cada consulta en el mismo hilo (thread_sensitive),
+# así que varias consultas "en paralelo" se terminan haciendo una tras otra. Para que
+# de verdad corran a la vez cada una va a un hilo de este grupo, con su propia conexión.
+_hilos = None
+
+
+def _grupo():
+    global _hilos
+    if _hilos is None:
+        _hilos = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'CONSULTAS_HILOS', 8), thread_name_prefix='consultas',
+        )
+    return _hilos
+
+
+def _en_hilo(funcion):
+    # Los hilos del grupo viven lo que el proceso: como en una petición, su conexión se
+    # reutiliza mientras no pase CONN_MAX_AGE ni quede en error, sin una consulta extra
+    # para revisarla, y se cierra al terminar si ya venció.
+    close_old_connections()
+    try:
+        with medir_en_hilo():
+            return funcion()
+    finally:
+        close_old_connections()
+
+
+def _en_serie(tareas):
+    return {nombre: funcion() for nombre, funcion in tareas.items()}
+
+
+def _puede_paralelizar():
+    # Dentro de una transacción (ATOMIC_REQUESTS, pruebas) otra conexión no vería los
+    # datos sin confirmar, así que se usa la conexión de la petición. SQLite corre dentro
+    # del proceso y no gana nada con hilos extra (solo el costo de abrir conexiones).
+    return not connection.in_atomic_block and connection.vendor != 'sqlite'
+
+
+async def consultas_concurrentes(**tareas):
+    """Ejecuta funciones síncronas e independientes de consulta a la vez y devuelve {nombre: resultado}.
+
+    La latencia queda cerca de la consulta más lenta en lugar de la suma de todas.
+    Con CONSULTAS_CONCURRENTES = False, dentro de una transacción o con SQLite se ejecutan en serie.
+    """
+    if not getattr(settings, 'CONSULTAS_CONCURRENTES', True) or len(tareas) < 2 \
+            or not await sync_to_async(_puede_paralelizar)():
+        return await sync_to_async(_en_serie)(tareas)
+
+    loop = asyncio.get_running_loop()
+    # run_in_executor no copia el contexto: sin esto los hilos no verían la réplica de la petición
+    resultados = await asyncio.gather(*(
+        loop.run_in_executor(_grupo(), contextvars.copy_context().run, _en_hilo, funcion)
+        for funcion in tareas.values()
+    ))
+    return dict(zip(tareas, resultados))
@@ -0,0 +1,14 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class EstaticosComprimidos(CompressedManifestStaticFilesStorage):
+    """Nombres con hash y variantes comprimidas de WhiteNoise.
+
+    Sin collectstatic (pruebas, o DEBUG desactivado en desarrollo) no hay manifiesto:
+    los archivos se nombran tal cual en lugar de fallar.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
@@ -0,0 +1,92 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .inventario import bloquear_productos, escribir_existencias, existencias_actuales
+from .models import ExistenciaCorte, MovimientoInventario
+
+
+def fin_del_dia(fecha):
+    """Primer instante del día siguiente (límite exclusivo) en la zona horaria actual."""
+    return timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min))
+
+
+def existencia_en(fecha, productos=None):
+    """Existencia al cierre de `fecha`: {producto_id: existencia}; los que no aparecen tienen 0.
+
+    Parte del último corte anterior o igual a `fecha` y le suma solo los movimientos
+    posteriores a ese corte, así que el costo no depende del largo de la bitácora.
+    Sin cortes se suma la bitácora completa.
+    """
+    cortes = ExistenciaCorte.objects.filter(Fecha__lte=fecha)
+    movimientos = MovimientoInventario.objects.filter(Fecha__lt=fin_del_dia(fecha))
+    if productos is not None:
+        productos = list(productos)
+        cortes = cortes.filter(Producto__in=productos)
+        movimientos = movimientos.filter(Producto__in=productos)
+
+    existencias = {}
+    ultimo_corte = cortes.aggregate(fecha=Max('Fecha'))['fecha']
+    if ultimo_corte is not None:
+        # Un producto sin fila en el corte tenía existencia 0 ese día
+        existencias = dict(cortes.filter(Fecha=ultimo_corte).values_list('Producto_id', 'Existencia'))
+        movimientos = movimientos.filter(Fecha__gte=fin_del_dia(ultimo_corte))
+
+    for producto_id, cantidad in (movimientos.order_by().values('Producto_id')
+                                  .annotate(total=Sum('Cantidad')).values_list('Producto_id', 'total')):
+        existencias[producto_id] = existencias.get(producto_id, 0) + cantidad
+    return existencias
+
+
+@transaction.atomic
+def generar_corte(fecha):
+    """Guarda la existencia de todos los productos al cierre de `fecha` (un día ya terminado)."""
+    if fecha >= timezone.localdate():
+        raise ValueError("Solo se puede cortar un día ya terminado.")
+    existencias = existencia_en(fecha)
+    ExistenciaCorte.objects.filter(Fecha=fecha).delete()
+    ExistenciaCorte.objects.bulk_create([
+        ExistenciaCorte(Fecha=fecha, Producto_id=producto_id, Existencia=existencia)
+        for producto_id, existencia in existencias.items()
+        if existencia
+    ], batch_size=2000)
+    return len(existencias)
+
+
+def _comparar(actuales, productos=None):
+    segun_bitacora = existencia_en(timezone.localdate(), productos)
+    return [
+        (producto_id, existencia, segun_bitacora.get(producto_id, 0))
+        for producto_id, existencia in sorted(actuales.items())
+        if segun_bitacora.get(producto_id, 0) != existencia
+    ]
+
+
+def conciliar_existencias(corregir=None):
+    """Compara la existencia con la bitácora: lista de (producto_id, existencia, según bitácora).
+
+    En los productos con franjas se compara la suma de las franjas. Las diferencias
+    se confirman con los productos bloqueados, para no confundir una venta en curso
+    con un descuadre. `corregir`:
+    - 'proyeccion': reescribe Existencia con el valor de la bitácora.
+    - 'bitacora': agrega movimientos de ajuste para que la bitácora cuadre con Existencia.
+    """
+    candidatos = [producto_id for producto_id, _, _ in _comparar(existencias_actuales())]
+    if not candidatos:
+        return []
+    with transaction.atomic():
+        productos = bloquear_productos(candidatos)
+        diferencias = _comparar({producto_id: p.Existencia for producto_id, p in productos.items()}, candidatos)
+        if corregir == 'proyeccion':
+            escribir_existencias(productos, {
+                producto_id: calculada - existencia for producto_id, existencia, calculada in diferencias
+            })
+        elif corregir == 'bitacora':
+            MovimientoInventario.objects.bulk_create([
+                MovimientoInventario(Producto_id=producto_id, Tipo=MovimientoInventario.AJUSTE,
+                                     Cantidad=existencia - calculada)
+                for producto_id, existencia, calculada in diferencias
+            ])
+    return diferencias
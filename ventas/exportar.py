@@ -0,0 +1,95 @@
+import csv
+import zlib
+
+from .models import Venta, VentaDetalle
+
+# Filas que se leen de la base por viaje (cursor del lado del servidor en Postgres)
+FILAS_POR_LOTE = 2000
+# Tamaño aproximado de cada trozo que se envía al cliente
+BYTES_POR_TROZO = 64 * 1024
+
+ENCABEZADO_VENTAS = ['Id_Venta', 'Fecha_Venta', 'Id_Cliente', 'Cliente', 'Total']
+ENCABEZADO_DETALLES = [
+    'Id_Venta', 'Fecha_Venta', 'Id_Cliente', 'Cliente', 'Id_Producto', 'Producto',
+    'Marca', 'Categoria', 'CantidadVendida', 'PrecioUnitario', 'SubTotal',
+]
+
+
+class _Eco:
+    """Objeto tipo archivo para csv.writer que devuelve lo escrito en vez de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def _nombre(*partes):
+    return ' '.join(p for p in partes if p)
+
+
+def _filtrar(queryset, campo_fecha, desde, hasta):
+    if desde:
+        queryset = queryset.filter(**{f'{campo_fecha}__gte': desde})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo_fecha}__lte': hasta})
+    return queryset
+
+
+def filas_ventas(desde=None, hasta=None):
+    ventas = _filtrar(Venta.objects.all(), 'Fecha_Venta', desde, hasta).order_by('Fecha_Venta', 'Id_Venta')
+    for (id_venta, fecha, id_cliente, nombre1, nombre2, apellido1, apellido2, total) in ventas.values_list(
+        'Id_Venta', 'Fecha_Venta', 'Cliente_id',
+        'Cliente__PrimerNombre', 'Cliente__SegundoNombre', 'Cliente__PrimerApellido', 'Cliente__SegundoApellido',
+        'Total',
+    ).iterator(chunk_size=FILAS_POR_LOTE):
+        yield [id_venta, fecha.isoformat(), id_cliente, _nombre(nombre1, nombre2, apellido1, apellido2), total]
+
+
+def filas_detalles(desde=None, hasta=None):
+    detalles = _filtrar(VentaDetalle.objects.all(), 'Fecha_Venta', desde, hasta).order_by(
+        'Fecha_Venta', 'Venta_id', 'id',
+    )
+    for (id_venta, fecha, id_cliente, nombre1, nombre2, apellido1, apellido2, id_producto, producto,
+         marca, categoria, cantidad, precio, subtotal) in detalles.values_list(
+        'Venta_id', 'Fecha_Venta', 'Venta__Cliente_id',
+        'Venta__Cliente__PrimerNombre', 'Venta__Cliente__SegundoNombre',
+        'Venta__Cliente__PrimerApellido', 'Venta__Cliente__SegundoApellido',
+        'Producto_id', 'Producto__NombreProducto', 'Producto__Marca__NombreMarca',
+        'Producto__Categoria__NombreCategoria', 'CantidadVendida', 'PrecioUnitario', 'SubTotal',
+    ).iterator(chunk_size=FILAS_POR_LOTE):
+        yield [
+            id_venta, fecha.isoformat(), id_cliente, _nombre(nombre1, nombre2, apellido1, apellido2),
+            id_producto, producto, marca, categoria, cantidad, precio, subtotal,
+        ]
+
+
+EXPORTACIONES = {
+    'ventas': (ENCABEZADO_VENTAS, filas_ventas),
+    'detalles': (ENCABEZADO_DETALLES, filas_detalles),
+}
+
+
+def generar_csv(tipo, desde=None, hasta=None):
+    """Genera el CSV en trozos de bytes; la memoria usada no depende del rango."""
+    encabezado, filas = EXPORTACIONES[tipo]
+    escritor = csv.writer(_Eco())
+    trozo = [escritor.writerow(encabezado)]
+    tamano = 0
+    for fila in filas(desde, hasta):
+        linea = escritor.writerow(fila)
+        trozo.append(linea)
+        tamano += len(linea)
+        if tamano >= BYTES_POR_TROZO:
+            yield ''.join(trozo).encode('utf-8')
+            trozo, tamano = [], 0
+    if trozo:
+        yield ''.join(trozo).encode('utf-8')
+
+
+def comprimir_gzip(trozos):
+    """Comprime al vuelo una secuencia de bytes en formato gzip."""
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for trozo in trozos:
+        comprimido = compresor.compress(trozo)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
@@ -0,0 +1,199 @@
+import csv
+import re
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction, DatabaseError
+from django.db.models.functions import Upper
+
+from .inventario import fijar_existencias, recalcular_stock_bajo
+from .listas import invalidar_lista
+from .models import Producto, Marca, Categoria, MovimientoInventario
+
+TAMANO_LOTE = 2000
+
+COLUMNAS = ['Codigo', 'NombreProducto', 'Descripcion', 'Precio', 'Existencia', 'Marca', 'Categoria']
+COLUMNAS_REQUERIDAS = {'Codigo', 'NombreProducto', 'Precio', 'Marca', 'Categoria'}
+NOMBRES_LISTA = {Marca: 'marcas', Categoria: 'categorias'}
+
+# Solo comas de miles: 1,234 o 12,345,678
+MILES_CON_COMA = re.compile(r'\d{1,3}(,\d{3})+')
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.creados = 0
+        self.actualizados = 0
+        self.errores = []  # (línea, mensaje)
+
+    @property
+    def procesados(self):
+        return self.creados + self.actualizados
+
+    def __str__(self):
+        return (f"{self.creados} creados, {self.actualizados} actualizados, "
+                f"{len(self.errores)} con errores")
+
+
+def _precio(texto):
+    """Decimal del precio escrito como 1234.56, 1,234.56, 1.234,56 o 1234,56; None si no es un número."""
+    texto = texto.replace(' ', '').lstrip('$')
+    coma, punto = texto.rfind(','), texto.rfind('.')
+    if coma >= 0 and punto >= 0:
+        # El último separador es el decimal; el otro separa miles
+        miles, decimal = (',', '.') if punto > coma else ('.', ',')
+        texto = texto.replace(miles, '').replace(decimal, '.')
+    elif coma >= 0:
+        texto = texto.replace(',', '') if MILES_CON_COMA.fullmatch(texto) else texto.replace(',', '.')
+    elif texto.count('.') > 1:
+        texto = texto.replace('.', '')
+    try:
+        precio = Decimal(texto)
+        # NaN e Infinity son Decimal válidos pero no precios
+        return precio.quantize(Decimal('0.01')) if precio.is_finite() else None
+    except InvalidOperation:
+        return None
+
+
+def _validar_fila(fila):
+    """Devuelve (datos limpios, None) o (None, mensaje de error)."""
+    datos = {columna: (fila.get(columna) or '').strip() for columna in COLUMNAS}
+    faltantes = [c for c in COLUMNAS if c in COLUMNAS_REQUERIDAS and not datos[c]]
+    if faltantes:
+        return None, f"Faltan valores: {', '.join(faltantes)}"
+
+    for columna, maximo in (('Codigo', 50), ('NombreProducto', 50), ('Descripcion', 200),
+                            ('Marca', 50), ('Categoria', 50)):
+        if len(datos[columna]) > maximo:
+            return None, f"{columna} excede {maximo} caracteres"
+
+    precio = _precio(datos['Precio'])
+    if precio is None:
+        return None, f"Precio inválido: {datos['Precio']!r}"
+    datos['Precio'] = precio
+    if datos['Precio'] < 0 or datos['Precio'] >= Decimal('100000000'):
+        return None, "Precio fuera de rango"
+
+    if datos['Existencia']:
+        try:
+            datos['Existencia'] = int(datos['Existencia'])
+        except ValueError:
+            return None, f"Existencia inválida: {datos['Existencia']!r}"
+        if not 0 <= datos['Existencia'] <= 99999:
+            return None, "Existencia fuera de rango (0 a 99999)"
+    else:
+        datos['Existencia'] = None
+    return datos, None
+
+
+def _resolver_nombres(modelo, campo, nombres):
+    """{NOMBRE EN MAYÚSCULAS: id}, con una consulta y creando de una vez los que falten."""
+    nombres = {nombre.upper(): nombre for nombre in nombres}
+    ids = {}
+    existentes = (modelo.objects.annotate(clave=Upper(campo)).filter(clave__in=list(nombres))
+                  .order_by('-Activo', 'pk').values_list('clave', 'pk'))
+    for clave, pk in existentes:
+        ids.setdefault(clave, pk)
+
+    faltantes = [modelo(**{campo: nombre, 'Activo': True}) for clave, nombre in nombres.items() if clave not in ids]
+    if faltantes:
+        for objeto in modelo.objects.bulk_create(faltantes):
+            ids[getattr(objeto, campo).upper()] = objeto.pk
+        # bulk_create no emite post_save
+        invalidar_lista(NOMBRES_LISTA[modelo])
+    return ids
+
+
+def _importar_lote(filas, actualizar_existencia, resultado):
+    """Valida e inserta/actualiza un lote de filas [(línea, dict)]."""
+    validas = {}
+    for linea, fila in filas:
+        datos, error = _validar_fila(fila)
+        if error:
+            resultado.errores.append((linea, error))
+        elif datos['Codigo'] in validas:
+            resultado.errores.append((linea, f"Código repetido en el archivo: {datos['Codigo']}"))
+        else:
+            validas[datos['Codigo']] = (linea, datos)
+    if not validas:
+        return
+
+    try:
+        with transaction.atomic():
+            marcas = _resolver_nombres(Marca, 'NombreMarca', {d['Marca'] for _, d in validas.values()})
+            categorias = _resolver_nombres(Categoria, 'NombreCategoria', {d['Categoria'] for _, d in validas.values()})
+            existentes = set(Producto.objects.filter(Codigo__in=list(validas)).values_list('Codigo', flat=True))
+
+            Producto.objects.bulk_create(
+                [
+                    Producto(
+                        Codigo=codigo,
+                        NombreProducto=datos['NombreProducto'],
+                        Descripcion=datos['Descripcion'] or datos['NombreProducto'],
+                        Precio=datos['Precio'],
+                        Existencia=datos['Existencia'] or 0,
+                        Marca_id=marcas[datos['Marca'].upper()],
+                        Categoria_id=categorias[datos['Categoria'].upper()],
+                    )
+                    for codigo, (_, datos) in validas.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['Codigo'],
+                # La existencia de productos ya registrados no se pisa aquí: va por la capa de inventario
+                update_fields=['NombreProducto', 'Descripcion', 'Precio', 'Marca', 'Categoria', 'Version'],
+            )
+
+            # bulk_create no pasa por Producto.save(): la existencia inicial se anota aquí
+            iniciales = [codigo for codigo, (_, datos) in validas.items() if codigo not in existentes and datos['Existencia']]
+            if iniciales:
+                MovimientoInventario.objects.bulk_create([
+                    MovimientoInventario(Producto_id=producto_id, Tipo=MovimientoInventario.INICIAL, Cantidad=existencia)
+                    for producto_id, existencia in
+                    Producto.objects.filter(Codigo__in=iniciales).values_list('pk', 'Existencia')
+                ])
+
+            if actualizar_existencia:
+                nuevas = {
+                    codigo: datos['Existencia']
+                    for codigo, (_, datos) in validas.items()
+                    if codigo in existentes and datos['Existencia'] is not None
+                }
+                if nuevas:
+                    ids = dict(Producto.objects.filter(Codigo__in=list(nuevas)).values_list('Codigo', 'pk'))
+                    fijar_existencias({ids[codigo]: existencia for codigo, existencia in nuevas.items()})
+
+            # bulk_create tampoco calcula el punto de reorden (la categoría pudo cambiar)
+            recalcular_stock_bajo(Producto.objects.filter(Codigo__in=list(validas)).values_list('pk', flat=True))
+    except DatabaseError as error:
+        for linea, _ in validas.values():
+            resultado.errores.append((linea, f"Error de base de datos en el lote: {error}"))
+        return
+
+    resultado.actualizados += len(existentes)
+    resultado.creados += len(validas) - len(existentes)
+
+
+def importar_productos(archivo, tamano_lote=TAMANO_LOTE, actualizar_existencia=False, delimitador=','):
+    """Importa un CSV de productos (archivo de texto abierto) por lotes.
+
+    Columnas: Codigo, NombreProducto, Descripcion, Precio, Existencia, Marca, Categoria.
+    Los productos se identifican por Codigo: los nuevos se crean y los existentes se
+    actualizan con un INSERT ... ON CONFLICT por lote. Las marcas y categorías se
+    resuelven por nombre (sin distinguir mayúsculas) con una consulta por lote y se
+    crean si no existen. Las filas inválidas se reportan sin detener la importación.
+    """
+    resultado = ResultadoImportacion()
+    lector = csv.DictReader(archivo, delimiter=delimitador)
+    faltantes = COLUMNAS_REQUERIDAS - set(lector.fieldnames or [])
+    if faltantes:
+        resultado.errores.append((1, f"Faltan columnas: {', '.join(sorted(faltantes))}"))
+        return resultado
+
+    # La línea 1 es el encabezado
+    filas = ((lector.line_num, fila) for fila in lector)
+    while True:
+        lote = list(islice(filas, tamano_lote))
+        if not lote:
+            break
+        _importar_lote(lote, actualizar_existencia, resultado)
+    return resultado
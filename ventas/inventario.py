@@ -0,0 +1,601 @@
+import functools
+import logging
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.mail import mail_admins
+from django.db import transaction, connection, DatabaseError
+from django.db.models import Case, When, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Categoria, Producto, VentaDetalle, MovimientoInventario, FranjaExistencia, nueva_version
+from .reportes import invalidar_reportes
+from .resumenes import encolar_acumulados
+from .tareas import encolar, tarea
+
+logger = logging.getLogger(__name__)
+
+CENTAVO = Decimal('0.01')
+
+# Códigos SQLSTATE de Postgres que indican un conflicto transitorio:
+# 40P01 = deadlock_detected, 40001 = serialization_failure.
+CODIGOS_TRANSITORIOS = {'40P01', '40001'}
+
+
+# --- Métricas de contención ---------------------------------------------------
+
+class _Contencion:
+    """Contadores en memoria (por proceso) de reintentos y esperas por bloqueos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.reintentos = 0
+            self.fallos = 0
+            self.reintentos_por_operacion = {}
+            # producto_id -> [bloqueos, segundos_totales, segundos_maximo]
+            self.esperas = {}
+
+    def registrar_reintento(self, operacion):
+        with self._lock:
+            self.reintentos += 1
+            self.reintentos_por_operacion[operacion] = self.reintentos_por_operacion.get(operacion, 0) + 1
+
+    def registrar_fallo(self):
+        with self._lock:
+            self.fallos += 1
+
+    def registrar_espera(self, ids, segundos):
+        with self._lock:
+            for producto_id in ids:
+                dato = self.esperas.setdefault(producto_id, [0, 0.0, 0.0])
+                dato[0] += 1
+                dato[1] += segundos
+                dato[2] = max(dato[2], segundos)
+
+    def resumen(self, top=10):
+        with self._lock:
+            calientes = sorted(self.esperas.items(), key=lambda item: item[1][1], reverse=True)[:top]
+            return {
+                'reintentos': self.reintentos,
+                'fallos_tras_reintentos': self.fallos,
+                'reintentos_por_operacion': dict(self.reintentos_por_operacion),
+                'productos_mas_esperados': [
+                    {
+                        'producto_id': producto_id,
+                        'bloqueos': bloqueos,
+                        'espera_total_ms': round(total * 1000, 3),
+                        'espera_maxima_ms': round(maximo * 1000, 3),
+                    }
+                    for producto_id, (bloqueos, total, maximo) in calientes
+                ],
+            }
+
+
+contencion = _Contencion()
+
+
+# --- Reintentos ---------------------------------------------------------------
+
+def es_error_transitorio(error):
+    """True si el error es un deadlock o fallo de serialización que vale la pena reintentar."""
+    causa = error.__cause__
+    codigo = getattr(causa, 'pgcode', None) or getattr(causa, 'sqlstate', None)
+    if codigo in CODIGOS_TRANSITORIOS:
+        return True
+    # SQLite (desarrollo local) reporta la contención como "database is locked".
+    return connection.vendor == 'sqlite' and 'locked' in str(error)
+
+
+def ejecutar_con_reintentos(funcion, *args, operacion=None, **kwargs):
+    """Ejecuta `funcion` dentro de transaction.atomic y la reintenta ante conflictos.
+
+    Cada intento es una transacción completa; el backoff es exponencial, acotado
+    y con jitter completo. Si ya estamos dentro de una transacción no se reintenta,
+    porque la transacción externa queda abortada y debe reintentarla quien la abrió.
+    """
+    operacion = operacion or getattr(funcion, '__qualname__', 'operacion')
+    if connection.in_atomic_block:
+        return funcion(*args, **kwargs)
+
+    maximo = getattr(settings, 'STOCK_REINTENTOS', 5)
+    base = getattr(settings, 'STOCK_ESPERA_BASE', 0.05)
+    tope = getattr(settings, 'STOCK_ESPERA_MAXIMA', 1.0)
+
+    intento = 0
+    while True:
+        try:
+            with transaction.atomic():
+                return funcion(*args, **kwargs)
+        except DatabaseError as error:
+            if not es_error_transitorio(error):
+                raise
+            if intento >= maximo:
+                contencion.registrar_fallo()
+                raise
+            intento += 1
+            contencion.registrar_reintento(operacion)
+            espera = random.uniform(0, min(tope, base * (2 ** intento)))
+            logger.warning("Conflicto en %s (intento %s/%s), reintentando en %.3fs: %s",
+                           operacion, intento, maximo, espera, error)
+            time.sleep(espera)
+
+
+def con_reintentos(funcion):
+    """Decorador equivalente a ejecutar_con_reintentos."""
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        return ejecutar_con_reintentos(funcion, *args, operacion=funcion.__qualname__, **kwargs)
+    return envoltura
+
+
+# --- Reserva de existencias ---------------------------------------------------
+
+def bloquear_productos(ids, sin_bloquear_franjas=False, completos=()):
+    """SELECT ... FOR UPDATE de los productos indicados, siempre en orden de llave primaria.
+
+    Todas las mutaciones de existencia deben pasar por aquí: al bloquear siempre
+    en el mismo orden, dos cajeros que venden productos en común no pueden
+    quedar esperándose mutuamente. Las filas de los productos se bloquean siempre
+    antes que cualquier franja.
+
+    En los productos con franjas se bloquean también todas sus franjas y Existencia
+    se carga con su suma, así quien llama ve la existencia exacta. Con
+    `sin_bloquear_franjas` esos productos se leen sin bloqueo alguno, salvo los de
+    `completos`: es el camino de registrar_venta, que descuenta de una franja a la vez.
+    """
+    ids = sorted(set(ids))
+    completos = set(completos)
+    inicio = time.perf_counter()
+    consulta = Producto.objects.select_for_update().filter(pk__in=ids).order_by('pk')
+    if sin_bloquear_franjas:
+        consulta = consulta.filter(Q(Franjas=0) | Q(pk__in=sorted(completos & set(ids))))
+    productos = {p.pk: p for p in consulta}
+    contencion.registrar_espera(productos, time.perf_counter() - inicio)
+
+    con_franjas = [producto_id for producto_id, producto in productos.items() if producto.Franjas]
+    if sin_bloquear_franjas:
+        faltantes = [producto_id for producto_id in ids if producto_id not in productos]
+        if faltantes:
+            productos.update((p.pk, p) for p in Producto.objects.filter(pk__in=faltantes))
+    if con_franjas:
+        for producto_id in con_franjas:
+            productos[producto_id].Existencia = 0
+        franjas = (FranjaExistencia.objects.select_for_update().filter(Producto__in=con_franjas)
+                   .order_by('Producto', 'Franja').values_list('Producto_id', 'Existencia'))
+        for producto_id, existencia in franjas:
+            productos[producto_id].Existencia += existencia
+    return productos
+
+
+def escribir_existencias(productos, cambios):
+    """Aplica {producto_id: delta} sin anotarlo en la bitácora (usar ajustar_existencias).
+
+    Los productos comunes se actualizan en un solo UPDATE ... CASE (que también cambia
+    StockBajo de los que cruzan su punto de reorden); en los que tienen franjas la nueva
+    existencia se reparte entre ellas. Los productos deben venir
+    de bloquear_productos() sin `sin_bloquear_franjas`.
+    """
+    simples = {producto_id: delta for producto_id, delta in cambios.items() if not productos[producto_id].Franjas}
+    if simples:
+        bajos = _cruces(productos, {producto_id: productos[producto_id].Existencia + delta
+                                    for producto_id, delta in simples.items()})
+        Producto.objects.filter(pk__in=simples).update(
+            Existencia=Case(
+                *[When(pk=producto_id, then=F('Existencia') + delta) for producto_id, delta in simples.items()],
+                default=F('Existencia'),
+            ),
+            Version=nueva_version(),
+            **({'StockBajo': Case(
+                *[When(pk=producto_id, then=Value(bajo)) for producto_id, bajo in bajos.items()],
+                default=F('StockBajo'),
+            )} if bajos else {}),
+        )
+    for producto_id, delta in cambios.items():
+        producto = productos[producto_id]
+        if producto.Franjas:
+            _repartir(producto, producto.Existencia + delta)
+
+
+def ajustar_existencias(productos, cambios, tipo, referencia=None):
+    """Aplica {producto_id: delta} y lo anota en la bitácora.
+
+    `productos` es lo que devolvió bloquear_productos(). `tipo` es uno de
+    MovimientoInventario.TIPOS y `referencia` el Id_Venta cuando corresponde.
+    """
+    cambios = {producto_id: delta for producto_id, delta in cambios.items() if delta}
+    if not cambios:
+        return
+    escribir_existencias(productos, cambios)
+    _anotar(cambios, tipo, referencia)
+
+
+def _anotar(cambios, tipo, referencia=None):
+    ahora = timezone.now()
+    MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(Producto_id=producto_id, Fecha=ahora, Tipo=tipo, Cantidad=delta, Referencia=referencia)
+        for producto_id, delta in cambios.items()
+    ])
+
+
+def fijar_existencia(producto_id, existencia):
+    """Reemplaza la existencia de un producto (ajuste manual) bajo bloqueo."""
+    fijar_existencias({producto_id: existencia})
+
+
+def fijar_existencias(nuevas, tipo=MovimientoInventario.AJUSTE):
+    """Reemplaza la existencia de varios productos {producto_id: existencia} bajo bloqueo.
+
+    En la bitácora queda la diferencia contra la existencia anterior.
+    """
+    productos = bloquear_productos(nuevas)
+    ajustar_existencias(productos, {
+        producto_id: int(existencia) - productos[producto_id].Existencia
+        for producto_id, existencia in nuevas.items()
+        if producto_id in productos
+    }, tipo)
+
+
+def existencias_actuales(productos=None):
+    """{producto_id: existencia real}, sin bloquear: la suma de las franjas o Existencia."""
+    consulta = Producto.objects.order_by('pk')
+    franjas = FranjaExistencia.objects.order_by()
+    if productos is not None:
+        productos = list(productos)
+        consulta = consulta.filter(pk__in=productos)
+        franjas = franjas.filter(Producto__in=productos)
+    actuales = dict(consulta.values_list('pk', 'Existencia'))
+    actuales.update(franjas.values('Producto_id').annotate(total=Sum('Existencia')).values_list('Producto_id', 'total'))
+    return actuales
+
+
+# --- Existencia baja (punto de reorden) ---------------------------------------
+
+AVISO_STOCK_BAJO = 'inventario.aviso_stock_bajo'
+
+
+def _cruces(productos, nuevas):
+    """{producto_id: StockBajo} de los productos que cruzan su punto de reorden con la existencia `nuevas`.
+
+    Se decide en memoria con los productos bloqueados, así quien escribe la existencia
+    actualiza StockBajo en el mismo UPDATE. Al bajar del punto se encola un aviso que
+    se manda después del commit, fuera de la venta. Los productos con franjas venden sin
+    tocar su fila: cruzan al refrescarse su fila cuando se confirma la venta (refrescar_franjas).
+    """
+    cruces = {}
+    for producto_id, existencia in nuevas.items():
+        producto = productos[producto_id]
+        bajo = existencia <= producto.Reorden
+        if bajo != producto.StockBajo:
+            cruces[producto_id] = producto.StockBajo = bajo
+            if bajo:
+                encolar(AVISO_STOCK_BAJO, producto=producto_id, existencia=existencia, reorden=producto.Reorden)
+    return cruces
+
+
+@tarea(AVISO_STOCK_BAJO)
+def _avisar_stock_bajo(producto, existencia, reorden):
+    nombre = Producto.objects.filter(pk=producto).values_list('NombreProducto', flat=True).first()
+    logger.warning("Stock bajo: %s (#%s) tiene %s unidades; punto de reorden %s", nombre, producto, existencia, reorden)
+    # Sin ADMINS no se envía nada; si el correo falla la tarea se reintenta
+    mail_admins(f"Stock bajo: {nombre}",
+                f"{nombre} (#{producto}) quedó con {existencia} unidades; su punto de reorden es {reorden}.")
+
+
+def revisar_stock_bajo(producto):
+    """Actualiza StockBajo de un producto recién guardado (Producto.save) con su Reorden vigente.
+
+    Pasa por _cruces como cualquier movimiento: si el cambio lo deja en su punto de
+    reorden se encola el aviso. Corre dentro de la transacción del guardado.
+    """
+    bloqueados = bloquear_productos([producto.pk], sin_bloquear_franjas=True)
+    cruces = _cruces(bloqueados, {producto_id: p.Existencia for producto_id, p in bloqueados.items()})
+    if cruces:
+        Producto.objects.filter(pk=producto.pk).update(StockBajo=cruces[producto.pk])
+    producto.StockBajo = bloqueados[producto.pk].StockBajo
+
+
+def recalcular_stock_bajo(productos=None):
+    """Recalcula Reorden y StockBajo de los productos indicados (o de todos) y devuelve cuántos cruzaron.
+
+    Para cambios que no pasan por la existencia: el punto de reorden de una categoría,
+    una importación con bulk_create. Los productos se bloquean como en una venta.
+    """
+    def recalcular():
+        consulta = Producto.objects.order_by('pk')
+        if productos is not None:
+            consulta = consulta.filter(pk__in=list(productos))
+        bloqueados = bloquear_productos(consulta.values_list('pk', flat=True), sin_bloquear_franjas=True)
+        if not bloqueados:
+            return 0
+        consulta = Producto.objects.filter(pk__in=bloqueados)
+        consulta.update(Reorden=Coalesce(
+            'PuntoReorden', Subquery(Categoria.objects.filter(pk=OuterRef('Categoria')).values('PuntoReorden')[:1]),
+        ))
+        for producto in consulta.only('pk', 'Reorden'):
+            bloqueados[producto.pk].Reorden = producto.Reorden
+        cruces = _cruces(bloqueados, {producto_id: p.Existencia for producto_id, p in bloqueados.items()})
+        for bajo in (True, False):
+            consulta.filter(pk__in=[producto_id for producto_id, b in cruces.items() if b == bajo]).update(StockBajo=bajo)
+        return len(cruces)
+
+    return ejecutar_con_reintentos(recalcular, operacion='recalcular_stock_bajo')
+
+
+# --- Franjas de existencia (productos de alta rotación) -----------------------
+
+def _repartir(producto, total):
+    """Reparte `total` en partes iguales entre las franjas (ya bloqueadas) y lo copia a Existencia."""
+    base, resto = divmod(total, producto.Franjas)
+    FranjaExistencia.objects.filter(Producto=producto).update(Existencia=Case(
+        *[When(Franja=franja, then=Value(base + (1 if franja < resto else 0))) for franja in range(producto.Franjas)],
+        default=Value(0),
+    ))
+    Producto.objects.filter(pk=producto.pk).update(Existencia=total, Version=nueva_version(),
+                                                   StockBajo=total <= producto.Reorden)
+    _cruces({producto.pk: producto}, {producto.pk: total})
+
+
+def _descontar_de_franja(producto, cantidad):
+    """Descuenta `cantidad` de una sola franja; False si ninguna alcanza por sí sola.
+
+    La condición Existencia >= cantidad va en el propio UPDATE, así que es una
+    verificación fuerte sin leer antes la fila. Se empieza en una franja al azar para
+    que las ventas simultáneas caigan en filas distintas, y donde la base lo permite
+    (Postgres) primero se busca una franja que nadie tenga bloqueada.
+    """
+    inicio = random.randrange(producto.Franjas)
+    orden = [(inicio + paso) % producto.Franjas for paso in range(producto.Franjas)]
+    if connection.features.has_select_for_update_skip_locked:
+        libre = (FranjaExistencia.objects.select_for_update(skip_locked=True)
+                 .filter(Producto=producto, Existencia__gte=cantidad)
+                 .order_by('?').values_list('Franja', flat=True).first())
+        if libre is not None:
+            orden.remove(libre)
+            orden.insert(0, libre)
+    for franja in orden:
+        if FranjaExistencia.objects.filter(
+            Producto=producto, Franja=franja, Existencia__gte=cantidad,
+        ).update(Existencia=F('Existencia') - cantidad):
+            return True
+    return False
+
+
+class _FranjaInsuficiente(Exception):
+    """Ninguna franja del producto alcanza por sí sola: hay que volver a empezar bloqueándolo completo."""
+
+    def __init__(self, producto_id):
+        super().__init__(producto_id)
+        self.producto_id = producto_id
+
+
+def con_franjas_completas(funcion, *args, operacion=None):
+    """Ejecuta funcion(*args, completos) como ejecutar_con_reintentos, con `completos` creciente.
+
+    Si una venta no cabe en una franja, la transacción entera se deshace y se vuelve a
+    empezar con ese producto en `completos` (bloqueado con todas sus franjas desde el
+    principio). Así nadie bloquea la fila de un producto teniendo ya franjas bloqueadas.
+    Dentro de una transacción ajena solo se deshace el intento (savepoint); quien llama
+    no debe tener franjas bloqueadas.
+    """
+    completos = set()
+    while True:
+        try:
+            if connection.in_atomic_block:
+                with transaction.atomic():
+                    return funcion(*args, completos)
+            return ejecutar_con_reintentos(funcion, *args, completos, operacion=operacion)
+        except _FranjaInsuficiente as error:
+            completos.add(error.producto_id)
+
+
+def refrescar_franjas(productos):
+    """Copia a Producto.Existencia la suma de las franjas de `productos`, con su versión y StockBajo.
+
+    Las ventas descuentan de una franja sin tocar la fila del producto; esto corre al
+    confirmarse la venta, en una transacción corta que bloquea solo esas filas (ninguna
+    franja). El total se vuelve a sumar en lugar de aplicar la diferencia: dos refrescos
+    que se cruzan dejan igual el valor correcto, y el último en bloquear ve todas las
+    ventas confirmadas.
+    """
+    def refrescar():
+        bloqueados = {
+            p.pk: p for p in Producto.objects.select_for_update()
+            .filter(pk__in=sorted(set(productos)), Franjas__gt=0).order_by('pk')
+        }
+        if not bloqueados:
+            return
+        totales = dict(
+            FranjaExistencia.objects.filter(Producto__in=list(bloqueados)).order_by()
+            .values('Producto_id').annotate(total=Sum('Existencia')).values_list('Producto_id', 'total')
+        )
+        totales = {producto_id: totales.get(producto_id, 0) for producto_id in bloqueados}
+        _cruces(bloqueados, totales)
+        Producto.objects.filter(pk__in=bloqueados).update(
+            Existencia=Case(*[When(pk=producto_id, then=Value(total)) for producto_id, total in totales.items()]),
+            StockBajo=Case(*[When(pk=producto_id, then=Value(p.StockBajo)) for producto_id, p in bloqueados.items()]),
+            Version=nueva_version(),
+        )
+
+    ejecutar_con_reintentos(refrescar, operacion='refrescar_franjas')
+
+
+def configurar_franjas(producto_id, franjas):
+    """Reparte la existencia del producto en `franjas` filas; con 0 vuelve a una sola."""
+    def configurar():
+        producto = bloquear_productos([producto_id]).get(producto_id)
+        if producto is None:
+            raise Producto.DoesNotExist(f"No existe el producto {producto_id}.")
+        FranjaExistencia.objects.filter(Producto=producto).delete()
+        Producto.objects.filter(pk=producto_id).update(Franjas=franjas, Existencia=producto.Existencia,
+                                                       Version=nueva_version())
+        if franjas:
+            producto.Franjas = franjas
+            FranjaExistencia.objects.bulk_create([
+                FranjaExistencia(Producto=producto, Franja=franja) for franja in range(franjas)
+            ])
+            _repartir(producto, producto.Existencia)
+
+    ejecutar_con_reintentos(configurar, operacion='configurar_franjas')
+
+
+def _repartir_producto(producto_id):
+    producto = bloquear_productos([producto_id]).get(producto_id)
+    if producto is not None and producto.Franjas:
+        _repartir(producto, producto.Existencia)
+
+
+def repartir_franjas(productos=None):
+    """Rebalancea las franjas y refresca Producto.Existencia con su suma.
+
+    Las ventas van vaciando franjas al azar; al volver a repartir, una venta grande
+    vuelve a caber en una sola franja. Cada producto va en su propia transacción
+    corta para no retener los bloqueos de todos a la vez. Devuelve cuántos se repartieron.
+    """
+    consulta = Producto.objects.filter(Franjas__gt=0).order_by('pk')
+    if productos is not None:
+        consulta = consulta.filter(pk__in=productos)
+    ids = list(consulta.values_list('pk', flat=True))
+    for producto_id in ids:
+        ejecutar_con_reintentos(_repartir_producto, producto_id, operacion='repartir_franjas')
+    return len(ids)
+
+
+REPARTIR_PRODUCTO = 'inventario.repartir_producto'
+
+
+@tarea('inventario.repartir_franjas', cada=settings.FRANJAS_REPARTIR_SEGUNDOS)
+def _repartir_periodico():
+    # Una tarea por producto: cada reparto en su propia transacción, como repartir_franjas()
+    for producto_id in Producto.objects.filter(Franjas__gt=0).order_by('pk').values_list('pk', flat=True):
+        encolar(REPARTIR_PRODUCTO, producto=producto_id)
+
+
+@tarea(REPARTIR_PRODUCTO)
+def _repartir_encolado(producto):
+    _repartir_producto(producto)
+
+
+# --- Registro de ventas -------------------------------------------------------
+
+def _normalizar_lineas(lineas):
+    """Convierte las líneas (producto o id, cantidad) a una lista de (id, cantidad)."""
+    normalizadas = []
+    vistos = set()
+    for producto, cantidad in lineas:
+        producto_id = producto.pk if isinstance(producto, Producto) else int(producto)
+        if producto_id in vistos:
+            raise ValidationError("Un producto no puede repetirse en la misma venta.")
+        vistos.add(producto_id)
+        normalizadas.append((producto_id, int(cantidad)))
+    return normalizadas
+
+
+def _registrar_venta(venta, lineas, completos):
+    lineas = _normalizar_lineas(lineas)
+    if not lineas:
+        raise ValidationError("La venta debe tener al menos un producto.")
+
+    # Los productos con franjas no se bloquean (salvo los de `completos`): se descuentan
+    # más abajo de una franja
+    productos = bloquear_productos((producto_id for producto_id, _ in lineas), sin_bloquear_franjas=True,
+                                   completos=completos)
+    por_franja = {producto_id for producto_id, producto in productos.items()
+                  if producto.Franjas and producto_id not in completos}
+
+    detalles = []
+    total = Decimal('0.00')
+    for producto_id, cantidad in lineas:
+        producto = productos.get(producto_id)
+        if producto is None:
+            raise ValidationError("El producto seleccionado no existe.")
+        if producto_id not in por_franja and (producto.Existencia or 0) - cantidad < 0:
+            raise ValidationError("No hay stock suficiente para realizar la venta.")
+        subtotal = (Decimal(cantidad) * producto.Precio).quantize(CENTAVO)
+        total += subtotal
+        detalles.append(VentaDetalle(
+            Producto=producto,
+            CantidadVendida=cantidad,
+            PrecioUnitario=producto.Precio,
+            SubTotal=subtotal,
+        ))
+
+    nueva = venta.pk is None
+    if nueva:
+        venta.Total = total
+        venta.save(acumular=False)
+    else:
+        type(venta).objects.filter(pk=venta.pk).update(Total=F('Total') + total)
+        venta.refresh_from_db(fields=['Total'])
+        if venta.Fecha_Venta < timezone.localdate():
+            invalidar_reportes()
+
+    for detalle in detalles:
+        detalle.Venta = venta
+        detalle.Fecha_Venta = venta.Fecha_Venta
+    VentaDetalle.objects.bulk_create(detalles)
+
+    # Las franjas se tocan al final para retener su bloqueo el menor tiempo posible
+    escribir_existencias(productos, {
+        producto_id: -cantidad for producto_id, cantidad in lineas if producto_id not in por_franja
+    })
+    for producto_id, cantidad in sorted(lineas):
+        if producto_id in por_franja and not _descontar_de_franja(productos[producto_id], cantidad):
+            raise _FranjaInsuficiente(producto_id)
+    if por_franja:
+        # Fuera de la venta, ya confirmada: la fila del producto no se bloquea mientras se vende
+        transaction.on_commit(functools.partial(refrescar_franjas, por_franja), robust=True)
+    _anotar({producto_id: -cantidad for producto_id, cantidad in lineas}, MovimientoInventario.VENTA, venta.pk)
+    for producto_id, cantidad in lineas:
+        productos[producto_id].Existencia -= cantidad
+
+    # Los resúmenes diarios se suman fuera de la venta, en la cola de tareas
+    encolar_acumulados(
+        venta.Fecha_Venta, total=total, tickets=int(nueva), unidades=sum(cantidad for _, cantidad in lineas),
+        por_producto={detalle.Producto_id: (detalle.CantidadVendida, detalle.SubTotal) for detalle in detalles},
+    )
+
+    return venta
+
+
+def registrar_venta(venta, lineas, completos=None):
+    """Guarda una venta completa con todas sus líneas en bloque.
+
+    En lugar de llamar VentaDetalle.save() por cada línea (un bloqueo, un UPDATE
+    y un SUM por línea) se hace:
+
+    1. Un solo SELECT ... FOR UPDATE de todos los productos, ordenado por llave.
+    2. La validación de existencias en memoria.
+    3. Un bulk_create de los detalles.
+    4. Un solo UPDATE ... CASE que descuenta la existencia de todos los productos
+       (los productos con franjas se descuentan con un UPDATE condicional por franja
+       y su fila se refresca al confirmarse; ver con_franjas_completas y refrescar_franjas).
+    5. Una sola escritura de Venta.Total.
+    6. Dos tareas en la cola que suman la venta a los resúmenes diarios (por día y por producto).
+
+    Los CheckConstraint de la base siguen siendo la última garantía.
+    Lanza ValidationError con los mismos mensajes que VentaDetalle.save().
+    Si hay un deadlock o fallo de serialización se reintenta la transacción completa.
+    Quien pasa `completos` (registrar_lote) vuelve a empezar su propia transacción
+    cuando una venta no cabe en una franja.
+    """
+    nueva = venta.pk is None
+
+    def intento(completos):
+        if nueva:
+            # Un intento fallido pudo asignar una llave que se deshizo con el rollback.
+            venta.pk = None
+            venta._state.adding = True
+        return _registrar_venta(venta, lineas, completos)
+
+    if completos is not None:
+        return intento(completos)
+    return con_franjas_completas(intento, operacion='registrar_venta')
@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from prometheus_client import Counter
+
+from .models import Marca, Categoria, Cliente
+
+# Listas de referencia que se leen en casi cada petición y cambian poco:
+# nombre -> (modelo, orden). Solo se guardan los registros activos.
+LISTAS = {
+    'marcas': (Marca, 'Id_Marca'),
+    'categorias': (Categoria, 'Id_Categoria'),
+    'clientes': (Cliente, 'Id_Cliente'),
+}
+
+ACCESOS = Counter(
+    'geca_cache_listas', 'Lecturas de listas de referencia desde la caché.',
+    ['lista', 'resultado'],
+)
+
+
+def _clave_version(nombre):
+    return f'listas:{nombre}:version'
+
+
+def _version(nombre):
+    clave = _clave_version(nombre)
+    version = cache.get(clave)
+    if version is None:
+        # Si la versión se perdió (desalojo o reinicio) no se vuelve a 1: empezar desde la hora
+        # actual evita reutilizar llaves viejas que aún estén en la caché.
+        cache.add(clave, time.time_ns(), timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def obtener_lista(nombre):
+    """Registros activos de la lista `nombre`, desde la caché si la versión vigente está guardada."""
+    modelo, orden = LISTAS[nombre]
+    clave = f'listas:{nombre}:{_version(nombre)}'
+    registros = cache.get(clave)
+    if registros is not None:
+        ACCESOS.labels(nombre, 'acierto').inc()
+        return registros
+
+    ACCESOS.labels(nombre, 'fallo').inc()
+    registros = list(modelo.objects.filter(Activo=True).order_by(orden))
+    cache.set(clave, registros, getattr(settings, 'LISTAS_CACHE_SEGUNDOS', 300))
+    return registros
+
+
+def invalidar_lista(nombre):
+    """Cambia la versión de la lista; las llaves anteriores quedan huérfanas y expiran solas."""
+    def cambiar_version():
+        try:
+            cache.incr(_clave_version(nombre))
+        except ValueError:
+            _version(nombre)
+
+    cambiar_version()
+    # Otro proceso pudo volver a llenar la caché con datos previos al commit: se invalida de nuevo al confirmar
+    if connection.in_atomic_block:
+        transaction.on_commit(cambiar_version)
+
+
+def _al_cambiar(sender, **kwargs):
+    for nombre, (modelo, _) in LISTAS.items():
+        if modelo is sender:
+            invalidar_lista(nombre)
+
+
+# save() y delete() de cualquier registro (incluida la baja lógica Activo=False) invalidan su lista.
+# Los bulk_create/update no emiten señales: quien los use debe llamar invalidar_lista.
+for _modelo, _ in LISTAS.values():
+    post_save.connect(_al_cambiar, sender=_modelo, dispatch_uid=f'listas_{_modelo.__name__}_save')
+    post_delete.connect(_al_cambiar, sender=_modelo, dispatch_uid=f'listas_{_modelo.__name__}_delete')
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas.archivo import (
+    anios_para_archivar, archivar_anio, borrar_archivado, manifiestos, ventas_fuera_del_archivo,
+)
+from ventas.reportes import invalidar_reportes
+
+
+class Command(BaseCommand):
+    help = (
+        "Pasa las ventas de años cerrados al archivo frío (ARCHIVO_DIR) y las borra de la base. "
+        "Sin --anio archiva, en orden, los años más viejos que ARCHIVO_ANIOS_VIVOS. El detalle "
+        "de venta y los reportes leen esos años del archivo; el resumen diario se conserva."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anio', type=int, help='Año a archivar (el siguiente sin archivar).')
+        parser.add_argument('--lote', type=int, default=1000, help='Ventas borradas por transacción.')
+        parser.add_argument('--sin-borrar', action='store_true', help='Solo escribir el archivo.')
+        parser.add_argument('--estado', action='store_true', help='Solo listar los años archivados.')
+
+    def handle(self, *args, **options):
+        if not options['estado']:
+            archivados = manifiestos()
+            # Un borrado interrumpido se retoma antes de archivar años nuevos
+            anios = [anio for anio in archivados if ventas_fuera_del_archivo(anio)]
+            anios += [options['anio']] if options['anio'] else anios_para_archivar()
+            anios = list(dict.fromkeys(anios))
+            for anio in anios:
+                if anio not in archivados:
+                    try:
+                        manifiesto = archivar_anio(anio)
+                    except ValueError as error:
+                        raise CommandError(error)
+                    totales = manifiesto['totales']
+                    self.stdout.write(
+                        f"{anio}: {totales['ventas']} ventas y {totales['detalles']} líneas archivadas "
+                        f"(${totales['monto']})."
+                    )
+                if options['sin_borrar']:
+                    continue
+                borradas = borrar_archivado(anio, options['lote'])
+                self.stdout.write(f"{anio}: {borradas} ventas borradas de la base.")
+                restantes = ventas_fuera_del_archivo(anio)
+                if restantes:
+                    self.stdout.write(self.style.WARNING(
+                        f"{anio}: {restantes} ventas siguen en la base y no están en el archivo; "
+                        f"los reportes no las ven."
+                    ))
+            invalidar_reportes()
+
+        for anio, manifiesto in manifiestos().items():
+            totales = manifiesto['totales']
+            self.stdout.write(
+                f"{anio}: {totales['ventas']} ventas, {totales['detalles']} líneas, ${totales['monto']} "
+                f"({len(manifiesto['tablas']['detalles']['grupos'])} grupos)"
+            )
@@ -0,0 +1,297 @@
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as tz
+from statistics import mean, median
+
+import django
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction, DatabaseError
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ventas.inventario import registrar_venta, bloquear_productos, ajustar_existencias, contencion
+from ventas.models import Cliente, MovimientoInventario, Producto, Usuario, Venta
+from ventas.resumenes import reconstruir_resumen, reconstruir_productos
+
+# Vistas GET que se miden: (nombre, nombre de la url, parámetros). Las que reciben una
+# llave se completan con datos existentes en _casos().
+VISTAS = [
+    ('login', 'login', ''),
+    ('register', 'register', ''),
+    ('dashboard', 'dashboard', ''),
+    ('dashboard_anio', 'dashboard', '?periodo=anio'),
+    ('productos_lista', 'productos_lista', ''),
+    ('productos_registrar', 'productos_registrar', ''),
+    ('productos_buscar', 'productos_buscar', '?q=mar'),
+    ('marca_lista', 'marca_lista', ''),
+    ('categoria_lista', 'categoria_lista', ''),
+    ('clientes_lista', 'clientes_lista', ''),
+    ('clientes_registrar', 'clientes_registrar', ''),
+    ('ventas_lista', 'ventas_lista', ''),
+    ('ventas_exportar', 'ventas_exportar', '?tipo=ventas'),
+    ('ventas_registrar', 'ventas_registrar', ''),
+    ('ventas_detalle', 'ventas_detalle', None),
+    ('reportes_ventas', 'reportes_ventas', '?dimension=categoria&periodo=mes&comparar=1'),
+    ('inventario_contencion', 'inventario_contencion', ''),
+]
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def _estadisticas(segundos):
+    milis = [s * 1000 for s in segundos]
+    return {
+        'media_ms': round(mean(milis), 3),
+        'p50_ms': round(median(milis), 3),
+        'p95_ms': round(_percentil(milis, 95), 3),
+        'min_ms': round(min(milis), 3),
+        'max_ms': round(max(milis), 3),
+    }
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia y número de consultas de cada vista de ventas/urls.py y el "
+        "rendimiento del registro de ventas con N trabajadores concurrentes. Escribe los "
+        "resultados en JSON para compararlos entre commits (ver --comparar). "
+        "Conviene ejecutarlo sobre una base generada con sembrar_datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20, help='Peticiones medidas por vista.')
+        parser.add_argument('--trabajadores', type=int, default=4, help='Hilos que registran ventas a la vez.')
+        parser.add_argument('--ventas', type=int, default=50, help='Ventas por trabajador.')
+        parser.add_argument('--lineas', type=int, default=3, help='Líneas por venta.')
+        parser.add_argument('--solo', choices=['vistas', 'concurrencia'], help='Ejecutar solo una parte.')
+        parser.add_argument('--salida', help='Archivo JSON de resultados.')
+        parser.add_argument('--comparar', help='JSON de una ejecución anterior para mostrar diferencias.')
+        parser.add_argument('--etiqueta', help='Nombre de la ejecución (por defecto el commit actual).')
+
+    def handle(self, *args, **options):
+        if not Producto.objects.exists() or not Cliente.objects.exists():
+            raise CommandError("No hay productos o clientes; ejecute antes sembrar_datos.")
+
+        resultados = {
+            'etiqueta': options['etiqueta'] or _commit_actual(),
+            'fecha': datetime.now(tz.utc).isoformat(timespec='seconds'),
+            'entorno': {
+                'motor': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'volumen': {
+                'productos': Producto.objects.count(),
+                'clientes': Cliente.objects.count(),
+                'ventas': Venta.objects.count(),
+            },
+            'parametros': {
+                clave: options[clave] for clave in ('repeticiones', 'trabajadores', 'ventas', 'lineas')
+            },
+        }
+
+        if options['solo'] != 'concurrencia':
+            resultados['vistas'] = self._medir_vistas(options['repeticiones'])
+        if options['solo'] != 'vistas':
+            resultados['concurrencia'] = self._medir_concurrencia(
+                options['trabajadores'], options['ventas'], options['lineas'],
+            )
+
+        self._mostrar(resultados)
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as archivo:
+                self._comparar(json.load(archivo), resultados)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}"))
+
+    # --- Vistas ---------------------------------------------------------------
+
+    def _casos(self):
+        venta = Venta.objects.order_by('-pk').values_list('pk', flat=True).first()
+        for nombre, url, parametros in VISTAS:
+            if parametros is None:
+                if venta is None:
+                    continue
+                yield nombre, reverse(url, args=[venta])
+            else:
+                yield nombre, reverse(url) + parametros
+
+    def _medir_vistas(self, repeticiones):
+        resultados = {}
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        # El usuario y su sesión se descartan al terminar
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=hosts):
+            usuario = Usuario.objects.create_superuser(f'benchmark-{uuid.uuid4().hex[:8]}', None, None)
+            cliente = Client()
+            cliente.force_login(usuario)
+
+            for nombre, url in self._casos():
+                self._peticion(cliente, url)  # calentamiento
+                tiempos = []
+                for _ in range(repeticiones):
+                    with CaptureQueriesContext(connection) as consultas:
+                        inicio = time.perf_counter()
+                        estado = self._peticion(cliente, url)
+                        tiempos.append(time.perf_counter() - inicio)
+                resultados[nombre] = {
+                    'url': url,
+                    'estado': estado,
+                    'consultas': len(consultas),
+                    **_estadisticas(tiempos),
+                }
+            transaction.set_rollback(True)
+        return resultados
+
+    @staticmethod
+    def _peticion(cliente, url):
+        respuesta = cliente.get(url)
+        if respuesta.streaming:
+            for _ in respuesta.streaming_content:
+                pass
+        else:
+            respuesta.content
+        return respuesta.status_code
+
+    # --- Registro concurrente de ventas --------------------------------------
+
+    def _medir_concurrencia(self, trabajadores, ventas, lineas):
+        """Registra ventas reales con registrar_venta desde varios hilos.
+
+        Al terminar se borran las ventas creadas, se devuelve la existencia
+        descontada y se reconstruyen los resúmenes del día.
+        """
+        productos = list(
+            Producto.objects.filter(Existencia__gte=ventas * trabajadores)
+            .order_by('-Existencia').values_list('pk', flat=True)[:200]
+        )
+        if len(productos) < lineas:
+            raise CommandError("No hay suficientes productos con existencia para la prueba de concurrencia.")
+        cliente_id = Cliente.objects.values_list('pk', flat=True).first()
+
+        creadas = []
+        tiempos = []
+        errores = {}
+        candado = threading.Lock()
+        contencion.reiniciar()
+
+        def trabajador(semilla):
+            azar = random.Random(semilla)
+            # Mitad de las líneas sobre pocos productos "populares" para provocar contención
+            calientes = productos[:max(lineas, 5)]
+            try:
+                for _ in range(ventas):
+                    elegidos = set(azar.sample(calientes, lineas // 2))
+                    while len(elegidos) < lineas:
+                        elegidos.add(azar.choice(productos))
+                    inicio = time.perf_counter()
+                    try:
+                        venta = registrar_venta(Venta(Cliente_id=cliente_id), [(pid, 1) for pid in elegidos])
+                    except (ValidationError, DatabaseError) as error:
+                        with candado:
+                            errores[type(error).__name__] = errores.get(type(error).__name__, 0) + 1
+                        continue
+                    duracion = time.perf_counter() - inicio
+                    with candado:
+                        tiempos.append(duracion)
+                        creadas.append((venta.pk, elegidos))
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=trabajador, args=(i,)) for i in range(trabajadores)]
+        inicio = time.perf_counter()
+        try:
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            duracion = time.perf_counter() - inicio
+        finally:
+            self._deshacer_ventas(creadas)
+        resumen_contencion = contencion.resumen(top=5)
+        return {
+            'ventas_registradas': len(creadas),
+            'ventas_fallidas': errores,
+            'duracion_s': round(duracion, 3),
+            'ventas_por_segundo': round(len(creadas) / duracion, 2) if duracion else None,
+            **(_estadisticas(tiempos) if tiempos else {}),
+            'reintentos': resumen_contencion['reintentos'],
+            'fallos_tras_reintentos': resumen_contencion['fallos_tras_reintentos'],
+        }
+
+    @staticmethod
+    def _deshacer_ventas(creadas):
+        if not creadas:
+            return
+        devolver = {}
+        for _, elegidos in creadas:
+            for producto_id in elegidos:
+                devolver[producto_id] = devolver.get(producto_id, 0) + 1
+        hoy = timezone.localdate()
+        with transaction.atomic():
+            Venta.objects.filter(pk__in=[pk for pk, _ in creadas]).delete()
+            productos = bloquear_productos(devolver)
+            ajustar_existencias(productos, devolver, MovimientoInventario.DEVOLUCION)
+            reconstruir_resumen(hoy, hoy)
+            reconstruir_productos(hoy, hoy)
+
+    # --- Salida ---------------------------------------------------------------
+
+    def _mostrar(self, resultados):
+        self.stdout.write(
+            f"Benchmark {resultados['etiqueta'] or ''} ({resultados['entorno']['motor']}, "
+            f"{resultados['volumen']['ventas']} ventas, {resultados['volumen']['productos']} productos)"
+        )
+        for nombre, dato in resultados.get('vistas', {}).items():
+            self.stdout.write(
+                f"  {nombre:<22} {dato['estado']} | p50 {dato['p50_ms']:9.2f} ms | "
+                f"p95 {dato['p95_ms']:9.2f} ms | {dato['consultas']:3} consultas"
+            )
+        concurrencia = resultados.get('concurrencia')
+        if concurrencia:
+            self.stdout.write(
+                f"  registro concurrente: {concurrencia['ventas_registradas']} ventas en "
+                f"{concurrencia['duracion_s']} s ({concurrencia['ventas_por_segundo']} ventas/s), "
+                f"p95 {concurrencia.get('p95_ms', 0):.2f} ms, {concurrencia['reintentos']} reintentos, "
+                f"fallidas {concurrencia['ventas_fallidas'] or 0}"
+            )
+
+    def _comparar(self, anterior, actual):
+        self.stdout.write(f"Comparación contra {anterior.get('etiqueta') or anterior.get('fecha')}:")
+        for nombre, dato in actual.get('vistas', {}).items():
+            previo = anterior.get('vistas', {}).get(nombre)
+            if not previo:
+                continue
+            cambio = (dato['p50_ms'] - previo['p50_ms']) / previo['p50_ms'] * 100 if previo['p50_ms'] else 0
+            consultas = dato['consultas'] - previo['consultas']
+            linea = f"  {nombre:<22} p50 {cambio:+7.1f}% | consultas {consultas:+d}"
+            if cambio > 20 or consultas > 0:
+                linea = self.style.WARNING(linea)
+            self.stdout.write(linea)
+        previo = anterior.get('concurrencia', {}).get('ventas_por_segundo')
+        actual_vps = actual.get('concurrencia', {}).get('ventas_por_segundo')
+        if previo and actual_vps:
+            self.stdout.write(f"  ventas/s {(actual_vps - previo) / previo * 100:+.1f}%")
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from ventas.management.commands.benchmark import _estadisticas
+from ventas.models import Usuario, Venta
+
+# Vistas que agrupan consultas independientes con consultas_concurrentes
+VISTAS = [
+    ('dashboard', 'dashboard', ''),
+    ('dashboard_anio', 'dashboard', '?periodo=anio'),
+    ('ventas_detalle', 'ventas_detalle', None),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el dashboard y el detalle de venta atendidos por el manejador WSGI y por el "
+        "ASGI, con las consultas en serie y concurrentes. Usa una base ya poblada "
+        "(sembrar_datos). Con SQLite las consultas siempre van en serie, así que la "
+        "comparación serie/concurrente solo tiene sentido sobre Postgres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=30)
+        parser.add_argument('--salida', help='Archivo JSON de resultados.')
+
+    def handle(self, *args, **options):
+        venta = Venta.objects.order_by('-pk').values_list('pk', flat=True).first()
+        if venta is None:
+            raise CommandError("No hay ventas; ejecute antes sembrar_datos.")
+        urls = {
+            nombre: reverse(url, args=[venta]) if parametros is None else reverse(url) + parametros
+            for nombre, url, parametros in VISTAS
+        }
+
+        # El usuario se crea fuera de una transacción: dentro de una las consultas no se paralelizan
+        usuario = Usuario.objects.create_superuser(f'benchmark-{uuid.uuid4().hex[:8]}', None, None)
+        resultados = {}
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for concurrentes in (False, True):
+                    modo = 'concurrente' if concurrentes else 'serie'
+                    with override_settings(CONSULTAS_CONCURRENTES=concurrentes):
+                        resultados[f'wsgi_{modo}'] = self._medir_wsgi(usuario, urls, options['repeticiones'])
+                        resultados[f'asgi_{modo}'] = asyncio.run(
+                            self._medir_asgi(usuario, urls, options['repeticiones'])
+                        )
+        finally:
+            usuario.delete()
+
+        self.stdout.write(f"{'':<16}" + ''.join(f"{modo:>18}" for modo in resultados))
+        for nombre in urls:
+            self.stdout.write(
+                f"{nombre:<16}" + ''.join(f"{datos[nombre]['p50_ms']:>15.2f} ms" for datos in resultados.values())
+            )
+        self.stdout.write("(mediana por petición)")
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump({'motor': settings.DATABASES['default']['ENGINE'], 'vistas': urls,
+                           'resultados': resultados}, archivo, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}"))
+
+    @staticmethod
+    def _medir_wsgi(usuario, urls, repeticiones):
+        cliente = Client()
+        cliente.force_login(usuario)
+        resultados = {}
+        for nombre, url in urls.items():
+            cliente.get(url)  # calentamiento
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                respuesta = cliente.get(url)
+                tiempos.append(time.perf_counter() - inicio)
+            resultados[nombre] = {'estado': respuesta.status_code, **_estadisticas(tiempos)}
+        cliente.logout()
+        return resultados
+
+    @staticmethod
+    async def _medir_asgi(usuario, urls, repeticiones):
+        cliente = AsyncClient()
+        await cliente.aforce_login(usuario)
+        resultados = {}
+        for nombre, url in urls.items():
+            await cliente.get(url)  # calentamiento
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                respuesta = await cliente.get(url)
+                tiempos.append(time.perf_counter() - inicio)
+            resultados[nombre] = {'estado': respuesta.status_code, **_estadisticas(tiempos)}
+        await cliente.alogout()
+        return resultados
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction, DatabaseError
+from django.utils import timezone
+
+from ventas.inventario import configurar_franjas, contencion, existencias_actuales, registrar_venta, repartir_franjas
+from ventas.management.commands.benchmark import _estadisticas
+from ventas.models import Categoria, Cliente, Marca, Producto, Venta
+from ventas.resumenes import reconstruir_resumen, reconstruir_productos
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la contención al vender los mismos productos desde varias cajas a la vez, "
+        "con la existencia en una sola fila y repartida en franjas. Los productos y ventas "
+        "de la prueba se borran al terminar. Con SQLite toda escritura bloquea la base "
+        "entera, así que la comparación solo tiene sentido sobre Postgres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trabajadores', type=int, default=8)
+        parser.add_argument('--ventas', type=int, default=50, help='Ventas por trabajador.')
+        parser.add_argument('--productos', type=int, default=2, help='Productos calientes en cada venta.')
+        parser.add_argument('--franjas', type=int, default=8)
+        parser.add_argument('--salida', help='Archivo JSON de resultados.')
+
+    def handle(self, *args, **options):
+        productos, cliente = self._preparar_datos(options)
+        resultados = {}
+        try:
+            for franjas in (0, options['franjas']):
+                for producto_id in productos:
+                    configurar_franjas(producto_id, franjas)
+                nombre = f'franjas_{franjas}' if franjas else 'una_fila'
+                antes = sum(existencias_actuales(productos).values())
+                resultados[nombre] = self._medir(productos, cliente, options)
+                repartir_franjas(productos)
+                # Lo descontado debe cuadrar con lo vendido: ninguna franja vende de más ni pierde unidades
+                resultados[nombre]['unidades_descontadas'] = antes - sum(existencias_actuales(productos).values())
+        finally:
+            self._limpiar(productos)
+
+        self.stdout.write(f"{options['trabajadores']} cajas x {options['ventas']} ventas, "
+                          f"{options['productos']} productos calientes por venta")
+        for nombre, datos in resultados.items():
+            self.stdout.write(
+                f"  {nombre:<10} {datos['ventas_por_segundo']:>8} ventas/s | "
+                f"p50 {datos.get('p50_ms', 0):8.2f} ms | p95 {datos.get('p95_ms', 0):8.2f} ms | "
+                f"reintentos {datos['reintentos']}"
+            )
+            if datos['unidades_descontadas'] != datos['ventas_registradas'] * options['productos']:
+                self.stdout.write(self.style.ERROR(
+                    f"  {nombre}: se descontaron {datos['unidades_descontadas']} unidades por "
+                    f"{datos['ventas_registradas']} ventas"
+                ))
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump({'motor': settings.DATABASES['default']['ENGINE'], 'parametros': {
+                    clave: options[clave] for clave in ('trabajadores', 'ventas', 'productos', 'franjas')
+                }, 'resultados': resultados}, archivo, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}"))
+
+    @staticmethod
+    def _preparar_datos(options):
+        marca = Marca.objects.create(NombreMarca='Benchmark')
+        categoria = Categoria.objects.create(NombreCategoria='Benchmark')
+        cliente = Cliente.objects.create(
+            PrimerNombre='Cliente', SegundoNombre='', PrimerApellido='Benchmark', SegundoApellido='',
+        )
+        prefijo = f'franjas-{uuid.uuid4().hex[:8]}'
+        existencia = options['trabajadores'] * options['ventas'] * 2
+        productos = [
+            Producto.objects.create(
+                Codigo=f'{prefijo}-{i}', NombreProducto=f'Caliente {i}', Descripcion='Producto de benchmark',
+                Existencia=existencia, Precio=Decimal('10.50'), Marca=marca, Categoria=categoria,
+            ).pk
+            for i in range(options['productos'])
+        ]
+        return productos, cliente
+
+    @staticmethod
+    def _medir(productos, cliente, options):
+        tiempos = []
+        errores = {}
+        candado = threading.Lock()
+        contencion.reiniciar()
+
+        def trabajador():
+            try:
+                for _ in range(options['ventas']):
+                    inicio = time.perf_counter()
+                    try:
+                        registrar_venta(Venta(Cliente=cliente), [(producto_id, 1) for producto_id in productos])
+                    except (ValidationError, DatabaseError) as error:
+                        with candado:
+                            errores[type(error).__name__] = errores.get(type(error).__name__, 0) + 1
+                        continue
+                    with candado:
+                        tiempos.append(time.perf_counter() - inicio)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=trabajador) for _ in range(options['trabajadores'])]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        return {
+            'ventas_registradas': len(tiempos),
+            'ventas_fallidas': errores,
+            'duracion_s': round(duracion, 3),
+            'ventas_por_segundo': round(len(tiempos) / duracion, 2) if duracion else None,
+            **(_estadisticas(tiempos) if tiempos else {}),
+            'reintentos': contencion.resumen()['reintentos'],
+        }
+
+    @staticmethod
+    def _limpiar(productos):
+        hoy = timezone.localdate()
+        with transaction.atomic():
+            producto = Producto.objects.select_related('Marca', 'Categoria').get(pk=productos[0])
+            ventas = Venta.objects.filter(detalles__Producto__in=productos).distinct()
+            clientes = list(ventas.values_list('Cliente_id', flat=True).distinct())
+            Venta.objects.filter(pk__in=ventas.values('pk')).delete()
+            Producto.objects.filter(pk__in=productos).delete()
+            Cliente.objects.filter(pk__in=clientes).delete()
+            producto.Marca.delete()
+            producto.Categoria.delete()
+            reconstruir_resumen(hoy, hoy)
+            reconstruir_productos(hoy, hoy)
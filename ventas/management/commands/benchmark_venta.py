@@ -0,0 +1,98 @@
+import time
+from decimal import Decimal
+from statistics import mean, median
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from ventas.inventario import registrar_venta
+from ventas.models import Categoria, Cliente, Marca, Producto, Venta, VentaDetalle
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el registro de una venta línea por línea (VentaDetalle.save) "
+        "contra el registro en bloque (inventario.registrar_venta). "
+        "Los datos de prueba se descartan al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lineas', type=int, default=30, help='Líneas por venta.')
+        parser.add_argument('--repeticiones', type=int, default=20, help='Ventas por método.')
+
+    def handle(self, *args, **options):
+        lineas = options['lineas']
+        repeticiones = options['repeticiones']
+
+        with transaction.atomic():
+            productos, cliente = self._preparar_datos(lineas)
+
+            resultados = {
+                'por fila': self._medir(self._registrar_por_fila, cliente, productos, repeticiones),
+                'en bloque': self._medir(self._registrar_en_bloque, cliente, productos, repeticiones),
+            }
+
+            # Nada de lo creado debe quedar en la base.
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Venta de {lineas} líneas, {repeticiones} repeticiones por método")
+        for nombre, (tiempos, consultas) in resultados.items():
+            self.stdout.write(
+                f"  {nombre:<10} media {mean(tiempos) * 1000:8.2f} ms | "
+                f"mediana {median(tiempos) * 1000:8.2f} ms | "
+                f"{consultas} consultas por venta"
+            )
+
+        base = mean(resultados['por fila'][0])
+        bloque = mean(resultados['en bloque'][0])
+        if bloque:
+            self.stdout.write(self.style.SUCCESS(f"Aceleración: x{base / bloque:.1f}"))
+
+    def _preparar_datos(self, lineas):
+        marca = Marca.objects.create(NombreMarca='Benchmark')
+        categoria = Categoria.objects.create(NombreCategoria='Benchmark')
+        cliente = Cliente.objects.create(
+            PrimerNombre='Cliente', SegundoNombre='', PrimerApellido='Benchmark', SegundoApellido='',
+        )
+        productos = Producto.objects.bulk_create([
+            Producto(
+                NombreProducto=f'Producto {i}',
+                Descripcion='Producto de benchmark',
+                Existencia=99999,
+                Precio=Decimal('10.50'),
+                Marca=marca,
+                Categoria=categoria,
+            )
+            for i in range(lineas)
+        ])
+        if productos[0].pk is None:
+            productos = list(Producto.objects.filter(Marca=marca).order_by('pk'))
+        return productos, cliente
+
+    def _medir(self, registrar, cliente, productos, repeticiones):
+        tiempos = []
+        consultas = 0
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                registrar(cliente, productos)
+                tiempos.append(time.perf_counter() - inicio)
+            consultas = len(capturadas)
+        return tiempos, consultas
+
+    @staticmethod
+    def _registrar_por_fila(cliente, productos):
+        with transaction.atomic():
+            venta = Venta.objects.create(Cliente=cliente)
+            for producto in productos:
+                VentaDetalle(
+                    Venta=venta,
+                    Producto=producto,
+                    CantidadVendida=1,
+                    PrecioUnitario=producto.Precio,
+                ).save()
+
+    @staticmethod
+    def _registrar_en_bloque(cliente, productos):
+        registrar_venta(Venta(Cliente=cliente), [(producto, 1) for producto in productos])
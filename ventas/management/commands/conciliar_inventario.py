@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas.existencias import conciliar_existencias
+
+
+class Command(BaseCommand):
+    help = (
+        "Verifica que Producto.Existencia coincida con la bitácora de movimientos "
+        "(último corte + movimientos posteriores)."
+    )
+
+    def add_arguments(self, parser):
+        grupo = parser.add_mutually_exclusive_group()
+        grupo.add_argument(
+            '--corregir', action='store_const', const='proyeccion', dest='corregir',
+            help='Reescribir Existencia con el valor de la bitácora.',
+        )
+        grupo.add_argument(
+            '--ajustar-bitacora', action='store_const', const='bitacora', dest='corregir',
+            help='Registrar movimientos de ajuste para que la bitácora cuadre con Existencia.',
+        )
+
+    def handle(self, *args, **options):
+        diferencias = conciliar_existencias(options['corregir'])
+        for producto_id, existencia, calculada in diferencias:
+            self.stdout.write(f"Producto {producto_id}: Existencia={existencia} bitácora={calculada}")
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("La existencia coincide con la bitácora."))
+        elif options['corregir']:
+            self.stdout.write(self.style.SUCCESS(f"{len(diferencias)} productos corregidos."))
+        else:
+            raise CommandError(f"{len(diferencias)} productos no coinciden con la bitácora.")
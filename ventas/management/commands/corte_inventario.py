@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ventas.existencias import generar_corte
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda la existencia de cada producto al cierre de un día (por defecto ayer). "
+        "Conviene programarlo a diario: la existencia a una fecha solo suma los movimientos "
+        "posteriores al último corte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', type=parse_date, help='Día a cortar (AAAA-MM-DD), ya terminado.')
+
+    def handle(self, *args, **options):
+        fecha = options['fecha'] or timezone.localdate() - timedelta(days=1)
+        try:
+            productos = generar_corte(fecha)
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(f"Corte del {fecha}: {productos} productos."))
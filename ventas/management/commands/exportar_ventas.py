@@ -0,0 +1,46 @@
+import argparse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from ventas.exportar import generar_csv, comprimir_gzip, EXPORTACIONES
+
+
+def _fecha(valor):
+    # parse_date devuelve None si el texto no tiene forma de fecha: sin esto el límite se ignoraría
+    try:
+        fecha = parse_date(valor)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise argparse.ArgumentTypeError(f"fecha inválida: {valor!r} (use AAAA-MM-DD)")
+    return fecha
+
+
+class Command(BaseCommand):
+    help = "Exporta ventas o líneas de venta a CSV en streaming (memoria constante)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipo', choices=sorted(EXPORTACIONES), default='ventas')
+        parser.add_argument('--desde', type=_fecha, help='Fecha inicial (AAAA-MM-DD).')
+        parser.add_argument('--hasta', type=_fecha, help='Fecha final (AAAA-MM-DD).')
+        parser.add_argument('--salida', help='Archivo de salida (por defecto la salida estándar).')
+        parser.add_argument('--gzip', action='store_true', help='Comprimir la salida con gzip (requiere --salida).')
+
+    def handle(self, *args, **options):
+        if options['gzip'] and not options['salida']:
+            raise CommandError("--gzip escribe un archivo binario: indique --salida.")
+        contenido = generar_csv(options['tipo'], options['desde'], options['hasta'])
+        if options['gzip']:
+            contenido = comprimir_gzip(contenido)
+
+        if options['salida']:
+            with open(options['salida'], 'wb') as archivo:
+                for trozo in contenido:
+                    archivo.write(trozo)
+            self.stderr.write(self.style.SUCCESS(f"Exportado a {options['salida']}"))
+        else:
+            # Por self.stdout, que call_command puede redirigir; cada trozo termina en una fila completa
+            for trozo in contenido:
+                self.stdout.write(trozo.decode('utf-8'), ending='')
+            self.stdout.flush()
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas.importar import importar_productos, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa o actualiza productos desde un CSV (Codigo, NombreProducto, Descripcion, "
+        "Precio, Existencia, Marca, Categoria) en lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV (UTF-8).')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por lote.')
+        parser.add_argument('--delimitador', default=',', help='Separador de columnas.')
+        parser.add_argument(
+            '--actualizar-existencia', action='store_true',
+            help='Reemplazar también la existencia de los productos ya registrados.',
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+                resultado = importar_productos(
+                    archivo,
+                    tamano_lote=options['lote'],
+                    actualizar_existencia=options['actualizar_existencia'],
+                    delimitador=options['delimitador'],
+                )
+        except OSError as error:
+            raise CommandError(error)
+
+        for linea, mensaje in resultado.errores:
+            self.stdout.write(self.style.WARNING(f"Línea {linea}: {mensaje}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado} en {time.perf_counter() - inicio:.1f}s"
+        ))
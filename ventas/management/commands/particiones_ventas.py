@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas.particiones import (
+    MESES_ADELANTE, TABLAS, crear_particiones, esta_particionado, particionar, particiones,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Particiona por mes Venta y VentaDetalle (Postgres, --convertir) y crea por adelantado "
+        "sus particiones mensuales. La cola de tareas las crea a diario (particiones.crear): "
+        "una venta de un mes sin partición cae en la partición por defecto, que no se poda "
+        "en las consultas por fecha."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=MESES_ADELANTE, help='Meses a dejar creados hacia adelante.')
+        parser.add_argument('--estado', action='store_true', help='Solo listar las particiones existentes.')
+        parser.add_argument('--convertir', action='store_true',
+                            help='Convertir las tablas en particionadas (bloquea las ventas mientras copia).')
+        parser.add_argument('--no-input', action='store_false', dest='interactivo',
+                            help='No pedir confirmación.')
+
+    def handle(self, *args, **options):
+        if options['convertir'] and not esta_particionado():
+            if options['interactivo']:
+                respuesta = input("Se copiarán y bloquearán las tablas de ventas. Escriba 'si' para continuar: ")
+                if respuesta.strip().lower() != 'si':
+                    raise CommandError("Conversión cancelada.")
+            try:
+                particionar(options['meses'])
+            except ValueError as error:
+                raise CommandError(error)
+            self.stdout.write(self.style.SUCCESS("Tablas de ventas particionadas."))
+        elif not esta_particionado():
+            raise CommandError("Las tablas de ventas no están particionadas (solo en Postgres, con --convertir).")
+        elif not options['estado']:
+            try:
+                creadas = crear_particiones(options['meses'])
+            except ValueError as error:
+                raise CommandError(error)
+            for nombre in creadas:
+                self.stdout.write(f"Creada {nombre}")
+            self.stdout.write(self.style.SUCCESS(f"{len(creadas)} particiones nuevas."))
+
+        for tabla in TABLAS:
+            self.stdout.write(tabla)
+            for nombre, rango, filas in particiones(tabla):
+                self.stdout.write(f"  {nombre:<34} {rango:<60} ~{filas} filas")
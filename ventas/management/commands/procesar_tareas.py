@@ -0,0 +1,48 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas.models import Tarea
+from ventas.tareas import estado_cola, reintentar_muertas, trabajar
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta las tareas en segundo plano (resúmenes de ventas) hasta recibir SIGINT/SIGTERM. "
+        "No hace falta si gunicorn corre con TAREAS_EN_PROCESO=1. Con --una-vez vacía la cola y "
+        "termina; con --estado muestra la cola y las tareas muertas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, help='Hilos del trabajador (por defecto TAREAS_HILOS).')
+        parser.add_argument('--una-vez', action='store_true', help='Terminar cuando la cola quede vacía.')
+        parser.add_argument('--estado', action='store_true', help='Solo mostrar el estado de la cola.')
+        parser.add_argument('--reintentar-muertas', action='store_true',
+                            help='Devolver a la cola las tareas muertas con los intentos en cero.')
+
+    def handle(self, *args, **options):
+        if options['estado']:
+            estado = estado_cola()
+            self.stdout.write(
+                f"Pendientes: {estado['pendiente']}, en curso: {estado['en_curso']}, "
+                f"muertas: {estado['muerta']}, más antigua: {estado['antiguedad']:.1f} s."
+            )
+            for muerta in Tarea.objects.filter(Estado=Tarea.MUERTA).order_by('pk')[:20]:
+                ultima = muerta.Error.strip().splitlines()[-1:] or ['']
+                self.stdout.write(f"  #{muerta.pk} {muerta.Nombre} {muerta.Argumentos}: {ultima[0]}")
+            return
+        if options['reintentar_muertas']:
+            self.stdout.write(self.style.SUCCESS(f"{reintentar_muertas()} tareas devueltas a la cola."))
+            return
+
+        hilos = options['hilos'] or settings.TAREAS_HILOS
+        if hilos < 1:
+            raise CommandError("--hilos debe ser al menos 1.")
+        parar = threading.Event()
+        for senal in (signal.SIGINT, signal.SIGTERM):
+            # Se termina la tanda en curso antes de salir
+            signal.signal(senal, lambda *_: parar.set())
+        trabajar(hilos, parar=parar, una_vez=options['una_vez'])
+        self.stdout.write(self.style.SUCCESS("Trabajador detenido."))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas.inventario import configurar_franjas, repartir_franjas
+from ventas.models import Producto
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebalancea la existencia de los productos con franjas y refresca Producto.Existencia "
+        "(lo que leen las listas y el aviso de existencia baja). Con --franjas se activa o "
+        "desactiva el modo por franjas de los productos indicados. Con --cada queda corriendo "
+        "como proceso de fondo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('productos', nargs='*', type=int, help='Id_Producto; por defecto todos los que tienen franjas.')
+        parser.add_argument(
+            '--franjas', type=int,
+            help='Repartir la existencia de los productos indicados en N franjas (0 = una sola fila).',
+        )
+        parser.add_argument('--cada', type=float, help='Repetir el reparto cada N segundos.')
+
+    def handle(self, *args, **options):
+        productos = options['productos'] or None
+        if options['franjas'] is not None:
+            if not productos:
+                raise CommandError("Indique los productos a configurar.")
+            if not 0 <= options['franjas'] <= 64:
+                raise CommandError("--franjas debe estar entre 0 y 64.")
+            for producto_id in productos:
+                try:
+                    configurar_franjas(producto_id, options['franjas'])
+                except Producto.DoesNotExist as error:
+                    raise CommandError(error)
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(productos)} productos configurados con {options['franjas']} franjas."
+            ))
+            return
+
+        while True:
+            repartidos = repartir_franjas(productos)
+            self.stdout.write(f"{repartidos} productos repartidos.")
+            if not options['cada']:
+                return
+            time.sleep(options['cada'])
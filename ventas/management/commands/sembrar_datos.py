@@ -0,0 +1,250 @@
+import math
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ventas.models import (
+    Categoria, Cliente, ExistenciaCorte, FranjaExistencia, Marca, MovimientoInventario, Producto, Venta, VentaDetalle,
+    VentaProductoDiario, VentaResumenDiario,
+)
+from ventas.listas import LISTAS, invalidar_lista
+from ventas.reportes import invalidar_reportes
+from ventas.resumenes import reconstruir_resumen, reconstruir_productos
+
+NOMBRES = [
+    'José', 'María', 'Juan', 'Ana', 'Luis', 'Carmen', 'Carlos', 'Rosa', 'Jorge', 'Lucía', 'Miguel',
+    'Elena', 'Pedro', 'Sofía', 'Francisco', 'Isabel', 'Manuel', 'Patricia', 'Antonio', 'Gabriela',
+]
+APELLIDOS = [
+    'García', 'Hernández', 'López', 'Martínez', 'González', 'Pérez', 'Rodríguez', 'Sánchez', 'Ramírez',
+    'Cruz', 'Flores', 'Gómez', 'Morales', 'Vázquez', 'Reyes', 'Jiménez', 'Torres', 'Díaz', 'Ruiz', 'Mendoza',
+]
+ARTICULOS = [
+    'Martillo', 'Desarmador', 'Pinza', 'Llave', 'Tornillo', 'Clavo', 'Taladro', 'Broca', 'Lija', 'Cinta',
+    'Brocha', 'Rodillo', 'Pintura', 'Cable', 'Foco', 'Apagador', 'Contacto', 'Tubo', 'Codo', 'Válvula',
+    'Candado', 'Bisagra', 'Serrucho', 'Flexómetro', 'Nivel', 'Pala', 'Carretilla', 'Manguera', 'Silicón',
+]
+VARIANTES = ['1/4"', '1/2"', '3/4"', '1"', 'chico', 'mediano', 'grande', 'acero', 'latón', 'PVC', 'cobre',
+             'industrial', 'profesional', '10 m', '20 m', '100 pzas']
+MARCAS = ['Truper', 'Pretul', 'Urrea', 'Surtek', 'Stanley', 'Bosch', 'Makita', 'DeWalt', 'Comex', 'Rotoplas',
+          'Coflex', 'Volteck', 'Foset', 'Hermex', 'Fiero', 'Klintek', 'Austromex', 'Phillips', 'Iusa', 'Tigre']
+CATEGORIAS = ['Herramientas', 'Tornillería', 'Eléctrico', 'Plomería', 'Pinturas', 'Jardinería', 'Cerrajería',
+              'Adhesivos', 'Iluminación', 'Construcción', 'Seguridad', 'Medición', 'Abrasivos', 'Limpieza']
+
+
+def _pesos_zipf(n, exponente):
+    """Pesos acumulados de una distribución Zipf: el producto k tiene peso 1 / k^s."""
+    return list(accumulate(1 / (k ** exponente) for k in range(1, n + 1)))
+
+
+def _pesos_dias(dias, hoy):
+    """Pesos acumulados por día: estacionalidad anual, fin de semana y temporada decembrina."""
+    pesos = []
+    for atras in range(dias):
+        fecha = hoy - timedelta(days=atras)
+        peso = 1 + 0.25 * math.sin(2 * math.pi * (fecha.timetuple().tm_yday - 80) / 365)
+        peso *= (0.9, 0.9, 0.95, 1.0, 1.15, 1.4, 0.6)[fecha.weekday()]
+        if fecha.month == 12:
+            peso *= 1.3
+        pesos.append((fecha, peso))
+    return [fecha for fecha, _ in pesos], list(accumulate(peso for _, peso in pesos))
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos (clientes, marcas, categorías, productos y ventas) para "
+        "medir rendimiento. La popularidad de los productos sigue una distribución Zipf y "
+        "las fechas tienen estacionalidad semanal y anual. Los resúmenes se reconstruyen al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=2000)
+        parser.add_argument('--marcas', type=int, default=40)
+        parser.add_argument('--categorias', type=int, default=25)
+        parser.add_argument('--productos', type=int, default=5000)
+        parser.add_argument('--ventas', type=int, default=50000)
+        parser.add_argument('--lineas-max', type=int, default=8, help='Máximo de líneas por venta.')
+        parser.add_argument('--dias', type=int, default=365, help='Días hacia atrás que cubren las ventas.')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Exponente de popularidad de productos.')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla para datos reproducibles.')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bulk_create.')
+        parser.add_argument(
+            '--limpiar', action='store_true',
+            help='Borrar antes TODAS las ventas, productos, marcas, categorías y clientes (solo con DEBUG).',
+        )
+        parser.add_argument('--no-input', action='store_false', dest='interactivo',
+                            help='No pedir confirmación para --limpiar.')
+
+    def handle(self, *args, **options):
+        if options['ventas'] and (not options['productos'] or not options['clientes']):
+            raise CommandError("Para generar ventas se necesitan productos y clientes.")
+        if options['lineas_max'] > options['productos']:
+            raise CommandError("--lineas-max no puede ser mayor que --productos.")
+
+        if options['limpiar']:
+            self._confirmar_limpieza(options['interactivo'])
+
+        self.azar = random.Random(options['semilla'])
+        self.lote = options['lote']
+        inicio = time.perf_counter()
+
+        if options['limpiar']:
+            self._limpiar()
+
+        with transaction.atomic():
+            marcas = self._crear_catalogo(Marca, 'NombreMarca', MARCAS, options['marcas'])
+            categorias = self._crear_catalogo(Categoria, 'NombreCategoria', CATEGORIAS, options['categorias'])
+            clientes = self._crear_clientes(options['clientes'])
+            productos = self._crear_productos(options['productos'], marcas, categorias)
+        # bulk_create no emite post_save
+        for lista in LISTAS:
+            invalidar_lista(lista)
+        self.stdout.write(
+            f"Catálogo: {len(marcas)} marcas, {len(categorias)} categorías, "
+            f"{len(productos)} productos, {len(clientes)} clientes"
+        )
+
+        if options['ventas']:
+            desde, hasta, lineas = self._crear_ventas(
+                options['ventas'], options['lineas_max'], options['dias'], options['zipf'], clientes, productos,
+            )
+            self.stdout.write(f"Ventas: {options['ventas']} ventas, {lineas} líneas")
+            dias = reconstruir_resumen(desde, hasta)
+            contadores = reconstruir_productos(desde, hasta)
+            invalidar_reportes()
+            self.stdout.write(f"Resúmenes: {dias} días, {contadores} contadores por producto")
+
+        self.stdout.write(self.style.SUCCESS(f"Datos generados en {time.perf_counter() - inicio:.1f}s"))
+
+    def _confirmar_limpieza(self, interactivo):
+        # Un descuido aquí borra las ventas reales: solo en bases de desarrollo
+        if not settings.DEBUG:
+            raise CommandError("--limpiar solo se permite con DEBUG activo.")
+        if interactivo:
+            respuesta = input(
+                f"Se borrarán TODAS las ventas, productos y clientes de {connection.settings_dict['NAME']}. "
+                "Escriba 'si' para continuar: "
+            )
+            if respuesta.strip().lower() != 'si':
+                raise CommandError("Operación cancelada.")
+
+    def _limpiar(self):
+        # DELETE directo: Model.delete() cargaría cada fila para resolver las cascadas
+        with transaction.atomic(), connection.cursor() as cursor:
+            for modelo in (VentaProductoDiario, VentaResumenDiario, VentaDetalle, Venta,
+                           ExistenciaCorte, MovimientoInventario, FranjaExistencia, Producto, Marca, Categoria,
+                           Cliente):
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(modelo._meta.db_table)}")
+        invalidar_reportes()
+        self.stdout.write(self.style.WARNING("Datos anteriores borrados"))
+
+    def _crear(self, modelo, objetos):
+        creados = []
+        for i in range(0, len(objetos), self.lote):
+            creados.extend(modelo.objects.bulk_create(objetos[i:i + self.lote]))
+        if creados and creados[0].pk is None:
+            raise CommandError("La base de datos no devuelve las llaves de bulk_create.")
+        return [objeto.pk for objeto in creados]
+
+    def _crear_catalogo(self, modelo, campo, nombres, cantidad):
+        return self._crear(modelo, [
+            modelo(**{campo: nombres[i] if i < len(nombres) else f'{nombres[i % len(nombres)]} {i // len(nombres)}'})
+            for i in range(cantidad)
+        ])
+
+    def _crear_clientes(self, cantidad):
+        azar = self.azar
+        return self._crear(Cliente, [
+            Cliente(
+                PrimerNombre=azar.choice(NOMBRES),
+                SegundoNombre=azar.choice(NOMBRES) if azar.random() < 0.4 else '',
+                PrimerApellido=azar.choice(APELLIDOS),
+                SegundoApellido=azar.choice(APELLIDOS),
+                Activo=azar.random() < 0.95,
+            )
+            for _ in range(cantidad)
+        ])
+
+    def _crear_productos(self, cantidad, marcas, categorias):
+        azar = self.azar
+        productos = []
+        for i in range(cantidad):
+            nombre = f'{azar.choice(ARTICULOS)} {azar.choice(VARIANTES)} {i}'
+            # Precios log-normales: muchos artículos baratos y pocos caros
+            precio = Decimal(min(99999.0, max(1.0, azar.lognormvariate(4.5, 1.0)))).quantize(Decimal('0.01'))
+            productos.append(Producto(
+                NombreProducto=nombre[:50],
+                Descripcion=f'{nombre} (datos de prueba)',
+                Existencia=azar.randint(20, 2000),
+                Precio=precio,
+                Marca_id=azar.choice(marcas),
+                Categoria_id=azar.choice(categorias),
+            ))
+        ids = self._crear(Producto, productos)
+        # bulk_create no pasa por Producto.save(): la existencia inicial va a la bitácora aquí
+        self._crear(MovimientoInventario, [
+            MovimientoInventario(Producto_id=producto_id, Tipo=MovimientoInventario.INICIAL, Cantidad=producto.Existencia)
+            for producto_id, producto in zip(ids, productos)
+        ])
+        return list(zip(ids, (producto.Precio for producto in productos)))
+
+    def _crear_ventas(self, cantidad, lineas_max, dias, exponente, clientes, productos):
+        """Inserta ventas históricas; no descuenta existencias, solo simula el pasado."""
+        azar = self.azar
+        # El orden de popularidad es independiente del orden de creación
+        populares = productos[:]
+        azar.shuffle(populares)
+        acumulados_productos = _pesos_zipf(len(populares), exponente)
+        fechas, acumulados_fechas = _pesos_dias(dias, timezone.localdate())
+        # Tickets con pocas líneas son los más comunes
+        opciones_lineas = list(range(1, lineas_max + 1))
+        acumulados_lineas = list(accumulate(1 / k for k in opciones_lineas))
+
+        total_lineas = 0
+        for inicio in range(0, cantidad, self.lote):
+            tamano = min(self.lote, cantidad - inicio)
+            tickets = []
+            for fecha in azar.choices(fechas, cum_weights=acumulados_fechas, k=tamano):
+                elegidos = {}
+                objetivo = azar.choices(opciones_lineas, cum_weights=acumulados_lineas)[0]
+                while len(elegidos) < objetivo:
+                    producto_id, precio = azar.choices(populares, cum_weights=acumulados_productos)[0]
+                    cantidad_vendida = 1 if azar.random() < 0.6 else azar.randint(2, 12)
+                    elegidos[producto_id] = (cantidad_vendida, precio)
+                tickets.append((fecha, elegidos))
+
+            with transaction.atomic():
+                ventas = [
+                    Venta(
+                        Fecha_Venta=fecha,
+                        Cliente_id=azar.choice(clientes),
+                        Total=sum((Decimal(c) * p for c, p in elegidos.values()), Decimal('0.00')),
+                    )
+                    for fecha, elegidos in tickets
+                ]
+                # bulk_create no pasa por Venta.save(): los resúmenes se reconstruyen al final
+                ids = self._crear(Venta, ventas)
+                detalles = [
+                    VentaDetalle(
+                        Venta_id=venta_id,
+                        Fecha_Venta=fecha,
+                        Producto_id=producto_id,
+                        CantidadVendida=cantidad_vendida,
+                        PrecioUnitario=precio,
+                        SubTotal=(Decimal(cantidad_vendida) * precio).quantize(Decimal('0.01')),
+                    )
+                    for venta_id, (fecha, elegidos) in zip(ids, tickets)
+                    for producto_id, (cantidad_vendida, precio) in elegidos.items()
+                ]
+                self._crear(VentaDetalle, detalles)
+            total_lineas += len(detalles)
+            self.stdout.write(f"  {inicio + tamano}/{cantidad} ventas", ending='\r')
+        self.stdout.write('')
+        return fechas[-1], fechas[0], total_lineas
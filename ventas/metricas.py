@@ -0,0 +1,160 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Con varios workers de gunicorn cada proceso escribe sus valores en archivos dentro de
+# PROMETHEUS_MULTIPROC_DIR y /metrics los suma (ver gunicorn.conf.py). La variable debe
+# existir antes de importar prometheus_client.
+MULTIPROCESO = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+SIN_RUTA = '<sin_ruta>'
+METODOS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+LATENCIA = Histogram(
+    'geca_peticion_segundos', 'Duración de la petición por vista.',
+    ['vista', 'metodo', 'estado'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+CONSULTAS = Histogram(
+    'geca_peticion_consultas_sql', 'Consultas SQL ejecutadas por petición.',
+    ['vista'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+TIEMPO_BD = Counter(
+    'geca_bd_segundos', 'Tiempo total dentro de la base de datos por vista.',
+    ['vista'],
+)
+FILAS = Counter(
+    'geca_bd_filas', 'Filas devueltas o afectadas por las consultas de cada vista.',
+    ['vista'],
+)
+
+# Cola de tareas (ventas/tareas.py). Las mide el proceso que ejecuta la tarea: para verlas
+# desde un `procesar_tareas` aparte debe compartir PROMETHEUS_MULTIPROC_DIR con gunicorn.
+TAREA_ESPERA = Histogram(
+    'geca_tarea_espera_segundos', 'Tiempo desde que se encola una tarea hasta que un trabajador la toma.',
+    ['tarea'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+TAREA_DURACION = Histogram(
+    'geca_tarea_segundos', 'Duración de la ejecución de una tarea por resultado.',
+    ['tarea', 'resultado'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+class _ColaTareas:
+    """Profundidad de la cola leída de la base en cada consulta a /metrics (igual para todos los workers)."""
+
+    def collect(self):
+        from .tareas import estado_cola
+        estado = estado_cola()
+        tareas = GaugeMetricFamily('geca_tareas', 'Tareas en la cola por estado.', labels=['estado'])
+        for nombre in ('pendiente', 'en_curso', 'muerta'):
+            tareas.add_metric([nombre], estado[nombre])
+        yield tareas
+        yield GaugeMetricFamily('geca_tarea_antiguedad_segundos',
+                                'Antigüedad de la tarea sin terminar más vieja.', value=estado['antiguedad'])
+
+
+_REGISTRO_COLA = CollectorRegistry(auto_describe=False)
+_REGISTRO_COLA.register(_ColaTareas())
+
+
+class _Medidor:
+    """execute_wrapper que acumula consultas, tiempo y filas de una petición."""
+
+    __slots__ = ('consultas', 'segundos', 'filas', '_candado')
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+        self.filas = 0
+        # Las consultas concurrentes de una petición lo comparten entre hilos
+        self._candado = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            segundos = time.perf_counter() - inicio
+            # psycopg2 informa las filas de un SELECT; sqlite3 devuelve -1
+            filas = getattr(context['cursor'].cursor, 'rowcount', -1)
+            with self._candado:
+                self.segundos += segundos
+                self.consultas += 1
+                if filas > 0:
+                    self.filas += filas
+
+
+# Medidor de la petición en curso; viaja en el contexto copiado a los hilos que la atienden
+_medidor_actual = contextvars.ContextVar('medidor', default=None)
+
+
+@contextmanager
+def _medir(medidor):
+    # execute_wrapper es por conexión y las conexiones son por hilo
+    with ExitStack() as envolturas:
+        if medidor is not None:
+            # Todas las bases: las vistas de solo lectura consultan una réplica (ventas/replicas.py)
+            for alias in connections:
+                envolturas.enter_context(connections[alias].execute_wrapper(medidor))
+        yield
+
+
+def medir_en_hilo():
+    """Cuenta las consultas de este hilo en la petición que lo lanzó."""
+    return _medir(_medidor_actual.get())
+
+
+class MetricasMiddleware:
+    """Registra latencia, consultas SQL, tiempo de base de datos y filas por nombre de url.
+
+    Las respuestas en streaming se miden hasta que la vista devuelve la respuesta,
+    no hasta que se termina de enviar el contenido.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medidor = _Medidor()
+        inicio = time.perf_counter()
+        actual = _medidor_actual.set(medidor)
+        try:
+            with _medir(medidor):
+                respuesta = self.get_response(request)
+        finally:
+            _medidor_actual.reset(actual)
+        duracion = time.perf_counter() - inicio
+
+        # Solo nombres de url conocidos, para no crear una serie por cada ruta inexistente
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = (coincidencia.view_name if coincidencia else None) or SIN_RUTA
+
+        metodo = request.method if request.method in METODOS else 'OTRO'
+        LATENCIA.labels(vista, metodo, str(respuesta.status_code)).observe(duracion)
+        CONSULTAS.labels(vista).observe(medidor.consultas)
+        if medidor.consultas:
+            TIEMPO_BD.labels(vista).inc(medidor.segundos)
+            FILAS.labels(vista).inc(medidor.filas)
+        return respuesta
+
+
+def exportar_metricas():
+    """Devuelve (contenido, content_type) en formato de texto de Prometheus."""
+    if MULTIPROCESO:
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro) + generate_latest(_REGISTRO_COLA), CONTENT_TYPE_LATEST
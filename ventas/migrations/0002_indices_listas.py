@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['PrimerApellido', 'Id_Cliente'], name='cliente_apellido_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['NombreProducto', 'Id_Producto'], name='producto_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['Fecha_Venta', 'Id_Venta'], name='venta_fecha_idx'),
+        ),
+    ]
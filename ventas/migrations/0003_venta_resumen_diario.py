@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:46
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def llenar_resumen(apps, schema_editor):
+    # Carga inicial del resumen con las ventas ya existentes
+    Venta = apps.get_model('ventas', 'Venta')
+    VentaDetalle = apps.get_model('ventas', 'VentaDetalle')
+    VentaResumenDiario = apps.get_model('ventas', 'VentaResumenDiario')
+
+    dias = {}
+    for fila in Venta.objects.order_by().values('Fecha_Venta').annotate(tickets=Count('Id_Venta')):
+        dias[fila['Fecha_Venta']] = VentaResumenDiario(Fecha=fila['Fecha_Venta'], Tickets=fila['tickets'])
+    for fila in (VentaDetalle.objects.order_by().values('Venta__Fecha_Venta')
+                 .annotate(total=Sum('SubTotal'), unidades=Sum('CantidadVendida'))):
+        resumen = dias[fila['Venta__Fecha_Venta']]
+        resumen.Total = fila['total'] or Decimal('0.00')
+        resumen.Unidades = fila['unidades'] or 0
+    VentaResumenDiario.objects.bulk_create(dias.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0002_indices_listas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaResumenDiario',
+            fields=[
+                ('Fecha', models.DateField(primary_key=True, serialize=False)),
+                ('Total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('Tickets', models.IntegerField(default=0)),
+                ('Unidades', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-Fecha'],
+            },
+        ),
+        migrations.RunPython(llenar_resumen, migrations.RunPython.noop),
+    ]
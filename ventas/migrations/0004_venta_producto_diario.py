@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:48
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def llenar_contadores(apps, schema_editor):
+    # Carga inicial de los contadores con las ventas ya existentes
+    VentaDetalle = apps.get_model('ventas', 'VentaDetalle')
+    VentaProductoDiario = apps.get_model('ventas', 'VentaProductoDiario')
+
+    filas = (VentaDetalle.objects.order_by().values('Venta__Fecha_Venta', 'Producto_id')
+             .annotate(unidades=Sum('CantidadVendida'), monto=Sum('SubTotal')))
+    VentaProductoDiario.objects.bulk_create([
+        VentaProductoDiario(
+            Fecha=fila['Venta__Fecha_Venta'],
+            Producto_id=fila['Producto_id'],
+            Unidades=fila['unidades'],
+            Monto=fila['monto'],
+        )
+        for fila in filas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0003_venta_resumen_diario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaProductoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Fecha', models.DateField()),
+                ('Unidades', models.IntegerField(default=0)),
+                ('Monto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('Producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='ventas.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('Fecha', 'Producto'), name='venta_producto_diario_unico')],
+            },
+        ),
+        migrations.RunPython(llenar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:52
+
+from django.db import migrations
+
+# Índices GIN de trigramas para la búsqueda de productos. Son de expresión sobre
+# UPPER(col) porque así traduce Django los filtros icontains en Postgres.
+INDICES = [
+    ('producto_nombre_trgm', 'ventas_producto', 'NombreProducto'),
+    ('producto_descripcion_trgm', 'ventas_producto', 'Descripcion'),
+    ('marca_nombre_trgm', 'ventas_marca', 'NombreMarca'),
+    ('categoria_nombre_trgm', 'ventas_categoria', 'NombreCategoria'),
+]
+
+
+def crear_indices(apps, schema_editor):
+    # En SQLite (pruebas) la búsqueda usa LIKE sin índice
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for nombre, tabla, columna in INDICES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} USING gin (UPPER("{columna}"::text) gin_trgm_ops)'
+        )
+
+
+def borrar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _, _ in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0004_venta_producto_diario'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0005_indices_busqueda_trigramas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='Codigo',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def existencia_inicial(apps, schema_editor):
+    # La existencia actual de cada producto es su primer movimiento
+    Producto = apps.get_model('ventas', 'Producto')
+    MovimientoInventario = apps.get_model('ventas', 'MovimientoInventario')
+    ahora = timezone.now()
+    MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(Producto_id=producto_id, Fecha=ahora, Tipo='inicial', Cantidad=existencia)
+        for producto_id, existencia in Producto.objects.filter(Existencia__gt=0).values_list('pk', 'Existencia')
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0006_producto_codigo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExistenciaCorte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Fecha', models.DateField()),
+                ('Existencia', models.IntegerField()),
+                ('Producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cortes', to='ventas.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['Fecha'], name='existencia_corte_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('Producto', 'Fecha'), name='existencia_corte_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('Tipo', models.CharField(choices=[('inicial', 'Existencia inicial'), ('venta', 'Venta'), ('devolucion', 'Devolución'), ('ajuste', 'Ajuste'), ('compra', 'Compra')], max_length=10)),
+                ('Cantidad', models.IntegerField()),
+                ('Referencia', models.IntegerField(blank=True, null=True)),
+                ('Producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='ventas.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['Producto', 'Fecha'], name='movimiento_producto_fecha_idx'), models.Index(fields=['Fecha'], name='movimiento_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(existencia_inicial, migrations.RunPython.noop),
+    ]
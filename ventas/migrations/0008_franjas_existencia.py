@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0007_bitacora_inventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='Franjas',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='FranjaExistencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('Franja', models.PositiveSmallIntegerField()),
+                ('Existencia', models.IntegerField(default=0)),
+                ('Producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='franjas', to='ventas.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('Producto', 'Franja'), name='franja_existencia_unica'), models.CheckConstraint(condition=models.Q(('Existencia__gte', 0)), name='franja_existencia_ge_0')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Índices que cubren el reporte de ventas (ventas/reportes.py): el rango de fechas se
+# lee de Venta sin tocar la tabla y el cruce con VentaDetalle trae cantidad y subtotal
+# del propio índice. INCLUDE solo existe en Postgres; en SQLite bastan los índices actuales.
+INDICES = [
+    ('venta_fecha_cubre_idx', 'ventas_venta', '"Fecha_Venta"', '"Id_Venta", "Cliente_id"'),
+    ('detalle_venta_cubre_idx', 'ventas_ventadetalle', '"Venta_id", "Producto_id"', '"CantidadVendida", "SubTotal"'),
+]
+
+
+def crear_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, tabla, columnas, incluidas in INDICES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} ({columnas}) INCLUDE ({incluidas})')
+
+
+def borrar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _, _, _ in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0008_franjas_existencia'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_fechas(apps, schema_editor):
+    Venta = apps.get_model('ventas', 'Venta')
+    VentaDetalle = apps.get_model('ventas', 'VentaDetalle')
+    VentaDetalle.objects.update(
+        Fecha_Venta=Subquery(Venta.objects.filter(pk=OuterRef('Venta_id')).values('Fecha_Venta')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0009_indices_reportes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ventadetalle',
+            name='Fecha_Venta',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(copiar_fechas, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ventadetalle',
+            name='Fecha_Venta',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ventadetalle',
+            index=models.Index(fields=['Fecha_Venta', 'Venta'], name='detalle_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:28
+
+import django.utils.timezone
+import ventas.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0010_ventadetalle_fecha_venta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaTerminal',
+            fields=[
+                ('Clave', models.UUIDField(primary_key=True, serialize=False)),
+                ('Terminal', models.CharField(max_length=50)),
+                ('Venta', models.IntegerField()),
+                ('Total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('Recibida', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='Version',
+            field=models.BigIntegerField(default=ventas.models.nueva_version, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['Version', 'Id_Producto'], name='producto_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventaterminal',
+            index=models.Index(fields=['Terminal', 'Recibida'], name='venta_terminal_recibida_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:24
+
+import ventas.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0011_terminales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoEliminado',
+            fields=[
+                ('Id_Producto', models.IntegerField(primary_key=True, serialize=False)),
+                ('Version', models.BigIntegerField(default=ventas.models.nueva_version)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['Version', 'Id_Producto'], name='producto_eliminado_version_idx')],
+            },
+        ),
+    ]
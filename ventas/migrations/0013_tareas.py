@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0012_producto_eliminado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('Id_Tarea', models.BigAutoField(primary_key=True, serialize=False)),
+                ('Nombre', models.CharField(max_length=60)),
+                ('Argumentos', models.JSONField(default=dict)),
+                ('Estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('muerta', 'Muerta')], default='pendiente', max_length=10)),
+                ('Intentos', models.PositiveSmallIntegerField(default=0)),
+                ('Creada', models.DateTimeField(default=django.utils.timezone.now)),
+                ('Disponible', models.DateTimeField(default=django.utils.timezone.now)),
+                ('Iniciada', models.DateTimeField(blank=True, null=True)),
+                ('Error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['Estado', 'Disponible', 'Id_Tarea'], name='tarea_cola_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:37
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def marcar_stock_bajo(apps, schema_editor):
+    # El umbral fijo anterior era 10, que queda como punto de reorden de todas las categorías
+    Producto = apps.get_model('ventas', 'Producto')
+    Producto.objects.filter(Existencia__lte=F('Reorden')).update(StockBajo=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0013_tareas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='PuntoReorden',
+            field=models.PositiveIntegerField(default=10),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='PuntoReorden',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='Reorden',
+            field=models.PositiveIntegerField(default=10, editable=False),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='StockBajo',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(marcar_stock_bajo, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('StockBajo', True)), fields=['Existencia', 'Id_Producto'], name='producto_stock_bajo_idx'),
+        ),
+    ]
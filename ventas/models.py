@@ -2,7 +2,7 @@ from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
-from django.db.models import Sum, Q, CheckConstraint, UniqueConstraint, F
+from django.db.models import Sum, Q, CheckConstraint, UniqueConstraint
 from django.core.exceptions import ValidationError
 
 # Librerias para Manejo de Usuarios
@@ -10,8 +10,13 @@ from django.contrib.auth.models import AbstractUser, Group
 from django.db.models.signals import post_migrate
 from django.dispatch import receiver
 from django.conf import settings
+import time
 
 # Create your models here.
+def nueva_version():
+    """Versión de catálogo de un producto: el instante del cambio, en microsegundos."""
+    return time.time_ns() // 1000
+
 class Cliente(models.Model):
     Id_Cliente=models.AutoField(primary_key=True)
     PrimerNombre=models.CharField(max_length=50)
@@ -20,6 +25,12 @@ class Cliente(models.Model):
     SegundoApellido=models.CharField(max_length=50)
     Activo=models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Orden por apellido en la lista paginada de clientes
+            models.Index(fields=['PrimerApellido', 'Id_Cliente'], name='cliente_apellido_idx'),
+        ]
+
     def __str__(self):
         return f"{self.PrimerNombre} {self.PrimerApellido}".strip()
 
@@ -32,9 +43,13 @@ class Categoria(models.Model):
     Id_Categoria=models.AutoField(primary_key=True)
     NombreCategoria=models.CharField(max_length=50)
     Activo=models.BooleanField(default=True)
+    # Punto de reorden de los productos de la categoría que no tienen uno propio
+    PuntoReorden=models.PositiveIntegerField(default=10)
 
 class Producto(models.Model):
     Id_Producto=models.AutoField(primary_key=True)
+    # Código del proveedor (SKU); identifica el producto al importar listas de precios
+    Codigo=models.CharField(max_length=50, unique=True, null=True, blank=True)
     NombreProducto=models.CharField(max_length=50)
     Descripcion=models.CharField(max_length=200)
     Existencia=models.IntegerField(
@@ -50,15 +65,59 @@ class Producto(models.Model):
     )
     Marca = models.ForeignKey(Marca, on_delete=models.PROTECT, null=False, blank=False)
     Categoria=models.ForeignKey(Categoria, on_delete=models.PROTECT, null=False, blank=False)
+    # 0 = la existencia vive en esta fila; > 0 = repartida en FranjaExistencia (productos de alta rotación)
+    Franjas=models.PositiveSmallIntegerField(default=0, editable=False)
+    # Cambia con cada escritura de la fila; las terminales piden el catálogo a partir de una versión
+    Version=models.BigIntegerField(default=nueva_version, editable=False)
+    # Punto de reorden propio; vacío = el de la categoría. Reorden es el vigente (uno u otro)
+    # y StockBajo = Existencia <= Reorden, mantenido por la capa de inventario al mover existencia.
+    PuntoReorden=models.PositiveIntegerField(null=True, blank=True)
+    Reorden=models.PositiveIntegerField(default=10, editable=False)
+    StockBajo=models.BooleanField(default=False, editable=False)
 
     class Meta:
         constraints = [
             CheckConstraint(check=Q(Existencia__gte=0), name='producto_existencia_ge_0'),
         ]
+        indexes = [
+            # Orden por nombre en la lista paginada de productos
+            models.Index(fields=['NombreProducto', 'Id_Producto'], name='producto_nombre_idx'),
+            # Catálogo incremental de las terminales (ventas/sincronizacion.py)
+            models.Index(fields=['Version', 'Id_Producto'], name='producto_version_idx'),
+            # Solo los productos en su punto de reorden: lista de stock bajo y conteo del dashboard
+            models.Index(fields=['Existencia', 'Id_Producto'], condition=Q(StockBajo=True),
+                         name='producto_stock_bajo_idx'),
+        ]
     
     def __str__(self):
         return self.NombreProducto
 
+    def save(self, *args, **kwargs):
+        self.Version = nueva_version()
+        self.Reorden = self.PuntoReorden
+        if self.Reorden is None:
+            self.Reorden = Categoria.objects.filter(pk=self.Categoria_id).values_list('PuntoReorden', flat=True).get()
+        campos = kwargs.get('update_fields')
+        nuevo = self._state.adding
+        if nuevo:
+            # El producto nace con su estado: no hay cruce que avisar
+            self.StockBajo = self.Existencia <= self.Reorden
+        elif campos is not None:
+            kwargs['update_fields'] = {*campos, 'Version', 'Reorden'}
+        else:
+            # StockBajo lo escribe solo la capa de inventario, que avisa al cruzar el punto de reorden
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name != 'StockBajo']
+        super().save(*args, **kwargs)
+        if not nuevo:
+            from .inventario import revisar_stock_bajo
+            revisar_stock_bajo(self)
+        if nuevo and self.Existencia:
+            # La existencia con que nace el producto es su primer movimiento
+            MovimientoInventario.objects.create(
+                Producto=self, Tipo=MovimientoInventario.INICIAL, Cantidad=self.Existencia,
+            )
+
 class Venta(models.Model):
     Id_Venta=models.AutoField(primary_key=True)
     Fecha_Venta=models.DateField(default=timezone.now)
@@ -69,10 +128,35 @@ class Venta(models.Model):
         constraints = [
             CheckConstraint(check=Q(Total__gte=0), name='venta_total_ge_0'),
         ]
+        indexes = [
+            # Filtros por rango de fechas (listas, dashboard y reportes)
+            models.Index(fields=['Fecha_Venta', 'Id_Venta'], name='venta_fecha_idx'),
+        ]
         ordering = ['-Fecha_Venta', '-Id_Venta']
 
     def __str__(self):
         return f"Venta #{self.Id_Venta} ({self.Fecha_Venta})"
+
+    def save(self, *args, acumular=True, **kwargs):
+        # Con acumular=False quien guarda se encarga del resumen (registrar_venta lo deja en la cola)
+        nueva = self._state.adding
+        con_fecha = not nueva and (kwargs.get('update_fields') is None or 'Fecha_Venta' in kwargs['update_fields'])
+        anterior = None
+        if con_fecha:
+            anterior = type(self).objects.filter(pk=self.pk).values_list('Fecha_Venta', flat=True).first()
+        super().save(*args, **kwargs)
+        if nueva:
+            if acumular:
+                # El total y las unidades del día los acumulan los detalles
+                from .resumenes import acumular_dia
+                acumular_dia(self.Fecha_Venta, tickets=1)
+        elif con_fecha:
+            fecha = self._meta.get_field('Fecha_Venta').to_python(self.Fecha_Venta)
+            if anterior is not None and anterior != fecha:
+                # La venta completa (ticket y líneas) pasa al otro día
+                from .resumenes import mover_venta
+                mover_venta(self.pk, anterior, fecha)
+            self.detalles.exclude(Fecha_Venta=self.Fecha_Venta).update(Fecha_Venta=self.Fecha_Venta)
     
     def recalcular_total(self, save=True):
         suma = self.detalles.aggregate(s=Sum('SubTotal'))['s'] or Decimal('0.00')
@@ -89,8 +173,14 @@ class VentaDetalle(models.Model):
         max_digits=12, decimal_places=2, validators=[MinValueValidator(0)]
     )
     SubTotal=models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
+    # Copia de Venta.Fecha_Venta: filtra líneas por fecha sin unirse a Venta y, en Postgres,
+    # es la llave con que se particionan ambas tablas por mes (ver ventas/particiones.py)
+    Fecha_Venta=models.DateField(editable=False)
 
     class Meta:
+        indexes = [
+            models.Index(fields=['Fecha_Venta', 'Venta'], name='detalle_fecha_idx'),
+        ]
         # todo: esta linea de codigo es para evitar que se repita el mismo producto 2 veces en la misma venta
         constraints = [
             UniqueConstraint(fields=['Venta', 'Producto'], name='venta_producto_unico'),
@@ -104,6 +194,7 @@ class VentaDetalle(models.Model):
 
     @transaction.atomic
     def save(self, *args, **kwargs):
+        self.Fecha_Venta = self.Venta.Fecha_Venta
         if self.PrecioUnitario is None:
             self.PrecioUnitario = self.Producto.Precio
         self.SubTotal = (Decimal(self.CantidadVendida) * self.PrecioUnitario).quantize(Decimal('0.01'))
@@ -114,29 +205,229 @@ class VentaDetalle(models.Model):
 
         super().save(*args, **kwargs)
 
+        # Toda mutación de existencia pasa por la capa de inventario, que bloquea
+        # los productos en orden de llave (el viejo y el nuevo en un solo SELECT).
+        from .inventario import bloquear_productos, ajustar_existencias
+
+        cambios = {self.Producto_id: -self.CantidadVendida}
         if old is None:
-            prod = Producto.objects.select_for_update().get(pk=self.Producto_id)
-            if (prod.Existencia or 0) - self.CantidadVendida < 0:
-                raise ValidationError("No hay stock suficiente para realizar la venta.")
-            Producto.objects.filter(pk=prod.pk).update(Existencia=F('Existencia') - self.CantidadVendida)
+            mensaje = "No hay stock suficiente para realizar la venta."
+        elif old.Producto_id != self.Producto_id:
+            cambios[old.Producto_id] = old.CantidadVendida
+            mensaje = "No hay stock suficiente para cambiar el producto en la venta."
         else:
-            if old.Producto_id != self.Producto_id:
-                prod_old = Producto.objects.select_for_update().get(pk=old.Producto_id)
-                Producto.objects.filter(pk=prod_old.pk).update(Existencia=F('Existencia') + old.CantidadVendida)
-
-                prod_new = Producto.objects.select_for_update().get(pk=self.Producto_id)
-                if (prod_new.Existencia or 0) - self.CantidadVendida < 0:
-                    raise ValidationError("No hay stock suficiente para cambiar el producto en la venta.")
-                Producto.objects.filter(pk=prod_new.pk).update(Existencia=F('Existencia') - self.CantidadVendida)
-            else:
-                delta = self.CantidadVendida - old.CantidadVendida
-                if delta != 0:
-                    prod = Producto.objects.select_for_update().get(pk=self.Producto_id)
-                    if delta > 0 and (prod.Existencia or 0) - delta < 0:
-                        raise ValidationError("No hay stock suficiente para aumentar la cantidad vendida.")
-                    Producto.objects.filter(pk=prod.pk).update(Existencia=F('Existencia') - delta)
+            cambios[self.Producto_id] += old.CantidadVendida
+            mensaje = "No hay stock suficiente para aumentar la cantidad vendida."
+
+        productos = bloquear_productos(producto_id for producto_id, delta in cambios.items() if delta)
+        for producto_id, delta in cambios.items():
+            if delta < 0 and (productos[producto_id].Existencia or 0) + delta < 0:
+                raise ValidationError(mensaje)
+        ajustar_existencias(productos, cambios, MovimientoInventario.VENTA, self.Venta_id)
+
+        # La línea vieja se descuenta de su día (pudo ser de otra venta con otra fecha)
+        from .resumenes import acumular_lineas
+        lineas = [(self.Fecha_Venta, self.Producto_id, self.CantidadVendida, self.SubTotal)]
+        if old is not None:
+            lineas.append((old.Fecha_Venta, old.Producto_id, -old.CantidadVendida, -old.SubTotal))
+        acumular_lineas(lineas)
 
         self.Venta.recalcular_total(save=True)
+        if old is not None and old.Venta_id != self.Venta_id:
+            old.Venta.recalcular_total(save=True)
+
+class VentaResumenDiario(models.Model):
+    """Acumulado de ventas por día, mantenido al registrar o modificar ventas.
+
+    El dashboard y los reportes por rango de fechas leen de aquí en lugar de
+    recorrer Venta. Se puede reconstruir con `manage.py reconstruir_resumen`.
+    """
+    Fecha=models.DateField(primary_key=True)
+    Total=models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    Tickets=models.IntegerField(default=0)
+    Unidades=models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-Fecha']
+
+    def __str__(self):
+        return f"{self.Fecha}: {self.Total} ({self.Tickets} ventas)"
+
+class VentaProductoDiario(models.Model):
+    """Unidades y monto vendidos por producto y día.
+
+    Se actualiza junto con VentaDetalle; el top de productos de cualquier
+    ventana (hoy, 7 días, 30 días, año) se calcula leyendo solo estas filas.
+    """
+    Fecha=models.DateField()
+    Producto=models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='ventas_diarias')
+    Unidades=models.IntegerField(default=0)
+    Monto=models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['Fecha', 'Producto'], name='venta_producto_diario_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.Fecha} {self.Producto_id}: {self.Unidades}"
+
+class MovimientoInventario(models.Model):
+    """Bitácora de solo inserción de cada cambio de existencia.
+
+    Producto.Existencia es la proyección de esta tabla: la suma de los movimientos
+    de un producto debe ser igual a su existencia (ver `manage.py conciliar_inventario`).
+    Se escribe desde la capa de inventario; no se edita ni se borra.
+    """
+    INICIAL = 'inicial'
+    VENTA = 'venta'
+    DEVOLUCION = 'devolucion'
+    AJUSTE = 'ajuste'
+    COMPRA = 'compra'
+    TIPOS = [
+        (INICIAL, 'Existencia inicial'),
+        (VENTA, 'Venta'),
+        (DEVOLUCION, 'Devolución'),
+        (AJUSTE, 'Ajuste'),
+        (COMPRA, 'Compra'),
+    ]
+
+    Producto=models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
+    Fecha=models.DateTimeField(default=timezone.now)
+    Tipo=models.CharField(max_length=10, choices=TIPOS)
+    # Positiva si entra mercadería, negativa si sale
+    Cantidad=models.IntegerField()
+    # Id_Venta en ventas y devoluciones; entero simple para no atar la bitácora al borrado de ventas
+    Referencia=models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['Producto', 'Fecha'], name='movimiento_producto_fecha_idx'),
+            models.Index(fields=['Fecha'], name='movimiento_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.Fecha:%Y-%m-%d %H:%M} {self.Producto_id} {self.Tipo} {self.Cantidad:+d}"
+
+class FranjaExistencia(models.Model):
+    """Parte de la existencia de un producto de alta rotación (Producto.Franjas > 0).
+
+    La existencia real del producto es la suma de sus franjas. Cada venta descuenta de
+    una sola franja con un UPDATE condicional, sin bloquear la fila del producto, así
+    que dos cajas que venden el mismo producto casi nunca se esperan. Producto.Existencia
+    es la suma de las franjas: se refresca al confirmarse cada venta (refrescar_franjas)
+    y las franjas se rebalancean cada FRANJAS_REPARTIR_SEGUNDOS.
+    """
+    Producto=models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='franjas')
+    Franja=models.PositiveSmallIntegerField()
+    Existencia=models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['Producto', 'Franja'], name='franja_existencia_unica'),
+            CheckConstraint(check=Q(Existencia__gte=0), name='franja_existencia_ge_0'),
+        ]
+
+    def __str__(self):
+        return f"{self.Producto_id}[{self.Franja}]: {self.Existencia}"
+
+class ExistenciaCorte(models.Model):
+    """Existencia de cada producto al cierre de un día.
+
+    La existencia a una fecha se calcula con el último corte anterior más los
+    movimientos posteriores, sin recorrer toda la bitácora.
+    Se generan con `manage.py corte_inventario`.
+    """
+    Fecha=models.DateField()
+    Producto=models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='cortes')
+    Existencia=models.IntegerField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['Producto', 'Fecha'], name='existencia_corte_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['Fecha'], name='existencia_corte_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.Fecha} {self.Producto_id}: {self.Existencia}"
+
+class VentaTerminal(models.Model):
+    """Venta recibida de una terminal de punto de venta, por su clave de idempotencia.
+
+    La terminal genera la clave al cobrar; si reenvía la venta (por ejemplo, porque
+    perdió la respuesta) se reconoce por la clave y no se registra dos veces.
+    Venta es el Id_Venta sin llave foránea: en Postgres Venta está particionada y
+    su llave incluye la fecha.
+    """
+    Clave=models.UUIDField(primary_key=True)
+    Terminal=models.CharField(max_length=50)
+    Venta=models.IntegerField()
+    Total=models.DecimalField(max_digits=12, decimal_places=2)
+    Recibida=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['Terminal', 'Recibida'], name='venta_terminal_recibida_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.Terminal} {self.Clave} -> #{self.Venta}"
+
+class ProductoEliminado(models.Model):
+    """Producto borrado, para que las terminales lo quiten de su catálogo.
+
+    Version es la del borrado; el catálogo incremental la entrega junto con los
+    productos cambiados (ventas/sincronizacion.py).
+    """
+    Id_Producto=models.IntegerField(primary_key=True)
+    Version=models.BigIntegerField(default=nueva_version)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['Version', 'Id_Producto'], name='producto_eliminado_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.Id_Producto} ({self.Version})"
+
+class Tarea(models.Model):
+    """Trabajo pendiente de la cola de tareas en segundo plano (ventas/tareas.py).
+
+    La fila se inserta en la misma transacción que el cambio que la origina y se
+    borra en la misma transacción en que se ejecuta: nunca queda una tarea de una
+    venta deshecha ni se aplica dos veces. Las que agotan sus intentos quedan como
+    'muerta' con el último error.
+    """
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    MUERTA = 'muerta'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (MUERTA, 'Muerta'),
+    ]
+
+    Id_Tarea=models.BigAutoField(primary_key=True)
+    Nombre=models.CharField(max_length=60)
+    Argumentos=models.JSONField(default=dict)
+    Estado=models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    # Sube cada vez que un trabajador la toma; sirve también de versión para tomarla sin bloqueos
+    Intentos=models.PositiveSmallIntegerField(default=0)
+    Creada=models.DateTimeField(default=timezone.now)
+    # No se ejecuta antes de este instante (espera entre reintentos)
+    Disponible=models.DateTimeField(default=timezone.now)
+    Iniciada=models.DateTimeField(null=True, blank=True)
+    Error=models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['Estado', 'Disponible', 'Id_Tarea'], name='tarea_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.Nombre} #{self.Id_Tarea} ({self.Estado})"
 
 # Manejo de Usuarios en el Sistema (solo sección de usuarios modificada)
 class Usuario(AbstractUser):
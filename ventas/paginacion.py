@@ -0,0 +1,168 @@
+import base64
+import json
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+TAMANO_MINIMO = 10
+TAMANO_MAXIMO = 200
+
+
+def _codificar(direccion, valores):
+    datos = json.dumps([direccion, valores], separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def _decodificar(cursor):
+    """Devuelve (direccion, valores) o (None, None) si el cursor no es válido."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        direccion, valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if direccion in ('sig', 'ant') and isinstance(valores, list):
+            return direccion, valores
+    except (ValueError, TypeError):
+        pass
+    return None, None
+
+
+def _campo(modelo, ruta):
+    partes = ruta.split('__')
+    for parte in partes[:-1]:
+        modelo = modelo._meta.get_field(parte).related_model
+    return modelo._meta.get_field(partes[-1])
+
+
+def _convertir(modelo, orden, valores):
+    """Valores del cursor convertidos al tipo de cada campo de `orden`; None si alguno no sirve.
+
+    El cursor viene del cliente: un valor alterado no debe llegar a la consulta como
+    texto (en Postgres sería un error de tipo al comparar).
+    """
+    convertidos = []
+    try:
+        for campo, valor in zip(orden, valores):
+            if valor is None or isinstance(valor, (list, dict)):
+                return None
+            convertidos.append(_campo(modelo, campo.lstrip('-')).to_python(valor))
+    except (ValidationError, FieldDoesNotExist, TypeError, ValueError):
+        return None
+    return convertidos
+
+
+def _valor(objeto, campo):
+    for parte in campo.split('__'):
+        objeto = getattr(objeto, parte)
+    return objeto
+
+
+def _despues_de(orden, valores, invertir=False):
+    """Q equivalente a (c1, c2, ...) > (v1, v2, ...) respetando el sentido de cada campo."""
+    condiciones = []
+    for i, campo in enumerate(orden):
+        descendente = campo.startswith('-')
+        nombre = campo.lstrip('-')
+        if descendente != invertir:
+            comparacion = Q(**{f'{nombre}__lt': valores[i]})
+        else:
+            comparacion = Q(**{f'{nombre}__gt': valores[i]})
+        iguales = [Q(**{anterior.lstrip('-'): valores[j]}) for j, anterior in enumerate(orden[:i])]
+        condiciones.append(reduce(lambda a, b: a & b, iguales, comparacion))
+    return reduce(lambda a, b: a | b, condiciones)
+
+
+class Pagina:
+    """Una página de resultados paginados por llave (keyset / cursor)."""
+
+    def __init__(self, objetos, cursor_siguiente, cursor_anterior, parametros, tamano):
+        self.objetos = objetos
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.parametros = parametros
+        self.tamano = tamano
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def tiene_siguiente(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def tiene_anterior(self):
+        return self.cursor_anterior is not None
+
+    def _querystring(self, cursor):
+        parametros = self.parametros.copy()
+        parametros['cursor'] = cursor
+        return '?' + parametros.urlencode()
+
+    @property
+    def url_siguiente(self):
+        return self._querystring(self.cursor_siguiente) if self.cursor_siguiente else None
+
+    @property
+    def url_anterior(self):
+        return self._querystring(self.cursor_anterior) if self.cursor_anterior else None
+
+    @property
+    def url_primera(self):
+        parametros = self.parametros.copy()
+        return '?' + parametros.urlencode() if parametros else '?'
+
+
+def tamano_pagina(request):
+    por_defecto = getattr(settings, 'PAGINACION_TAMANO', 50)
+    try:
+        tamano = int(request.GET.get('tamano', por_defecto))
+    except ValueError:
+        tamano = por_defecto
+    return max(TAMANO_MINIMO, min(TAMANO_MAXIMO, tamano))
+
+
+def paginar_keyset(request, queryset, orden):
+    """Pagina `queryset` por llave según `orden` (p. ej. ['-Id_Venta']).
+
+    El último campo de `orden` debe ser único (normalmente la llave primaria)
+    para que el cursor sea estable. A diferencia de OFFSET, el costo de cada
+    página es constante: se lee a partir del cursor usando el índice del orden.
+    """
+    orden = list(orden)
+    tamano = tamano_pagina(request)
+    direccion, valores = _decodificar(request.GET.get('cursor', ''))
+    if valores is not None and len(valores) == len(orden):
+        valores = _convertir(queryset.model, orden, valores)
+    else:
+        valores = None
+    if valores is None:
+        # Un cursor inválido o alterado lleva a la primera página
+        direccion = None
+
+    if direccion == 'ant':
+        invertido = [c[1:] if c.startswith('-') else f'-{c}' for c in orden]
+        filas = list(queryset.filter(_despues_de(orden, valores, invertir=True)).order_by(*invertido)[:tamano + 1])
+        hay_mas_atras = len(filas) > tamano
+        objetos = list(reversed(filas[:tamano]))
+        hay_mas_adelante = True
+    else:
+        if direccion == 'sig':
+            queryset = queryset.filter(_despues_de(orden, valores))
+        filas = list(queryset.order_by(*orden)[:tamano + 1])
+        hay_mas_adelante = len(filas) > tamano
+        objetos = filas[:tamano]
+        hay_mas_atras = direccion == 'sig'
+
+    campos = [c.lstrip('-') for c in orden]
+    siguiente = anterior = None
+    if objetos and hay_mas_adelante:
+        siguiente = _codificar('sig', [_valor(objetos[-1], c) for c in campos])
+    if objetos and hay_mas_atras:
+        anterior = _codificar('ant', [_valor(objetos[0], c) for c in campos])
+
+    parametros = request.GET.copy()
+    parametros.pop('cursor', None)
+    return Pagina(objetos, siguiente, anterior, parametros, tamano)
@@ -0,0 +1,233 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Venta, VentaDetalle
+from .reportes import desplazar
+from .tareas import tarea
+
+# En Postgres, Venta y VentaDetalle pueden particionarse por mes según Fecha_Venta
+# (`manage.py particiones_ventas --convertir`); VentaDetalle lleva su propia copia de
+# la fecha para caer en el mismo mes que su venta. Por exigencia de Postgres la llave primaria y las restricciones
+# únicas de la base incluyen la fecha ((Id_Venta, Fecha_Venta), (Venta, Producto,
+# Fecha_Venta)), y la llave foránea de VentaDetalle a Venta es (Venta_id, Fecha_Venta).
+# Los modelos no cambian; una migración que altere VentaDetalle.Venta debe hacerse a mano.
+TABLAS = [Venta._meta.db_table, VentaDetalle._meta.db_table]
+
+LLAVES = {Venta._meta.db_table: 'Id_Venta', VentaDetalle._meta.db_table: 'id'}
+VENTA, DETALLE = TABLAS
+
+# Meses hacia adelante que se dejan creados; la partición por defecto recibe lo que
+# quede fuera y debe mantenerse vacía
+MESES_ADELANTE = 3
+
+
+def esta_particionado():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", [TABLAS[0]],
+        )
+        return cursor.fetchone()[0]
+
+
+def nombre_particion(tabla, inicio):
+    return f'{tabla}_p{inicio:%Y_%m}'
+
+
+def particiones(tabla):
+    """[(partición, rango, filas estimadas)] de una tabla particionada."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass ORDER BY c.relname",
+            [tabla],
+        )
+        return cursor.fetchall()
+
+
+def crear_particiones(meses=MESES_ADELANTE):
+    """Crea las particiones que falten desde el mes en curso hasta `meses` más adelante.
+
+    Devuelve los nombres creados. Si la partición por defecto ya tiene filas de un mes
+    nuevo, Postgres no permite crearlo: se lanza ValueError para moverlas a mano.
+    """
+    q = connection.ops.quote_name
+    inicio = timezone.localdate().replace(day=1)
+    creadas = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for _ in range(meses + 1):
+            fin = desplazar(inicio, 'mes', 1)
+            for tabla in TABLAS:
+                nombre = nombre_particion(tabla, inicio)
+                cursor.execute("SELECT to_regclass(%s)", [nombre])
+                if cursor.fetchone()[0] is not None:
+                    continue
+                cursor.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM {q(tabla + '_default')} "
+                    f"WHERE {q('Fecha_Venta')} >= %s AND {q('Fecha_Venta')} < %s)",
+                    [inicio, fin],
+                )
+                if cursor.fetchone()[0]:
+                    raise ValueError(
+                        f"{tabla}_default tiene filas de {inicio:%Y-%m}: hay que moverlas antes de crear {nombre}."
+                    )
+                cursor.execute(
+                    f"CREATE TABLE {q(nombre)} PARTITION OF {q(tabla)} "
+                    f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fin.isoformat()}')"
+                )
+                creadas.append(nombre)
+            inicio = fin
+    return creadas
+
+
+@tarea('particiones.crear', cada=24 * 60 * 60)
+def _crear_periodico():
+    # Sin particionar (o fuera de Postgres) no hay nada que crear
+    if not esta_particionado():
+        return []
+    return crear_particiones()
+
+
+def _definiciones(cursor, tabla):
+    # Índices no únicos (los únicos se vuelven a declarar con la fecha) y llaves foráneas salientes
+    cursor.execute(
+        "SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = %s::regclass AND NOT indisunique",
+        [tabla],
+    )
+    indices = [fila[0] for fila in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid), confrelid::regclass::text "
+        "FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [tabla],
+    )
+    llaves = [(nombre, definicion) for nombre, definicion, referida in cursor.fetchall() if referida != VENTA]
+    return indices, llaves
+
+
+def _estado(cursor, tabla):
+    """(filas, llave máxima, índices no únicos, llaves foráneas) de `tabla`."""
+    llave = LLAVES[tabla]
+    cursor.execute(f'SELECT count(*), max("{llave}") FROM {tabla}')
+    filas, maxima = cursor.fetchone()
+    cursor.execute(
+        "SELECT (SELECT count(*) FROM pg_index WHERE indrelid = %s::regclass AND NOT indisunique), "
+        "(SELECT count(*) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f')",
+        [tabla, tabla],
+    )
+    return (filas, maxima or 0, *cursor.fetchone())
+
+
+def _verificar(cursor, antes):
+    # Dentro de la misma transacción: cualquier diferencia deshace la conversión completa
+    errores = []
+    for tabla, (filas, maxima, indices, llaves) in antes.items():
+        despues = _estado(cursor, tabla)
+        if despues[0] != filas:
+            errores.append(f"{tabla}: {despues[0]} filas, antes {filas}")
+        if despues[2] != indices:
+            errores.append(f"{tabla}: {despues[2]} índices, antes {indices}")
+        # La llave foránea de los detalles a la venta pasa a ser compuesta: son las mismas
+        if despues[3] != llaves:
+            errores.append(f"{tabla}: {despues[3]} llaves foráneas, antes {llaves}")
+        llave = LLAVES[tabla]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [tabla, llave])
+        secuencia = cursor.fetchone()[0]
+        if secuencia is None:
+            errores.append(f"{tabla}.{llave} sin secuencia")
+            continue
+        cursor.execute(f"SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM {secuencia}")
+        if cursor.fetchone()[0] <= maxima:
+            errores.append(f"{secuencia} repetiría llaves (máxima {maxima})")
+    cursor.execute(
+        "SELECT count(*) FROM pg_partitioned_table WHERE partrelid IN (%s::regclass, %s::regclass)", [VENTA, DETALLE],
+    )
+    if cursor.fetchone()[0] != 2:
+        errores.append("las tablas no quedaron particionadas")
+    if errores:
+        raise RuntimeError("La conversión no cuadra, se deshace: " + "; ".join(errores))
+
+
+def particionar(meses=MESES_ADELANTE):
+    """Convierte Venta y VentaDetalle en tablas particionadas por mes de Fecha_Venta (Postgres 15+).
+
+    Todo en una transacción: se copian las filas a tablas nuevas, se recrean llaves,
+    secuencias, índices y llaves foráneas, y se verifica el resultado contra lo que
+    había antes; si algo no cuadra se deshace. Bloquea ambas tablas mientras copia.
+    Postgres exige que la llave de partición forme parte de toda llave primaria o única,
+    así que en la base quedan (Id_Venta, Fecha_Venta), (id, Fecha_Venta) y
+    (Venta_id, Producto_id, Fecha_Venta), y la llave foránea de los detalles pasa a
+    (Venta_id, Fecha_Venta) con ON UPDATE CASCADE para que cambiar la fecha de una venta
+    mueva también sus líneas de partición. Devuelve False si ya estaban particionadas.
+    """
+    if connection.vendor != 'postgresql':
+        raise ValueError("Solo las tablas de Postgres se pueden particionar.")
+    with transaction.atomic(), connection.cursor() as cursor:
+        if esta_particionado():
+            return False
+        cursor.execute(
+            "SELECT conrelid::regclass::text FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid IN (%s::regclass, %s::regclass) AND conrelid <> %s::regclass",
+            [VENTA, DETALLE, DETALLE],
+        )
+        externas = [fila[0] for fila in cursor.fetchall()]
+        if externas:
+            raise ValueError(f"Tablas con llave foránea a ventas que no se pueden migrar solas: {externas}")
+        # Con revisiones de llaves foráneas pendientes Postgres no permite alterar las tablas
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"LOCK TABLE {VENTA}, {DETALLE} IN ACCESS EXCLUSIVE MODE")
+
+        hoy = timezone.localdate()
+        cursor.execute(f'SELECT min("Fecha_Venta"), max("Fecha_Venta") FROM {VENTA}')
+        primera, ultima = cursor.fetchone()
+        inicio = (primera or hoy).replace(day=1)
+        fin = desplazar(max(ultima or hoy, hoy).replace(day=1), 'mes', meses + 1)
+        definiciones = {tabla: _definiciones(cursor, tabla) for tabla in TABLAS}
+        antes = {tabla: _estado(cursor, tabla) for tabla in TABLAS}
+
+        for tabla in TABLAS:
+            cursor.execute(f'ALTER TABLE {tabla} RENAME TO {tabla}_anterior')
+        for tabla, llave in LLAVES.items():
+            cursor.execute(
+                f'CREATE TABLE {tabla} (LIKE {tabla}_anterior INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                f'PARTITION BY RANGE ("Fecha_Venta")'
+            )
+            # Si la llave era serial, su valor por defecto apunta a la secuencia de la tabla vieja
+            # (las columnas identity de Django 5 no se copian con LIKE)
+            cursor.execute(f'ALTER TABLE {tabla} ALTER COLUMN "{llave}" DROP DEFAULT')
+            mes = inicio
+            while mes < fin:
+                siguiente = desplazar(mes, 'mes', 1)
+                cursor.execute(
+                    f"CREATE TABLE {nombre_particion(tabla, mes)} PARTITION OF {tabla} "
+                    f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{siguiente.isoformat()}')"
+                )
+                mes = siguiente
+            cursor.execute(f'CREATE TABLE {tabla}_default PARTITION OF {tabla} DEFAULT')
+            cursor.execute(f'INSERT INTO {tabla} SELECT * FROM {tabla}_anterior')
+        cursor.execute(f'DROP TABLE {DETALLE}_anterior, {VENTA}_anterior')
+
+        for tabla, llave in LLAVES.items():
+            cursor.execute(f'ALTER TABLE {tabla} ADD CONSTRAINT {tabla}_pkey PRIMARY KEY ("{llave}", "Fecha_Venta")')
+            # Postgres 15 no admite columnas identity en tablas particionadas
+            secuencia = f'{tabla}_{llave}_seq'
+            cursor.execute(f'CREATE SEQUENCE "{secuencia}" OWNED BY {tabla}."{llave}"')
+            cursor.execute(f'ALTER TABLE {tabla} ALTER COLUMN "{llave}" SET DEFAULT nextval(\'"{secuencia}"\')')
+            cursor.execute(
+                f'SELECT setval(\'"{secuencia}"\', COALESCE((SELECT max("{llave}") FROM {tabla}), 0) + 1, false)'
+            )
+            indices, llaves = definiciones[tabla]
+            for definicion in indices:
+                cursor.execute(definicion)
+            for nombre, definicion in llaves:
+                cursor.execute(f'ALTER TABLE {tabla} ADD CONSTRAINT "{nombre}" {definicion}')
+        cursor.execute(
+            f'ALTER TABLE {DETALLE} ADD CONSTRAINT venta_producto_unico UNIQUE ("Venta_id", "Producto_id", "Fecha_Venta")'
+        )
+        cursor.execute(
+            f'ALTER TABLE {DETALLE} ADD CONSTRAINT detalle_venta_fk FOREIGN KEY ("Venta_id", "Fecha_Venta") '
+            f'REFERENCES {VENTA} ("Id_Venta", "Fecha_Venta") ON UPDATE CASCADE DEFERRABLE INITIALLY DEFERRED'
+        )
+        _verificar(cursor, antes)
+    return True
@@ -0,0 +1,90 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Réplicas de lectura (REPLICA_URLS). Solo las vistas marcadas con @solo_lectura leen de
+# una réplica, y solo en GET/HEAD; todo lo demás, y toda escritura, va a la primaria.
+# Tras una escritura el navegador queda fijado a la primaria REPLICA_FIJAR_SEGUNDOS
+# (cookie COOKIE_PRIMARIA): el cajero que registra una venta la ve en la lista aunque
+# la réplica vaya atrasada.
+
+COOKIE_PRIMARIA = 'geca_primaria'
+METODOS_LECTURA = {'GET', 'HEAD'}
+# Modelos que siempre se leen de la primaria: la sesión recién escrita debe verse enseguida
+APPS_PRIMARIA = {'sessions'}
+
+# Alias de la réplica que atiende la petición en curso; None = primaria.
+# Es un ContextVar para que lo vean también las vistas asíncronas y sus hilos.
+_replica = ContextVar('replica', default=None)
+
+
+def solo_lectura(vista):
+    """Marca una vista cuyas peticiones GET/HEAD pueden leer de una réplica."""
+    vista.solo_lectura = True
+    return vista
+
+
+def replica_actual():
+    return _replica.get()
+
+
+def conservar_replica(iterable):
+    """Itera `iterable` con la réplica de la petición actual.
+
+    Para respuestas en streaming, que consultan después de que la vista devolvió la
+    respuesta (y el middleware ya soltó la réplica). La réplica se toma al llamarla.
+    """
+    return _iterar_en(_replica.get(), iter(iterable))
+
+
+def _iterar_en(alias, iterador):
+    while True:
+        ficha = _replica.set(alias)
+        try:
+            parte = next(iterador)
+        except StopIteration:
+            return
+        finally:
+            _replica.reset(ficha)
+        yield parte
+
+
+class RouterReplicas:
+    """Lecturas a la réplica elegida por ReplicasMiddleware; escrituras y migraciones a la primaria."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in APPS_PRIMARIA:
+            return 'default'
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que la primaria
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.REPLICAS
+
+
+class ReplicasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        ficha = _replica.set(None)
+        try:
+            respuesta = self.get_response(request)
+        finally:
+            _replica.reset(ficha)
+        if request.method not in METODOS_LECTURA and settings.REPLICAS:
+            respuesta.set_cookie(COOKIE_PRIMARIA, '1', max_age=settings.REPLICA_FIJAR_SEGUNDOS,
+                                 httponly=True, samesite='Lax')
+        return respuesta
+
+    def process_view(self, request, vista, args, kwargs):
+        if (settings.REPLICAS and getattr(vista, 'solo_lectura', False)
+                and request.method in METODOS_LECTURA and COOKIE_PRIMARIA not in request.COOKIES):
+            _replica.set(random.choice(settings.REPLICAS))
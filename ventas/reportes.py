@@ -0,0 +1,352 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from . import archivo
+from .models import Categoria, Cliente, Marca, Producto, Venta, VentaDetalle
+
+CENTAVO = Decimal('0.01')
+
+# Dimensiones del reporte: nombre -> (campo de VentaDetalle, (tabla, columna) para SQL, modelo)
+DIMENSIONES = {
+    'categoria': ('Producto__Categoria_id', ('p', 'Categoria_id'), Categoria),
+    'marca': ('Producto__Marca_id', ('p', 'Marca_id'), Marca),
+    'producto': ('Producto_id', ('d', 'Producto_id'), Producto),
+    'cliente': ('Venta__Cliente_id', ('v', 'Cliente_id'), Cliente),
+}
+# Columnas (id, nombre) de cada dimensión en el archivo frío (ventas/archivo.py)
+DIMENSIONES_ARCHIVO = {
+    'categoria': ('Categoria_id', 'Categoria'),
+    'marca': ('Marca_id', 'Marca'),
+    'producto': ('Producto_id', 'Producto'),
+    'cliente': ('Cliente_id', 'Cliente'),
+}
+PERIODOS = ('dia', 'semana', 'mes')
+
+CLAVE_VERSION = 'reportes:version'
+
+
+# --- Periodos -----------------------------------------------------------------
+
+def inicio_periodo(fecha, periodo):
+    """Primer día del periodo (las semanas empiezan en lunes, como date_trunc)."""
+    if periodo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if periodo == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def desplazar(inicio, periodo, n):
+    """Inicio del periodo que está `n` periodos después (o antes, si n < 0) de `inicio`."""
+    if periodo == 'dia':
+        return inicio + timedelta(days=n)
+    if periodo == 'semana':
+        return inicio + timedelta(weeks=n)
+    meses = inicio.year * 12 + inicio.month - 1 + n
+    return inicio.replace(year=meses // 12, month=meses % 12 + 1, day=1)
+
+
+def periodos_entre(desde, hasta, periodo):
+    """Inicios de los periodos que cubren [desde, hasta]."""
+    inicios = []
+    inicio = inicio_periodo(desde, periodo)
+    while inicio <= hasta:
+        inicios.append(inicio)
+        inicio = desplazar(inicio, periodo, 1)
+    return inicios
+
+
+def alinear(desde, hasta, periodo):
+    """Extiende [desde, hasta] a periodos completos."""
+    return inicio_periodo(desde, periodo), desplazar(inicio_periodo(hasta, periodo), periodo, 1) - timedelta(days=1)
+
+
+# --- Consultas ----------------------------------------------------------------
+# El resultado de una consulta es {'celdas': {(periodo, grupo): [unidades, monto, tickets]},
+# 'periodos': {periodo: [...]}, 'total': [...]}. Los tickets son ventas distintas. Lo que
+# sale del archivo lleva además 'nombres': {grupo: nombre} por si el grupo ya no existe.
+
+def _vacio():
+    return [0, Decimal('0.00'), 0]
+
+
+def _metricas(unidades, monto, tickets):
+    # SQLite suma los decimales como flotantes; se redondea a centavos
+    return [unidades or 0, Decimal(monto or 0).quantize(CENTAVO), tickets or 0]
+
+
+def _consultar_rollup(dimension, periodo, desde, hasta):
+    # Postgres: celdas, subtotales por periodo y total en un solo GROUP BY ROLLUP.
+    # El rango va sobre la fecha de la línea, que es la llave de partición: solo se leen
+    # los meses pedidos. La unión con Venta la cubre el índice de la migración 0009.
+    q = connection.ops.quote_name
+    fecha = f"d.{q('Fecha_Venta')}"
+    expresion_periodo = {
+        'dia': fecha,
+        'semana': f"date_trunc('week', {fecha})::date",
+        'mes': f"date_trunc('month', {fecha})::date",
+    }[periodo]
+    alias, columna = DIMENSIONES[dimension][1]
+    expresion_grupo = f"{alias}.{q(columna)}"
+    # Solo se une la tabla que aporta la dimensión
+    union = {
+        'p': f"JOIN {q(Producto._meta.db_table)} p ON p.{q('Id_Producto')} = d.{q('Producto_id')} ",
+        'v': (f"JOIN {q(Venta._meta.db_table)} v ON v.{q('Id_Venta')} = d.{q('Venta_id')} "
+              f"AND v.{q('Fecha_Venta')} = d.{q('Fecha_Venta')} "),
+        'd': '',
+    }[alias]
+    sql = (
+        f"SELECT {expresion_periodo}, {expresion_grupo}, "
+        f"SUM(d.{q('CantidadVendida')}), SUM(d.{q('SubTotal')}), COUNT(DISTINCT d.{q('Venta_id')}), "
+        f"GROUPING({expresion_periodo}, {expresion_grupo}) "
+        f"FROM {q(VentaDetalle._meta.db_table)} d "
+        f"{union}"
+        f"WHERE {fecha} >= %s AND {fecha} <= %s "
+        f"GROUP BY ROLLUP ({expresion_periodo}, {expresion_grupo})"
+    )
+    datos = {'celdas': {}, 'periodos': {}, 'total': _vacio()}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [desde, hasta])
+        for inicio, grupo, unidades, monto, tickets, agrupado in cursor.fetchall():
+            metricas = _metricas(unidades, monto, tickets)
+            if agrupado == 0:
+                datos['celdas'][(inicio, grupo)] = metricas
+            elif agrupado == 1:
+                datos['periodos'][inicio] = metricas
+            else:
+                datos['total'] = metricas
+    return datos
+
+
+def _consultar_base(dimension, periodo, desde, hasta):
+    if connection.vendor == 'postgresql':
+        return _consultar_rollup(dimension, periodo, desde, hasta)
+
+    # Alternativa portable (SQLite en pruebas): las mismas tres agregaciones por separado
+    detalles = VentaDetalle.objects.filter(
+        Fecha_Venta__gte=desde, Fecha_Venta__lte=hasta,
+    ).order_by().annotate(periodo={
+        'dia': F('Fecha_Venta'),
+        'semana': TruncWeek('Fecha_Venta'),
+        'mes': TruncMonth('Fecha_Venta'),
+    }[periodo])
+    agregados = {
+        'unidades': Sum('CantidadVendida'),
+        'monto': Sum('SubTotal'),
+        'tickets': Count('Venta_id', distinct=True),
+    }
+    celdas = detalles.values('periodo', grupo=F(DIMENSIONES[dimension][0])).annotate(**agregados)
+    periodos = detalles.values('periodo').annotate(**agregados)
+    total = detalles.aggregate(**agregados)
+    return {
+        'celdas': {
+            (fila['periodo'], fila['grupo']): _metricas(fila['unidades'], fila['monto'], fila['tickets'])
+            for fila in celdas
+        },
+        'periodos': {
+            fila['periodo']: _metricas(fila['unidades'], fila['monto'], fila['tickets']) for fila in periodos
+        },
+        'total': _metricas(total['unidades'], total['monto'], total['tickets']),
+    }
+
+
+def _consultar_archivo(dimension, periodo, desde, hasta):
+    columna, columna_nombre = DIMENSIONES_ARCHIVO[dimension]
+    celdas, periodos, total, nombres = {}, {}, [0, Decimal('0.00'), set()], {}
+    for fecha, venta, grupo, nombre, unidades, monto in archivo.filas_detalles(
+        desde, hasta, ['Fecha_Venta', 'Venta_id', columna, columna_nombre, 'CantidadVendida', 'SubTotal'],
+    ):
+        inicio = inicio_periodo(fecha, periodo)
+        nombres[grupo] = nombre
+        for acumulado in (
+            celdas.setdefault((inicio, grupo), [0, Decimal('0.00'), set()]),
+            periodos.setdefault(inicio, [0, Decimal('0.00'), set()]),
+            total,
+        ):
+            acumulado[0] += unidades
+            acumulado[1] += monto
+            acumulado[2].add(venta)
+    return {
+        'celdas': {clave: [u, m, len(t)] for clave, (u, m, t) in celdas.items()},
+        'periodos': {clave: [u, m, len(t)] for clave, (u, m, t) in periodos.items()},
+        'total': [total[0], total[1], len(total[2])],
+        'nombres': nombres,
+    }
+
+
+def _combinar(*partes):
+    # Cada venta está en una sola parte, así que las métricas se suman sin contar tickets dos veces
+    datos = {'celdas': {}, 'periodos': {}, 'total': _vacio(), 'nombres': {}}
+    for parte in partes:
+        for clave in ('celdas', 'periodos'):
+            for llave, metricas in parte[clave].items():
+                datos[clave][llave] = [a + b for a, b in zip(datos[clave].get(llave, _vacio()), metricas)]
+        datos['total'] = [a + b for a, b in zip(datos['total'], parte['total'])]
+        datos['nombres'].update(parte.get('nombres', {}))
+    return datos
+
+
+def _consultar(dimension, periodo, desde, hasta):
+    # Los años archivados ya no están en la base: esa parte del rango se lee del archivo
+    limite = archivo.limite()
+    if limite is None or desde >= limite:
+        return _consultar_base(dimension, periodo, desde, hasta)
+    if hasta < limite:
+        return _consultar_archivo(dimension, periodo, desde, hasta)
+    return _combinar(
+        _consultar_archivo(dimension, periodo, desde, limite - timedelta(days=1)),
+        _consultar_base(dimension, periodo, limite, hasta),
+    )
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, int(time.time() * 1000), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def _consultar_cerrado(dimension, periodo, desde, hasta):
+    # Los periodos ya terminados no cambian: se guardan hasta que algo invalide la versión
+    clave = f'reportes:{_version()}:{dimension}:{periodo}:{desde}:{hasta}'
+    datos = cache.get(clave)
+    if datos is None:
+        datos = _consultar(dimension, periodo, desde, hasta)
+        cache.set(clave, datos, getattr(settings, 'REPORTES_CACHE_SEGUNDOS', 7 * 24 * 3600))
+    return datos
+
+
+def _datos(dimension, periodo, desde, hasta):
+    """Datos de [desde, hasta]; la parte de periodos cerrados sale de la caché."""
+    abierto = inicio_periodo(timezone.localdate(), periodo)
+    if desde >= abierto:
+        return _consultar(dimension, periodo, desde, hasta)
+    if hasta < abierto:
+        return _consultar_cerrado(dimension, periodo, desde, hasta)
+
+    return _combinar(
+        _consultar_cerrado(dimension, periodo, desde, abierto - timedelta(days=1)),
+        _consultar(dimension, periodo, abierto, hasta),
+    )
+
+
+# --- Reporte ------------------------------------------------------------------
+
+def _como_dict(metricas):
+    unidades, monto, tickets = metricas
+    return {'unidades': unidades, 'monto': monto, 'tickets': tickets}
+
+
+def _variacion(actual, anterior):
+    if not anterior:
+        return None
+    return ((actual - anterior) / anterior * 100).quantize(Decimal('0.1'))
+
+
+def _nombres(dimension, ids):
+    if dimension == 'cliente':
+        return {
+            pk: f"{nombre} {apellido}".strip()
+            for pk, nombre, apellido in Cliente.objects.filter(pk__in=ids).values_list(
+                'pk', 'PrimerNombre', 'PrimerApellido',
+            )
+        }
+    modelo = DIMENSIONES[dimension][2]
+    campo = {'categoria': 'NombreCategoria', 'marca': 'NombreMarca', 'producto': 'NombreProducto'}[dimension]
+    return dict(modelo.objects.filter(pk__in=ids).values_list('pk', campo))
+
+
+def reporte_ventas(dimension, periodo, desde, hasta, comparar=False, limite=None):
+    """Ventas agrupadas por `dimension` y `periodo` entre dos fechas (extendidas a periodos completos).
+
+    Devuelve un dict con los inicios de periodo, una fila por grupo (ordenadas por monto,
+    a lo sumo `limite`) con sus celdas y su total, los subtotales por periodo y el total.
+    Cada métrica es {'unidades', 'monto', 'tickets'}. Con `comparar` cada fila y el total
+    llevan también los del mismo número de periodos inmediatamente anteriores y la
+    variación porcentual del monto.
+    """
+    desde, hasta = alinear(desde, hasta, periodo)
+    periodos = periodos_entre(desde, hasta, periodo)
+    datos = _datos(dimension, periodo, desde, hasta)
+
+    totales = {}
+    for (_, grupo), metricas in datos['celdas'].items():
+        total = totales.setdefault(grupo, _vacio())
+        for i, valor in enumerate(metricas):
+            total[i] += valor
+    grupos = sorted(totales, key=lambda grupo: (-totales[grupo][1], grupo))
+    if limite:
+        grupos = grupos[:limite]
+    nombres = {**datos.get('nombres', {}), **_nombres(dimension, grupos)}
+
+    filas = [{
+        'id': grupo,
+        'nombre': nombres.get(grupo, f'#{grupo}'),
+        'celdas': [_como_dict(datos['celdas'].get((inicio, grupo), _vacio())) for inicio in periodos],
+        'total': _como_dict(totales[grupo]),
+    } for grupo in grupos]
+    reporte = {
+        'dimension': dimension,
+        'periodo': periodo,
+        'desde': desde,
+        'hasta': hasta,
+        'periodos': periodos,
+        'filas': filas,
+        'grupos': len(totales),
+        'subtotales': [_como_dict(datos['periodos'].get(inicio, _vacio())) for inicio in periodos],
+        'total': _como_dict(datos['total']),
+    }
+
+    if comparar:
+        anterior_desde = desplazar(desde, periodo, -len(periodos))
+        anterior = _datos(dimension, periodo, anterior_desde, desde - timedelta(days=1))
+        anteriores = {}
+        for (_, grupo), (unidades, monto, tickets) in anterior['celdas'].items():
+            total = anteriores.setdefault(grupo, _vacio())
+            total[0] += unidades
+            total[1] += monto
+            total[2] += tickets
+        for fila in filas:
+            fila['anterior'] = _como_dict(anteriores.get(fila['id'], _vacio()))
+            fila['variacion'] = _variacion(fila['total']['monto'], fila['anterior']['monto'])
+        reporte['anterior'] = {
+            'desde': anterior_desde,
+            'hasta': desde - timedelta(days=1),
+            'total': _como_dict(anterior['total']),
+        }
+        reporte['variacion'] = _variacion(reporte['total']['monto'], reporte['anterior']['total']['monto'])
+    return reporte
+
+
+# --- Invalidación -------------------------------------------------------------
+
+def invalidar_reportes():
+    """Descarta los reportes guardados (cambiaron ventas de días ya cerrados)."""
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        _version()
+
+
+def _al_cambiar_venta(sender, instance, **kwargs):
+    # Las ventas de hoy solo tocan el periodo abierto, que nunca se guarda
+    venta = instance if isinstance(instance, Venta) else instance.Venta
+    # Recién creada, Fecha_Venta puede seguir siendo el datetime del valor por defecto
+    if Venta._meta.get_field('Fecha_Venta').to_python(venta.Fecha_Venta) < timezone.localdate():
+        invalidar_reportes()
+
+
+# Los bulk_create/update no emiten señales: quien los use sobre días pasados debe llamar invalidar_reportes
+post_save.connect(_al_cambiar_venta, sender=Venta, dispatch_uid='reportes_venta_save')
+post_delete.connect(_al_cambiar_venta, sender=Venta, dispatch_uid='reportes_venta_delete')
+post_save.connect(_al_cambiar_venta, sender=VentaDetalle, dispatch_uid='reportes_detalle_save')
@@ -0,0 +1,353 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, Sum, Count
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from .models import Producto, Tarea, Venta, VentaDetalle, VentaResumenDiario, VentaProductoDiario
+from .tareas import encolar, tarea
+
+# Ventanas del top de productos: días hacia atrás desde hoy (None = desde el 1 de enero)
+VENTANAS = {
+    'hoy': 0,
+    '7d': 6,
+    '30d': 29,
+    'anio': None,
+}
+
+CENTAVO = Decimal('0.01')
+
+
+def acumular_dia(fecha, total=Decimal('0.00'), tickets=0, unidades=0):
+    """Suma los deltas al resumen de `fecha`, creando la fila si no existe.
+
+    Debe llamarse dentro de la misma transacción que modifica la venta, así el
+    resumen nunca queda desfasado respecto a lo confirmado.
+    """
+    if not (total or tickets or unidades):
+        return
+    cambios = {
+        'Total': F('Total') + total,
+        'Tickets': F('Tickets') + tickets,
+        'Unidades': F('Unidades') + unidades,
+    }
+    if VentaResumenDiario.objects.filter(Fecha=fecha).update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            VentaResumenDiario.objects.create(Fecha=fecha, Total=total, Tickets=tickets, Unidades=unidades)
+    except IntegrityError:
+        # Otra transacción creó la fila del día al mismo tiempo
+        VentaResumenDiario.objects.filter(Fecha=fecha).update(**cambios)
+
+
+def acumular_productos(fecha, por_producto):
+    """Suma {producto_id: (unidades, monto)} a los contadores diarios por producto.
+
+    Un solo INSERT ... ON CONFLICT DO UPDATE para todos los productos (Postgres y
+    SQLite >= 3.24), con las filas en orden de producto para no provocar deadlocks.
+    """
+    filas = [
+        (producto_id, unidades, monto)
+        for producto_id, (unidades, monto) in sorted(por_producto.items())
+        if unidades or monto
+    ]
+    if not filas:
+        return
+    fecha = VentaProductoDiario._meta.get_field('Fecha').to_python(fecha)
+
+    q = connection.ops.quote_name
+    tabla = q(VentaProductoDiario._meta.db_table)
+    valores = ', '.join(['(%s, %s, %s, %s)'] * len(filas))
+    parametros = []
+    for producto_id, unidades, monto in filas:
+        parametros += [fecha, producto_id, unidades, Decimal(monto)]
+    sql = (
+        f"INSERT INTO {tabla} ({q('Fecha')}, {q('Producto_id')}, {q('Unidades')}, {q('Monto')}) "
+        f"VALUES {valores} "
+        f"ON CONFLICT ({q('Fecha')}, {q('Producto_id')}) DO UPDATE SET "
+        f"{q('Unidades')} = {tabla}.{q('Unidades')} + EXCLUDED.{q('Unidades')}, "
+        f"{q('Monto')} = {tabla}.{q('Monto')} + EXCLUDED.{q('Monto')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+
+
+def acumular_lineas(lineas):
+    """Acumula [(fecha, producto_id, unidades, monto)] (negativos para descontar) por día y producto."""
+    campo = VentaResumenDiario._meta.get_field('Fecha')
+    por_dia = {}
+    for fecha, producto_id, unidades, monto in lineas:
+        dia = por_dia.setdefault(campo.to_python(fecha), {})
+        anteriores = dia.get(producto_id, (0, Decimal('0.00')))
+        dia[producto_id] = (anteriores[0] + unidades, anteriores[1] + monto)
+    # En orden de fecha, como los productos, para no provocar deadlocks
+    for fecha, por_producto in sorted(por_dia.items()):
+        acumular_dia(fecha, total=sum((m for _, m in por_producto.values()), Decimal('0.00')),
+                     unidades=sum(u for u, _ in por_producto.values()))
+        acumular_productos(fecha, por_producto)
+
+
+def mover_venta(venta_id, desde, hasta):
+    """Pasa del resumen de `desde` al de `hasta` una venta cuya fecha cambió."""
+    lineas = []
+    for producto_id, unidades, monto in (VentaDetalle.objects.filter(Venta_id=venta_id)
+                                         .values_list('Producto_id', 'CantidadVendida', 'SubTotal')):
+        lineas += [(desde, producto_id, -unidades, -monto), (hasta, producto_id, unidades, monto)]
+    acumular_dia(desde, tickets=-1)
+    acumular_dia(hasta, tickets=1)
+    acumular_lineas(lineas)
+
+
+def _detalle_borrado(sender, instance, **kwargs):
+    acumular_lineas([(instance.Fecha_Venta, instance.Producto_id, -instance.CantidadVendida, -instance.SubTotal)])
+
+
+def _venta_borrada(sender, instance, **kwargs):
+    # Sus líneas se borran antes (cascada) y descuentan lo suyo
+    acumular_dia(instance.Fecha_Venta, tickets=-1)
+
+
+# Los borrados por SQL directo (archivo, sembrar_datos --limpiar) no emiten señales: sus
+# resúmenes se conservan o se reconstruyen aparte
+post_delete.connect(_detalle_borrado, sender=VentaDetalle, dispatch_uid='resumenes_detalle_borrado')
+post_delete.connect(_venta_borrada, sender=Venta, dispatch_uid='resumenes_venta_borrada')
+
+
+ACUMULAR_DIA = 'resumenes.acumular_dia'
+ACUMULAR_PRODUCTOS = 'resumenes.acumular_productos'
+
+
+def encolar_acumulados(fecha, total=Decimal('0.00'), tickets=0, unidades=0, por_producto=None):
+    """Deja en la cola de tareas lo que acumular_dia y acumular_productos harían ahora.
+
+    Las filas del resumen de hoy las tocan todas las ventas: acumularlas dentro de la
+    venta las mantiene bloqueadas hasta el commit y pone en fila a los cajeros. Encoladas
+    se confirman con la venta y un trabajador las suma después (segundos de retraso).
+    """
+    fecha = VentaResumenDiario._meta.get_field('Fecha').to_python(fecha).isoformat()
+    if total or tickets or unidades:
+        encolar(ACUMULAR_DIA, fecha=fecha, total=str(total), tickets=tickets, unidades=unidades)
+    if por_producto:
+        encolar(ACUMULAR_PRODUCTOS, fecha=fecha, por_producto=[
+            [producto_id, unidades, str(monto)] for producto_id, (unidades, monto) in sorted(por_producto.items())
+        ])
+
+
+@tarea(ACUMULAR_DIA)
+def _acumular_dia_encolado(fecha, total, tickets, unidades):
+    acumular_dia(date.fromisoformat(fecha), Decimal(total), tickets, unidades)
+
+
+@tarea(ACUMULAR_PRODUCTOS)
+def _acumular_productos_encolado(fecha, por_producto):
+    acumular_productos(date.fromisoformat(fecha), {
+        producto_id: (unidades, Decimal(monto)) for producto_id, unidades, monto in por_producto
+    })
+
+
+def _descartar_encolados(nombre, desde=None, hasta=None):
+    # Al reconstruir un rango desde las ventas, lo que seguía en la cola para esos días ya
+    # queda contado: se descarta en la misma transacción para no sumarlo dos veces.
+    encolados = [
+        pk for pk, argumentos in Tarea.objects.filter(Nombre=nombre).values_list('pk', 'Argumentos')
+        if (desde is None or argumentos['fecha'] >= desde.isoformat())
+        and (hasta is None or argumentos['fecha'] <= hasta.isoformat())
+    ]
+    Tarea.objects.filter(pk__in=encolados).delete()
+
+
+def rango_ventana(ventana, hoy=None):
+    """(desde, hasta) de una ventana de VENTANAS."""
+    hoy = hoy or timezone.now().date()
+    dias = VENTANAS[ventana]
+    desde = hoy.replace(month=1, day=1) if dias is None else hoy - timedelta(days=dias)
+    return desde, hoy
+
+
+class MasVendidos:
+    """Top-k aproximado con memoria acotada (algoritmo Space-Saving ponderado).
+
+    Mantiene como mucho `capacidad` contadores. Cada contador guarda también el
+    error máximo con que pudo haberse sobreestimado, así que el conteo real de un
+    producto está entre (conteo - error) y conteo.
+    """
+
+    def __init__(self, capacidad):
+        self.capacidad = capacidad
+        self.contadores = {}  # producto_id -> [conteo, error]
+
+    def agregar(self, clave, peso):
+        if clave in self.contadores:
+            self.contadores[clave][0] += peso
+        elif len(self.contadores) < self.capacidad:
+            self.contadores[clave] = [peso, 0]
+        else:
+            minima = min(self.contadores, key=lambda k: self.contadores[k][0])
+            conteo_minimo = self.contadores.pop(minima)[0]
+            self.contadores[clave] = [conteo_minimo + peso, conteo_minimo]
+
+    def top(self, n):
+        ordenados = sorted(self.contadores.items(), key=lambda item: item[1][0], reverse=True)
+        return [(clave, conteo, error) for clave, (conteo, error) in ordenados[:n]]
+
+
+def top_productos(desde, hasta, n=5, aproximado=False, capacidad=None):
+    """Los `n` productos con más unidades vendidas entre dos fechas: [(nombre, unidades)].
+
+    Solo lee los contadores diarios. Con aproximado=True los contadores se recorren
+    en streaming con memoria acotada (útil con catálogos muy grandes); el resultado
+    puede sobreestimar productos de la cola, nunca omite uno que supere el umbral.
+    """
+    buckets = VentaProductoDiario.objects.filter(Fecha__gte=desde, Fecha__lte=hasta)
+
+    if aproximado:
+        resumen = MasVendidos(capacidad or n * 10)
+        for producto_id, unidades in buckets.values_list('Producto_id', 'Unidades').iterator(chunk_size=2000):
+            resumen.agregar(producto_id, unidades)
+        top = [(producto_id, conteo) for producto_id, conteo, _ in resumen.top(n)]
+    else:
+        top = list(
+            buckets.order_by().values('Producto_id')
+            .annotate(unidades=Sum('Unidades'))
+            .filter(unidades__gt=0)
+            .order_by('-unidades', 'Producto_id')
+            .values_list('Producto_id', 'unidades')[:n]
+        )
+
+    nombres = dict(Producto.objects.filter(pk__in=[p for p, _ in top]).values_list('pk', 'NombreProducto'))
+    return [(nombres.get(producto_id, f'#{producto_id}'), unidades) for producto_id, unidades in top]
+
+
+def resumen_rango(desde, hasta):
+    """Totales (Total, Tickets, Unidades) entre dos fechas, inclusive, leyendo solo el resumen."""
+    datos = VentaResumenDiario.objects.filter(Fecha__gte=desde, Fecha__lte=hasta).aggregate(
+        Total=Sum('Total'), Tickets=Sum('Tickets'), Unidades=Sum('Unidades'),
+    )
+    return {
+        'Total': datos['Total'] or Decimal('0.00'),
+        'Tickets': datos['Tickets'] or 0,
+        'Unidades': datos['Unidades'] or 0,
+    }
+
+
+def resumen_por_dia(desde, hasta):
+    """Diccionario {fecha: VentaResumenDiario} entre dos fechas, inclusive."""
+    return {
+        resumen.Fecha: resumen
+        for resumen in VentaResumenDiario.objects.filter(Fecha__gte=desde, Fecha__lte=hasta)
+    }
+
+
+def calcular_resumen(desde=None, hasta=None):
+    """Calcula el resumen diario desde las tablas de ventas: {fecha: (total, tickets, unidades)}."""
+    ventas = Venta.objects.all()
+    detalles = VentaDetalle.objects.all()
+    if desde:
+        ventas = ventas.filter(Fecha_Venta__gte=desde)
+        detalles = detalles.filter(Fecha_Venta__gte=desde)
+    if hasta:
+        ventas = ventas.filter(Fecha_Venta__lte=hasta)
+        detalles = detalles.filter(Fecha_Venta__lte=hasta)
+
+    calculado = {}
+    for fila in ventas.order_by().values('Fecha_Venta').annotate(tickets=Count('Id_Venta')):
+        calculado[fila['Fecha_Venta']] = [Decimal('0.00'), fila['tickets'], 0]
+    for fila in (detalles.order_by().values('Fecha_Venta')
+                 .annotate(total=Sum('SubTotal'), unidades=Sum('CantidadVendida'))):
+        dia = calculado.setdefault(fila['Fecha_Venta'], [Decimal('0.00'), 0, 0])
+        # SQLite suma los decimales como flotantes; se redondea a centavos
+        dia[0] = (fila['total'] or Decimal('0.00')).quantize(CENTAVO)
+        dia[2] = fila['unidades'] or 0
+    return {fecha: tuple(valores) for fecha, valores in calculado.items()}
+
+
+@transaction.atomic
+def reconstruir_resumen(desde=None, hasta=None):
+    """Reemplaza el resumen del rango (o completo) por lo calculado desde las ventas."""
+    _descartar_encolados(ACUMULAR_DIA, desde, hasta)
+    calculado = calcular_resumen(desde, hasta)
+    existentes = VentaResumenDiario.objects.all()
+    if desde:
+        existentes = existentes.filter(Fecha__gte=desde)
+    if hasta:
+        existentes = existentes.filter(Fecha__lte=hasta)
+    existentes.delete()
+    VentaResumenDiario.objects.bulk_create([
+        VentaResumenDiario(Fecha=fecha, Total=total, Tickets=tickets, Unidades=unidades)
+        for fecha, (total, tickets, unidades) in calculado.items()
+    ], batch_size=1000)
+    return len(calculado)
+
+
+def _calcular_productos(desde=None, hasta=None):
+    detalles = VentaDetalle.objects.all()
+    if desde:
+        detalles = detalles.filter(Fecha_Venta__gte=desde)
+    if hasta:
+        detalles = detalles.filter(Fecha_Venta__lte=hasta)
+    return {
+        (fila['Fecha_Venta'], fila['Producto_id']): (fila['unidades'], fila['monto'].quantize(CENTAVO))
+        for fila in (detalles.order_by().values('Fecha_Venta', 'Producto_id')
+                     .annotate(unidades=Sum('CantidadVendida'), monto=Sum('SubTotal')))
+    }
+
+
+def _contadores_guardados(desde=None, hasta=None):
+    contadores = VentaProductoDiario.objects.all()
+    if desde:
+        contadores = contadores.filter(Fecha__gte=desde)
+    if hasta:
+        contadores = contadores.filter(Fecha__lte=hasta)
+    return contadores
+
+
+@transaction.atomic
+def reconstruir_productos(desde=None, hasta=None):
+    """Reemplaza los contadores diarios por producto del rango con lo calculado desde las ventas."""
+    _descartar_encolados(ACUMULAR_PRODUCTOS, desde, hasta)
+    calculado = _calcular_productos(desde, hasta)
+    _contadores_guardados(desde, hasta).delete()
+    VentaProductoDiario.objects.bulk_create([
+        VentaProductoDiario(Fecha=fecha, Producto_id=producto_id, Unidades=unidades, Monto=monto)
+        for (fecha, producto_id), (unidades, monto) in calculado.items()
+    ], batch_size=1000)
+    return len(calculado)
+
+
+def diferencias_productos(desde=None, hasta=None):
+    """Lista de ((fecha, producto_id), guardado, calculado) que no coinciden."""
+    calculado = _calcular_productos(desde, hasta)
+    guardado = {
+        (c.Fecha, c.Producto_id): (c.Unidades, c.Monto)
+        for c in _contadores_guardados(desde, hasta).filter(Unidades__gt=0)
+    }
+    diferencias = []
+    for clave in sorted(set(calculado) | set(guardado)):
+        esperado = calculado.get(clave, (0, Decimal('0.00')))
+        actual = guardado.get(clave, (0, Decimal('0.00')))
+        if esperado != actual:
+            diferencias.append((clave, actual, esperado))
+    return diferencias
+
+
+def diferencias_resumen(desde=None, hasta=None):
+    """Lista de (fecha, guardado, calculado) donde el resumen no coincide con las ventas."""
+    calculado = calcular_resumen(desde, hasta)
+    guardado = VentaResumenDiario.objects.all()
+    if desde:
+        guardado = guardado.filter(Fecha__gte=desde)
+    if hasta:
+        guardado = guardado.filter(Fecha__lte=hasta)
+    guardado = {r.Fecha: (r.Total, r.Tickets, r.Unidades) for r in guardado}
+
+    vacio = (Decimal('0.00'), 0, 0)
+    diferencias = []
+    for fecha in sorted(set(calculado) | set(guardado)):
+        esperado = calculado.get(fecha, vacio)
+        actual = guardado.get(fecha, vacio)
+        if esperado != actual:
+            diferencias.append((fecha, actual, esperado))
+    return diferencias
@@ -0,0 +1,254 @@
+import heapq
+import uuid
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .archivo import limite
+from .inventario import bloquear_productos, con_franjas_completas, existencias_actuales, registrar_venta
+from .models import Categoria, Cliente, Marca, Producto, ProductoEliminado, Venta, VentaTerminal, nueva_version
+
+# Ventas de un lote que se confirman en una misma transacción. Cada venta va en su
+# propio savepoint: una venta rechazada no deshace las demás.
+VENTAS_POR_TRANSACCION = 100
+
+# El catálogo nunca entrega un cursor más reciente que "ahora - MARGEN": una transacción
+# que tomó su versión antes pero confirmó después no queda atrás del cursor de la terminal.
+# Se consulta siempre en la primaria: el retraso de una réplica no está acotado por MARGEN.
+MARGEN = 5 * 60 * 1_000_000
+CATALOGO_LIMITE = 500
+CATALOGO_LIMITE_MAXIMO = 2000
+
+REGISTRADA = 'registrada'
+DUPLICADA = 'duplicada'
+RECHAZADA = 'rechazada'
+
+
+def _rechazo(clave, error, **extra):
+    return {'clave': clave, 'estado': RECHAZADA, 'error': error, **extra}
+
+
+def _recibida(recibida, estado):
+    return {'clave': str(recibida.Clave), 'estado': estado, 'venta': recibida.Venta, 'total': str(recibida.Total)}
+
+
+def _validar(dato, hoy, primer_dia):
+    """Convierte una venta del lote en (clave, fecha, cliente_id, [(producto_id, cantidad)]).
+
+    Lanza ValidationError con un mensaje para la terminal si la venta no es válida.
+    """
+    if not isinstance(dato, dict):
+        raise ValidationError("Cada venta debe ser un objeto.")
+    try:
+        clave = uuid.UUID(str(dato.get('clave')))
+    except ValueError:
+        raise ValidationError("La clave debe ser un UUID.")
+    try:
+        fecha = date.fromisoformat(str(dato.get('fecha')))
+    except ValueError:
+        raise ValidationError("La fecha debe tener el formato AAAA-MM-DD.")
+    if fecha > hoy:
+        raise ValidationError("La fecha de la venta no puede ser futura.")
+    if primer_dia and fecha < primer_dia:
+        raise ValidationError("La fecha de la venta pertenece a un año ya archivado.")
+    cliente = dato.get('cliente')
+    if not isinstance(cliente, int) or isinstance(cliente, bool):
+        raise ValidationError("El cliente debe ser un id.")
+    lineas = dato.get('lineas')
+    if not isinstance(lineas, list) or not lineas:
+        raise ValidationError("La venta debe tener al menos un producto.")
+    normalizadas = []
+    for linea in lineas:
+        producto = linea.get('producto') if isinstance(linea, dict) else None
+        cantidad = linea.get('cantidad') if isinstance(linea, dict) else None
+        if not all(isinstance(valor, int) and not isinstance(valor, bool) for valor in (producto, cantidad)):
+            raise ValidationError("Cada línea debe tener producto y cantidad enteros.")
+        if cantidad <= 0:
+            raise ValidationError("La cantidad debe ser mayor que cero.")
+        normalizadas.append((producto, cantidad))
+    if len({producto for producto, _ in normalizadas}) != len(normalizadas):
+        raise ValidationError("Un producto no puede repetirse en la misma venta.")
+    return clave, fecha, cliente, normalizadas
+
+
+def _faltantes(lineas):
+    existencias = existencias_actuales(producto_id for producto_id, _ in lineas)
+    return [
+        {'producto': producto_id, 'pedido': cantidad, 'existencia': existencias.get(producto_id, 0)}
+        for producto_id, cantidad in lineas
+        if cantidad > existencias.get(producto_id, 0)
+    ]
+
+
+def _registrar_parte(terminal, parte, completos):
+    """Registra en la transacción actual las ventas [(clave, fecha, cliente_id, lineas)]."""
+    # Todos los productos de la parte se bloquean de una vez y en orden: dos lotes
+    # con productos en común no pueden quedar esperándose mutuamente.
+    bloquear_productos({producto_id for *_, lineas in parte for producto_id, _ in lineas},
+                       sin_bloquear_franjas=True, completos=completos)
+    resultados = {}
+    for clave, fecha, cliente_id, lineas in parte:
+        try:
+            with transaction.atomic():
+                venta = registrar_venta(Venta(Fecha_Venta=fecha, Cliente_id=cliente_id), lineas, completos)
+                recibida = VentaTerminal.objects.create(Clave=clave, Terminal=terminal, Venta=venta.pk,
+                                                        Total=venta.Total)
+            resultados[clave] = _recibida(recibida, REGISTRADA)
+        except IntegrityError:
+            # Otra petición registró la misma clave al mismo tiempo; cualquier otra violación no es un duplicado
+            recibida = VentaTerminal.objects.filter(pk=clave, Terminal=terminal).first()
+            if recibida is None:
+                raise
+            resultados[clave] = _recibida(recibida, DUPLICADA)
+        except ValidationError as error:
+            resultados[clave] = _rechazo(str(clave), error.messages[0], faltantes=_faltantes(lineas))
+    return resultados
+
+
+def registrar_lote(terminal, ventas):
+    """Registra un lote de ventas de una terminal; devuelve un resultado por venta, en orden.
+
+    Cada venta trae {'clave': uuid, 'fecha': 'AAAA-MM-DD', 'cliente': id,
+    'lineas': [{'producto': id, 'cantidad': n}]}. La clave la genera la terminal: una
+    venta que ya se recibió (en este lote o antes) se contesta como 'duplicada' con la
+    venta original, así reenviar un lote completo nunca duplica ventas. Las válidas se
+    confirman de VENTAS_POR_TRANSACCION en VENTAS_POR_TRANSACCION; las rechazadas por
+    existencia traen en 'faltantes' lo pedido y lo disponible de cada producto.
+    El precio es siempre el vigente en el servidor al recibir la venta.
+    """
+    hoy = timezone.localdate()
+    primer_dia = limite()
+    resultados = [None] * len(ventas)
+    validas = {}
+    repetidas = []
+    for indice, dato in enumerate(ventas):
+        try:
+            venta = _validar(dato, hoy, primer_dia)
+        except ValidationError as error:
+            clave = dato.get('clave') if isinstance(dato, dict) else None
+            resultados[indice] = _rechazo(clave, error.messages[0])
+            continue
+        if venta[0] in validas:
+            repetidas.append((indice, venta[0]))
+        else:
+            validas[venta[0]] = (indice, venta)
+
+    # Clientes y productos de todo el lote en una consulta cada uno
+    clientes = set(Cliente.objects.filter(pk__in={v[2] for _, v in validas.values()}).values_list('pk', flat=True))
+    productos = set(Producto.objects.filter(
+        pk__in={producto_id for _, v in validas.values() for producto_id, _ in v[3]},
+    ).values_list('pk', flat=True))
+    for recibida in VentaTerminal.objects.filter(pk__in=list(validas)):
+        indice, _ = validas.pop(recibida.Clave)
+        resultados[indice] = _recibida(recibida, DUPLICADA)
+
+    pendientes = []
+    for clave, (indice, venta) in validas.items():
+        if venta[2] not in clientes:
+            resultados[indice] = _rechazo(str(clave), "El cliente no existe.")
+        elif any(producto_id not in productos for producto_id, _ in venta[3]):
+            resultados[indice] = _rechazo(str(clave), "El producto seleccionado no existe.")
+        else:
+            pendientes.append(venta)
+
+    registradas = {}
+    for inicio in range(0, len(pendientes), VENTAS_POR_TRANSACCION):
+        registradas.update(con_franjas_completas(
+            _registrar_parte, terminal, pendientes[inicio:inicio + VENTAS_POR_TRANSACCION],
+            operacion='registrar_lote',
+        ))
+    for clave, (indice, _) in validas.items():
+        resultados[indice] = resultados[indice] or registradas[clave]
+
+    for indice, clave in repetidas:
+        original = next(r for r in resultados if r and r['clave'] == str(clave))
+        resultados[indice] = {**original, 'estado': DUPLICADA} if original['estado'] != RECHAZADA else original
+    return resultados
+
+
+def _leer_cursor(cursor):
+    """'<version>' o '<version>-<producto>' -> (version, producto); None si no es válido."""
+    version, _, producto = str(cursor or '0').partition('-')
+    try:
+        return int(version), int(producto or 0)
+    except ValueError:
+        return None
+
+
+def catalogo_desde(cursor=None, limite_filas=CATALOGO_LIMITE):
+    """Productos cambiados y borrados después de `cursor`, en orden de (Version, Id_Producto).
+
+    Devuelve {'productos': [...], 'eliminados': [ids], 'cursor': ..., 'mas': bool}. La
+    terminal guarda el cursor y lo vuelve a mandar; con 'mas' pide enseguida la siguiente
+    página. Puede recibir otra vez un producto que ya tenía: las filas se aplican
+    reemplazando, y los eliminados se quitan (si no los tiene, se ignoran).
+    La existencia de los productos con franjas es la del momento de la consulta; su
+    versión cambia cuando se confirma cada venta (refrescar_franjas).
+    Lanza ValueError si el cursor no es válido.
+    """
+    leido = _leer_cursor(cursor)
+    if leido is None:
+        raise ValueError("Cursor inválido.")
+    desde, despues = leido
+    limite_filas = max(1, min(limite_filas, CATALOGO_LIMITE_MAXIMO))
+
+    posteriores = Q(Version__gt=desde) | Q(Version=desde, pk__gt=despues)
+    cambiados = (
+        Producto.objects.filter(posteriores).order_by('Version', 'pk')
+        .values('pk', 'Version', 'Codigo', 'NombreProducto', 'Precio', 'Existencia',
+                'Marca__NombreMarca', 'Categoria__NombreCategoria')[:limite_filas + 1]
+    )
+    # Sin cursor la terminal no tiene productos que quitar
+    eliminados = (
+        ProductoEliminado.objects.filter(posteriores).order_by('Version', 'pk')
+        .values('pk', 'Version')[:limite_filas + 1] if leido != (0, 0) else []
+    )
+    filas = list(heapq.merge(cambiados, eliminados, key=lambda fila: (fila['Version'], fila['pk'])))
+    mas = len(filas) > limite_filas
+    filas = filas[:limite_filas]
+    if filas:
+        desde, despues = filas[-1]['Version'], filas[-1]['pk']
+    eliminados = [fila['pk'] for fila in filas if 'NombreProducto' not in fila]
+    filas = [fila for fila in filas if 'NombreProducto' in fila]
+    if not mas:
+        tope = nueva_version() - MARGEN
+        if desde > tope >= leido[0]:
+            desde, despues = tope, 0
+
+    existencias = existencias_actuales(fila['pk'] for fila in filas) if filas else {}
+    return {
+        'productos': [
+            {
+                'id': fila['pk'],
+                'codigo': fila['Codigo'],
+                'nombre': fila['NombreProducto'],
+                'precio': str(fila['Precio']),
+                'existencia': existencias.get(fila['pk'], fila['Existencia']),
+                'marca': fila['Marca__NombreMarca'],
+                'categoria': fila['Categoria__NombreCategoria'],
+            }
+            for fila in filas
+        ],
+        'eliminados': eliminados,
+        'cursor': f'{desde}-{despues}' if despues else str(desde),
+        'mas': mas,
+    }
+
+
+def _al_renombrar(sender, instance, created, **kwargs):
+    # El catálogo lleva el nombre de la marca y la categoría: sus productos cambian de versión
+    if not created:
+        Producto.objects.filter(**{sender.__name__: instance}).update(Version=nueva_version())
+
+
+def _al_borrar(sender, instance, **kwargs):
+    ProductoEliminado.objects.create(pk=instance.pk)
+
+
+post_save.connect(_al_renombrar, sender=Marca, dispatch_uid='sincronizacion_marca_save')
+post_save.connect(_al_renombrar, sender=Categoria, dispatch_uid='sincronizacion_categoria_save')
+post_delete.connect(_al_borrar, sender=Producto, dispatch_uid='sincronizacion_producto_delete')
@@ -0,0 +1,253 @@
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .metricas import TAREA_DURACION, TAREA_ESPERA
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+# Cola de tareas en segundo plano guardada en la base (tabla Tarea), sin broker externo.
+# Un trabajador es un grupo de hilos que toma tareas disponibles, las ejecuta y las borra;
+# corre con `manage.py procesar_tareas` o dentro de cada worker de gunicorn (TAREAS_EN_PROCESO).
+
+# nombre -> (función, intentos máximos)
+_REGISTRO = {}
+# nombre -> segundos entre ejecuciones de las tareas periódicas
+_PERIODICAS = {}
+# Cada cuánto revisa un trabajador que las periódicas tengan su fila en la cola
+REVISAR_PERIODICAS = 60
+# Espera máxima entre vueltas del trabajador cuando la base falla
+ESPERA_MAXIMA_FALLO = 60
+# Se activa al confirmar una transacción que encoló algo: el trabajador del proceso no
+# espera al siguiente sondeo.
+_hay_trabajo = threading.Event()
+_en_proceso = None
+
+
+class _TareaPerdida(Exception):
+    """Otro trabajador tomó la tarea (se venció su plazo): se deshace lo ejecutado."""
+
+
+def tarea(nombre, intentos=None, cada=None):
+    """Registra la función como tarea `nombre`; sus argumentos deben ser serializables a JSON.
+
+    Con `cada` (segundos) es periódica y sin argumentos: los trabajadores la encolan
+    solos y al terminar queda encolada la siguiente, `cada` segundos después.
+    """
+    def registrar(funcion):
+        _REGISTRO[nombre] = (funcion, intentos)
+        if cada:
+            _PERIODICAS[nombre] = cada
+        return funcion
+    return registrar
+
+
+def encolar(nombre, **argumentos):
+    """Agrega una tarea a la cola dentro de la transacción actual.
+
+    Si la transacción se deshace la tarea desaparece con ella; al confirmarse se
+    despierta al trabajador de este proceso.
+    """
+    if nombre not in _REGISTRO:
+        raise KeyError(f"Tarea no registrada: {nombre}")
+    Tarea.objects.create(Nombre=nombre, Argumentos=argumentos)
+    transaction.on_commit(_hay_trabajo.set)
+
+
+def _disponibles(ahora):
+    vencidas = ahora - timedelta(seconds=settings.TAREAS_VENCIMIENTO)
+    # Una tarea 'en_curso' con el plazo vencido es de un trabajador que murió a la mitad
+    return Tarea.objects.filter(
+        Q(Estado=Tarea.PENDIENTE, Disponible__lte=ahora) | Q(Estado=Tarea.EN_CURSO, Iniciada__lt=vencidas)
+    )
+
+
+def tomar(cantidad, nombres=None):
+    """Reserva hasta `cantidad` tareas disponibles para este trabajador y las devuelve.
+
+    Cada una se toma con un UPDATE condicionado a su número de intentos: si otro
+    trabajador la tomó primero no se actualiza ninguna fila y se deja pasar. No hace
+    falta SELECT ... FOR UPDATE SKIP LOCKED, así funciona igual en SQLite.
+    """
+    ahora = timezone.now()
+    candidatas = _disponibles(ahora)
+    if nombres is not None:
+        candidatas = candidatas.filter(Nombre__in=nombres)
+    tomadas = []
+    for candidata in candidatas.order_by('Disponible', 'pk')[:cantidad]:
+        if Tarea.objects.filter(pk=candidata.pk, Intentos=candidata.Intentos).update(
+            Estado=Tarea.EN_CURSO, Iniciada=ahora, Intentos=F('Intentos') + 1,
+        ):
+            candidata.Estado, candidata.Iniciada, candidata.Intentos = Tarea.EN_CURSO, ahora, candidata.Intentos + 1
+            tomadas.append(candidata)
+    return tomadas
+
+
+def ejecutar(tarea):
+    """Ejecuta una tarea tomada; devuelve 'hecha', 'reintento', 'muerta' o 'perdida'.
+
+    La función y el borrado de la fila van en la misma transacción. Si falla, la tarea
+    vuelve a la cola con espera exponencial hasta agotar sus intentos y entonces queda
+    como 'muerta' (cola de fallidas) para revisarla con `procesar_tareas --estado`.
+    """
+    funcion, intentos = _REGISTRO.get(tarea.Nombre, (None, None))
+    TAREA_ESPERA.labels(tarea.Nombre).observe((tarea.Iniciada - tarea.Creada).total_seconds())
+    inicio = time.perf_counter()
+    try:
+        if funcion is None:
+            raise LookupError(f"Tarea no registrada: {tarea.Nombre}")
+        with transaction.atomic():
+            funcion(**tarea.Argumentos)
+            if not Tarea.objects.filter(pk=tarea.pk, Intentos=tarea.Intentos).delete()[0]:
+                raise _TareaPerdida()
+            if tarea.Nombre in _PERIODICAS:
+                _siguiente(tarea.Nombre)
+        resultado = 'hecha'
+    except _TareaPerdida:
+        resultado = 'perdida'
+    except Exception:
+        maximo = intentos or settings.TAREAS_INTENTOS
+        error = traceback.format_exc()
+        if tarea.Intentos >= maximo:
+            resultado = 'muerta'
+            cambios = {'Estado': Tarea.MUERTA}
+            logger.error("Tarea %s #%s fallida tras %s intentos:\n%s", tarea.Nombre, tarea.pk, tarea.Intentos, error)
+        else:
+            resultado = 'reintento'
+            espera = settings.TAREAS_ESPERA_BASE * 2 ** (tarea.Intentos - 1)
+            cambios = {'Estado': Tarea.PENDIENTE, 'Disponible': timezone.now() + timedelta(seconds=espera)}
+            logger.warning("Tarea %s #%s falló (intento %s/%s), se reintenta en %ss",
+                           tarea.Nombre, tarea.pk, tarea.Intentos, maximo, espera)
+        Tarea.objects.filter(pk=tarea.pk, Intentos=tarea.Intentos).update(Error=error, **cambios)
+    TAREA_DURACION.labels(tarea.Nombre, resultado).observe(time.perf_counter() - inicio)
+    return resultado
+
+
+def _siguiente(nombre):
+    # Si por una carrera entre trabajadores hay otra fila de la misma periódica, la serie sigue con esa
+    if not Tarea.objects.filter(Nombre=nombre).exists():
+        cuando = timezone.now() + timedelta(seconds=_PERIODICAS[nombre])
+        Tarea.objects.create(Nombre=nombre, Creada=cuando, Disponible=cuando)
+
+
+def programar_periodicas():
+    """Encola ya las tareas periódicas que no tienen fila en la cola; devuelve sus nombres.
+
+    Una periódica muerta también cuenta como encolada: no se repite hasta que se
+    reintente (`procesar_tareas --reintentar-muertas`).
+    """
+    encoladas = set(Tarea.objects.filter(Nombre__in=list(_PERIODICAS)).values_list('Nombre', flat=True))
+    faltantes = [nombre for nombre in _PERIODICAS if nombre not in encoladas]
+    Tarea.objects.bulk_create([Tarea(Nombre=nombre) for nombre in faltantes])
+    return faltantes
+
+
+def _cerrar_viejas():
+    # Como close_old_connections() en cada petición: cierra las conexiones con errores o más
+    # viejas que CONN_MAX_AGE. Una con transacción abierta (las pruebas) no se toca.
+    for conexion in connections.all(initialized_only=True):
+        if not conexion.in_atomic_block:
+            conexion.close_if_unusable_or_obsolete()
+
+
+def _ejecutar_en_hilo(tarea):
+    _cerrar_viejas()
+    try:
+        return ejecutar(tarea)
+    finally:
+        _cerrar_viejas()
+
+
+def procesar_pendientes(nombres=None):
+    """Ejecuta en este hilo las tareas disponibles hasta vaciar la cola; devuelve cuántas ejecutó.
+
+    Para comandos de mantenimiento que necesitan los resultados ya aplicados.
+    Las que fallan vuelven a la cola con su espera y no se reintentan aquí.
+    """
+    ejecutadas = 0
+    while True:
+        tomadas = tomar(100, nombres)
+        if not tomadas:
+            return ejecutadas
+        for pendiente in tomadas:
+            ejecutar(pendiente)
+        ejecutadas += len(tomadas)
+
+
+def trabajar(hilos=None, parar=None, una_vez=False):
+    """Bucle del trabajador: toma tareas y las reparte entre `hilos` hilos.
+
+    Sin trabajo espera a que una transacción de este proceso encole algo o a que pase
+    TAREAS_SONDEO (las tareas encoladas por otros procesos se ven al sondear).
+    Con `una_vez` termina en cuanto la cola queda vacía. `parar` es un threading.Event.
+    Un error de la base no detiene el bucle: se registra y se vuelve a intentar con
+    espera exponencial hasta ESPERA_MAXIMA_FALLO.
+    """
+    hilos = hilos or settings.TAREAS_HILOS
+    parar = parar or threading.Event()
+    fallos = 0
+    revision = 0.0
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='tareas') as grupo:
+        while not parar.is_set():
+            _hay_trabajo.clear()
+            _cerrar_viejas()
+            try:
+                if not una_vez and time.monotonic() >= revision:
+                    programar_periodicas()
+                    revision = time.monotonic() + REVISAR_PERIODICAS
+                tomadas = tomar(hilos * 2)
+                if tomadas:
+                    list(grupo.map(_ejecutar_en_hilo, tomadas))
+            except Exception:
+                fallos += 1
+                espera = min(ESPERA_MAXIMA_FALLO, settings.TAREAS_SONDEO * 2 ** fallos)
+                logger.exception("Falló una vuelta del trabajador de tareas (%s seguidas); se reintenta en %ss",
+                                 fallos, espera)
+                parar.wait(espera)
+                continue
+            fallos = 0
+            if tomadas:
+                continue
+            if una_vez:
+                break
+            _hay_trabajo.wait(settings.TAREAS_SONDEO)
+    _cerrar_viejas()
+
+
+def iniciar_en_proceso():
+    """Arranca (una sola vez por proceso) un trabajador en un hilo de fondo."""
+    global _en_proceso
+    if _en_proceso is None:
+        _en_proceso = threading.Thread(target=trabajar, name='tareas', daemon=True)
+        _en_proceso.start()
+    return _en_proceso
+
+
+def estado_cola():
+    """{'pendiente': n, 'en_curso': n, 'muerta': n, 'antiguedad': segundos de la pendiente más vieja}."""
+    filas = Tarea.objects.order_by().values('Estado').annotate(total=Count('pk'), creada=Min('Creada'))
+    estado = {clave: 0 for clave, _ in Tarea.ESTADOS}
+    antiguedad = 0.0
+    for fila in filas:
+        estado[fila['Estado']] = fila['total']
+        if fila['Estado'] != Tarea.MUERTA:
+            antiguedad = max(antiguedad, (timezone.now() - fila['creada']).total_seconds())
+    estado['antiguedad'] = antiguedad
+    return estado
+
+
+def reintentar_muertas(nombres=None):
+    """Devuelve a la cola las tareas muertas con sus intentos en cero; devuelve cuántas."""
+    muertas = Tarea.objects.filter(Estado=Tarea.MUERTA)
+    if nombres is not None:
+        muertas = muertas.filter(Nombre__in=nombres)
+    return muertas.update(Estado=Tarea.PENDIENTE, Intentos=0, Disponible=timezone.now(), Iniciada=None)
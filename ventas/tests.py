@@ -1,3 +1,1622 @@
-from django.test import TestCase
+import contextvars
+import csv
+import gzip
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from unittest import mock, skipUnless
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, OperationalError, connection, transaction
+from django.db.models import Count, F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from . import urls
+from .accesos import tiene_acceso
+from .archivo import archivar_anio, borrar_archivado, buscar_venta, limite
+from .busqueda import RESULTADOS_POR_PAGINA
+from .concurrente import consultas_concurrentes
+from .existencias import conciliar_existencias, existencia_en, generar_corte
+from .inventario import (
+    AVISO_STOCK_BAJO, configurar_franjas, contencion, ejecutar_con_reintentos, existencias_actuales,
+    fijar_existencia, recalcular_stock_bajo, registrar_venta, repartir_franjas,
+)
+from .importar import importar_productos
+from .listas import obtener_lista
+from .metricas import _Medidor, _medidor_actual
+from .paginacion import _codificar, paginar_keyset
+from .particiones import DETALLE, VENTA, crear_particiones, esta_particionado, nombre_particion, particionar
+from .replicas import COOKIE_PRIMARIA, ReplicasMiddleware, RouterReplicas, _replica, conservar_replica, solo_lectura
+from .reportes import desplazar, reporte_ventas
+from .resumenes import (
+    MasVendidos, acumular_dia, diferencias_productos, diferencias_resumen, reconstruir_resumen, top_productos,
+)
+from .sincronizacion import catalogo_desde, registrar_lote
+from . import concurrente, inventario, tareas, views
+from .tareas import ejecutar, encolar, procesar_pendientes, programar_periodicas, tarea, tomar, trabajar
+from .models import (
+    Categoria, Cliente, Marca, MovimientoInventario, Producto, Tarea, TemplateResource, Usuario, Venta,
+    VentaDetalle, VentaProductoDiario, VentaResumenDiario, VentaTerminal,
+)
 
 # Create your tests here.
+class DatosBase:
+    """Marca Truper, categoría Herramientas y la clienta Ana López; _producto crea productos de ellas."""
+
+    PUNTO_REORDEN = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.marca = Marca.objects.create(NombreMarca='Truper')
+        cls.categoria = Categoria.objects.create(NombreCategoria='Herramientas', PuntoReorden=cls.PUNTO_REORDEN)
+        cls.cliente = Cliente.objects.create(
+            PrimerNombre='Ana', SegundoNombre='', PrimerApellido='López', SegundoApellido='',
+        )
+
+    @classmethod
+    def _producto(cls, nombre, existencia, precio='100.00', **campos):
+        campos = {'Descripcion': nombre, 'Marca': cls.marca, 'Categoria': cls.categoria, **campos}
+        return Producto.objects.create(NombreProducto=nombre, Existencia=existencia, Precio=Decimal(precio), **campos)
+
+
+class VentasRegistrarConsultasTests(DatosBase, TestCase):
+    """El número de consultas de ventas_registrar no debe depender del número de líneas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.productos = [
+            cls._producto(f'Martillo {i}', 100, '150.00', Descripcion='Martillo de uña') for i in range(12)
+        ]
+        cls.usuario = Usuario.objects.create_user(username='cajero', password='Cajero123+')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _datos(self, lineas, cantidad=1):
+        datos = {
+            'Cliente': self.cliente.pk,
+            'form-TOTAL_FORMS': str(lineas),
+            'form-INITIAL_FORMS': '0',
+        }
+        for i, producto in enumerate(self.productos[:lineas]):
+            datos[f'form-{i}-Producto'] = producto.pk
+            datos[f'form-{i}-CantidadVendida'] = cantidad
+        return datos
+
+    def _consultas_post(self, lineas, cantidad=1, estado=302):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.post(reverse('ventas_registrar'), self._datos(lineas, cantidad))
+        self.assertEqual(respuesta.status_code, estado)
+        return len(consultas)
+
+    def test_registrar_venta_consultas_constantes(self):
+        # La primera venta del día crea las filas de los resúmenes; se descarta
+        self._consultas_post(1)
+        self.assertEqual(self._consultas_post(1), self._consultas_post(10))
+
+    def test_formulario_con_errores_consultas_constantes(self):
+        # Sin stock suficiente el formulario se vuelve a dibujar con todas las líneas.
+        # La primera petición llena la caché de clientes; se descarta
+        self._consultas_post(1, cantidad=1000, estado=200)
+        self.assertEqual(
+            self._consultas_post(1, cantidad=1000, estado=200),
+            self._consultas_post(10, cantidad=1000, estado=200),
+        )
+
+    def test_producto_inexistente_es_error_de_formulario(self):
+        datos = self._datos(2)
+        datos['form-1-Producto'] = 999999
+        respuesta = self.client.post(reverse('ventas_registrar'), datos)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.context['detalle_formset'].forms[1].errors)
+
+
+class RegistrarVentaTests(DatosBase, TestCase):
+    """registrar_venta guarda todo o nada: sin existencia suficiente no queda ni la venta ni sus descuentos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.martillo = cls._producto('Martillo', 10)
+        cls.pinza = cls._producto('Pinza', 3, '80.00')
+
+    def _existencias(self):
+        return dict(Producto.objects.values_list('NombreProducto', 'Existencia'))
+
+    def test_sin_existencia_no_guarda_nada(self):
+        # La línea que no alcanza va después de una que sí: ningún producto queda descontado
+        with self.assertRaisesMessage(ValidationError, "No hay stock suficiente"):
+            registrar_venta(Venta(Cliente=self.cliente), [(self.martillo, 4), (self.pinza, 4)])
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(VentaDetalle.objects.exists())
+        self.assertEqual(self._existencias(), {'Martillo': 10, 'Pinza': 3})
+
+        # Lo mismo al agregar líneas a una venta ya guardada: su total no cambia
+        venta = registrar_venta(Venta(Cliente=self.cliente), [(self.martillo, 1)])
+        with self.assertRaises(ValidationError):
+            registrar_venta(venta, [(self.pinza, 3), (self.martillo, 10)])
+        venta.refresh_from_db()
+        self.assertEqual(venta.Total, Decimal('100.00'))
+        self.assertEqual(list(venta.detalles.values_list('Producto', 'CantidadVendida')), [(self.martillo.pk, 1)])
+        self.assertEqual(self._existencias(), {'Martillo': 9, 'Pinza': 3})
+
+        # Con la existencia justa se vende todo
+        registrar_venta(Venta(Cliente=self.cliente), [(self.martillo, 9), (self.pinza, 3)])
+        self.assertEqual(self._existencias(), {'Martillo': 0, 'Pinza': 0})
+
+
+def huella_sql(sql):
+    """Normaliza una consulta quitando literales para agrupar las que solo cambian en parámetros."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def reporte_consultas(consultas):
+    """Consultas agrupadas por huella, las repetidas primero (típico de un N+1)."""
+    grupos = Counter(huella_sql(consulta['sql']) for consulta in consultas)
+    lineas = [f"{len(consultas)} consultas, {len(grupos)} distintas:"]
+    for huella, veces in grupos.most_common():
+        lineas.append(f"  {veces}x {huella}")
+    return '\n'.join(lineas)
+
+
+# Presupuesto por vista de ventas/urls.py: (máximo de consultas, máximo de milisegundos).
+# Las peticiones son GET como superusuario; una vista nueva sin presupuesto hace fallar la prueba.
+# Las consultas siempre se exigen; los milisegundos dependen de la máquina y solo se exigen
+# con PRESUPUESTOS_TIEMPO=1 (si no, los excesos se informan en stderr).
+EXIGIR_TIEMPO = os.getenv('PRESUPUESTOS_TIEMPO') == '1'
+PRESUPUESTOS = {
+    'login': (2, 500),
+    'logout': (4, 500),
+    'register': (2, 500),
+    'dashboard': (8, 1000),
+    'productos_lista': (5, 1000),
+    'productos_registrar': (4, 1000),
+    'productos_buscar': (3, 500),
+    'productos_stock_bajo': (4, 1000),
+    'marca_lista': (3, 500),
+    'categoria_lista': (3, 500),
+    'clientes_lista': (3, 1000),
+    'clientes_registrar': (2, 500),
+    'ventas_lista': (3, 1000),
+    'ventas_exportar': (3, 2000),
+    'ventas_registrar': (3, 1000),
+    'ventas_detalle': (4, 500),
+    'reportes_ventas': (6, 1000),
+    'inventario_contencion': (2, 500),
+    'metricas': (3, 500),
+    'terminal_ventas': (3, 500),
+    'terminal_catalogo': (5, 500),
+}
+PARAMETROS = {
+    'productos_buscar': '?q=mar',
+    'ventas_exportar': '?tipo=detalles',
+    'reportes_ventas': '?dimension=categoria&periodo=mes&comparar=1',
+}
+
+
+def _conflicto(codigo):
+    """DatabaseError como lo envuelve Django, con el SQLSTATE del driver en __cause__."""
+    causa = Exception(codigo)
+    causa.pgcode = codigo
+    error = DatabaseError(f'error {codigo}')
+    error.__cause__ = causa
+    return error
+
+
+@override_settings(STOCK_REINTENTOS=3, STOCK_ESPERA_BASE=0.05, STOCK_ESPERA_MAXIMA=0.15)
+class ReintentosTests(TransactionTestCase):
+    """ejecutar_con_reintentos: solo conflictos transitorios, backoff acotado y nunca dentro de otra transacción."""
+
+    def setUp(self):
+        contencion.reiniciar()
+        self.addCleanup(contencion.reiniciar)
+        dormir = mock.patch.object(inventario.time, 'sleep')
+        self.dormir = dormir.start()
+        self.addCleanup(dormir.stop)
+
+    def _falla(self, *errores):
+        """Función que lanza `errores` en orden y después devuelve 'ok'."""
+        return mock.Mock(side_effect=[*errores, 'ok'])
+
+    def test_reintenta_deadlock_y_serializacion(self):
+        funcion = self._falla(_conflicto('40P01'), _conflicto('40001'))
+        # Jitter al máximo para ver el tope: 0.05 * 2, luego 0.05 * 4 acotado a 0.15
+        with mock.patch.object(inventario.random, 'uniform', side_effect=lambda a, b: b) as azar, \
+                self.assertLogs('ventas.inventario', 'WARNING') as registros:
+            self.assertEqual(ejecutar_con_reintentos(funcion, 7, operacion='prueba'), 'ok')
+        self.assertEqual(funcion.call_count, 3)
+        funcion.assert_called_with(7)
+        self.assertEqual([llamada.args for llamada in azar.call_args_list], [(0, 0.1), (0, 0.15)])
+        self.assertEqual([llamada.args for llamada in self.dormir.call_args_list], [(0.1,), (0.15,)])
+        self.assertEqual(len(registros.output), 2)
+        self.assertEqual(contencion.reintentos_por_operacion, {'prueba': 2})
+        self.assertEqual(contencion.fallos, 0)
+
+    def test_agota_los_reintentos(self):
+        funcion = mock.Mock(side_effect=_conflicto('40001'))
+        with self.assertLogs('ventas.inventario', 'WARNING'), self.assertRaises(DatabaseError):
+            ejecutar_con_reintentos(funcion, operacion='prueba')
+        self.assertEqual(funcion.call_count, 4)
+        self.assertEqual(self.dormir.call_count, 3)
+        self.assertTrue(all(0 <= llamada.args[0] <= 0.15 for llamada in self.dormir.call_args_list))
+        self.assertEqual(contencion.reintentos, 3)
+        self.assertEqual(contencion.fallos, 1)
+
+    def test_no_reintenta_otros_errores(self):
+        funcion = self._falla(_conflicto('23505'))
+        with self.assertRaises(DatabaseError):
+            ejecutar_con_reintentos(funcion)
+        self.assertEqual(funcion.call_count, 1)
+        self.dormir.assert_not_called()
+        self.assertEqual(contencion.reintentos, 0)
+
+    def test_no_reintenta_dentro_de_una_transaccion(self):
+        # El conflicto aborta la transacción externa: debe reintentarla quien la abrió
+        funcion = self._falla(_conflicto('40P01'))
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            ejecutar_con_reintentos(funcion)
+        self.assertEqual(funcion.call_count, 1)
+        self.dormir.assert_not_called()
+        self.assertEqual(contencion.reintentos, 0)
+
+        # Fuera de ella el mismo conflicto sí se reintenta
+        funcion = self._falla(_conflicto('40P01'))
+        with self.assertLogs('ventas.inventario', 'WARNING'):
+            self.assertEqual(ejecutar_con_reintentos(funcion), 'ok')
+        self.assertEqual(funcion.call_count, 2)
+
+
+class PresupuestoConsultasTests(TestCase):
+    """Cada vista debe respetar su presupuesto y no hacer más consultas con más datos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_superuser('presupuesto', None, 'Presupuesto123+')
+        cls._sembrar(semilla=1, productos=15, clientes=5, ventas=10)
+
+    @staticmethod
+    def _sembrar(semilla, **volumen):
+        call_command(
+            'sembrar_datos', semilla=semilla, marcas=5, categorias=5, lineas_max=5, dias=30,
+            stdout=StringIO(), **volumen,
+        )
+
+    def _url(self, nombre):
+        if nombre == 'ventas_detalle':
+            # La venta con más líneas, para que un N+1 en el detalle se note
+            venta = Venta.objects.annotate(lineas=Count('detalles')).order_by('-lineas', 'pk').first()
+            return reverse(nombre, args=[venta.pk])
+        return reverse(nombre) + PARAMETROS.get(nombre, '')
+
+    def _medir(self, nombre):
+        self.client.force_login(self.usuario)
+        url = self._url(nombre)
+        self.client.get(url)  # calentamiento (cachés de ContentType, plantillas, etc.)
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            respuesta = self.client.get(url)
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+            duracion = (time.perf_counter() - inicio) * 1000
+        self.assertLess(respuesta.status_code, 400, f"{nombre} respondió {respuesta.status_code}")
+        return consultas.captured_queries, duracion
+
+    def _medir_todas(self):
+        return {nombre: self._medir(nombre) for nombre in PRESUPUESTOS}
+
+    def test_todas_las_vistas_tienen_presupuesto(self):
+        nombres = {patron.name for patron in urls.urlpatterns if patron.name}
+        self.assertEqual(nombres - set(PRESUPUESTOS), set(), "Vistas sin presupuesto de consultas")
+
+    def test_presupuestos_con_dos_volumenes(self):
+        pequeno = self._medir_todas()
+        self._sembrar(semilla=2, productos=150, clientes=60, ventas=300)
+        grande = self._medir_todas()
+
+        for nombre, (maximo_consultas, maximo_ms) in PRESUPUESTOS.items():
+            consultas_pequeno, _ = pequeno[nombre]
+            consultas, duracion = grande[nombre]
+            with self.subTest(vista=nombre):
+                self.assertLessEqual(
+                    len(consultas), maximo_consultas,
+                    f"{nombre} excede su presupuesto de {maximo_consultas} consultas\n{reporte_consultas(consultas)}",
+                )
+                self.assertLessEqual(
+                    len(consultas), len(consultas_pequeno),
+                    f"{nombre} hace más consultas con más datos ({len(consultas_pequeno)} -> {len(consultas)})\n"
+                    f"{reporte_consultas(consultas)}",
+                )
+                mensaje = f"{nombre} tardó {duracion:.0f} ms (máximo {maximo_ms} ms)"
+                if EXIGIR_TIEMPO:
+                    self.assertLessEqual(duracion, maximo_ms, mensaje)
+                elif duracion > maximo_ms:
+                    sys.stderr.write(f"\n{mensaje}\n")
+
+
+class SembrarDatosTests(DatosBase, TestCase):
+    """sembrar_datos --limpiar solo borra con DEBUG y con confirmación (o --no-input)."""
+
+    def _sembrar(self, **opciones):
+        call_command('sembrar_datos', limpiar=True, marcas=1, categorias=1, clientes=1, productos=1,
+                     ventas=0, lineas_max=1, stdout=StringIO(), **opciones)
+
+    def test_sin_debug_no_borra(self):
+        with override_settings(DEBUG=False), self.assertRaises(CommandError):
+            self._sembrar(interactivo=False)
+        self.assertTrue(Cliente.objects.filter(pk=self.cliente.pk).exists())
+
+    @override_settings(DEBUG=True)
+    def test_confirmacion(self):
+        with mock.patch('builtins.input', return_value='no'), self.assertRaises(CommandError):
+            self._sembrar()
+        self.assertTrue(Cliente.objects.filter(pk=self.cliente.pk).exists())
+
+        with mock.patch('builtins.input', return_value='si'):
+            self._sembrar()
+        self.assertFalse(Cliente.objects.filter(pk=self.cliente.pk).exists())
+        self.assertEqual(Cliente.objects.count(), 1)
+
+        with mock.patch('builtins.input') as entrada:
+            self._sembrar(interactivo=False)
+        entrada.assert_not_called()
+
+
+class ListasCacheTests(TestCase):
+    """Las listas de referencia se sirven desde la caché y se invalidan al cambiar un registro."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_segunda_lectura_no_consulta(self):
+        Marca.objects.create(NombreMarca='Truper')
+        obtener_lista('marcas')
+        with self.assertNumQueries(0):
+            self.assertEqual([m.NombreMarca for m in obtener_lista('marcas')], ['Truper'])
+
+    def test_alta_y_baja_logica_invalidan(self):
+        marca = Marca.objects.create(NombreMarca='Truper')
+        self.assertEqual(len(obtener_lista('marcas')), 1)
+        Marca.objects.create(NombreMarca='Urrea')
+        self.assertEqual(len(obtener_lista('marcas')), 2)
+        marca.Activo = False
+        marca.save()
+        self.assertEqual([m.NombreMarca for m in obtener_lista('marcas')], ['Urrea'])
+
+    def test_borrado_invalida(self):
+        categoria = Categoria.objects.create(NombreCategoria='Plomería')
+        self.assertEqual(len(obtener_lista('categorias')), 1)
+        categoria.delete()
+        self.assertEqual(obtener_lista('categorias'), [])
+
+    def test_filtros_de_productos_desde_la_cache(self):
+        Marca.objects.create(NombreMarca='Urrea')
+        Marca.objects.create(NombreMarca='Bosch')
+        self.client.force_login(Usuario.objects.create_superuser('admin', None, 'Admin123+'))
+        self.client.get(reverse('productos_lista'))
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('productos_lista'))
+        self.assertEqual([m.NombreMarca for m in respuesta.context['marcas']], ['Bosch', 'Urrea'])
+        tablas = (Marca._meta.db_table, Categoria._meta.db_table)
+        # La lista de productos une Marca y Categoría con JOIN; ninguna consulta las lee solas
+        self.assertFalse([c['sql'] for c in consultas.captured_queries
+                          if any(f'FROM "{tabla}"' in c['sql'] for tabla in tablas)])
+
+    def test_version_perdida_no_reutiliza_llaves_viejas(self):
+        Cliente.objects.create(PrimerNombre='Ana', SegundoNombre='', PrimerApellido='López', SegundoApellido='')
+        obtener_lista('clientes')
+        cache.delete('listas:clientes:version')
+        Cliente.objects.update(Activo=False)  # sin señales
+        self.assertEqual(obtener_lista('clientes'), [])
+
+
+class BitacoraInventarioTests(DatosBase, TestCase):
+    """Cada cambio de existencia queda en la bitácora y la existencia a una fecha se reconstruye de ella."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.producto = cls._producto('Martillo', 50, '150.00', Descripcion='Martillo de uña')
+
+    def _mover(self, dias_atras, cantidad):
+        MovimientoInventario.objects.create(
+            Producto=self.producto, Tipo=MovimientoInventario.AJUSTE, Cantidad=cantidad,
+            Fecha=timezone.now() - timedelta(days=dias_atras),
+        )
+        Producto.objects.filter(pk=self.producto.pk).update(Existencia=F('Existencia') + cantidad)
+
+    def test_venta_y_ajuste_quedan_en_bitacora(self):
+        venta = registrar_venta(Venta(Cliente=self.cliente), [(self.producto, 3)])
+        fijar_existencia(self.producto.pk, 40)
+        movimientos = list(self.producto.movimientos.order_by('pk').values_list('Tipo', 'Cantidad', 'Referencia'))
+        self.assertEqual(movimientos, [
+            (MovimientoInventario.INICIAL, 50, None),
+            (MovimientoInventario.VENTA, -3, venta.pk),
+            (MovimientoInventario.AJUSTE, -7, None),
+        ])
+        self.assertEqual(conciliar_existencias(), [])
+
+    def test_existencia_en_fecha_con_y_sin_corte(self):
+        # El movimiento inicial es de hoy; se mueve al pasado para armar una historia
+        self.producto.movimientos.update(Fecha=timezone.now() - timedelta(days=10))
+        self._mover(6, -5)
+        self._mover(3, 20)
+        hoy = timezone.localdate()
+        esperado = {10: 50, 7: 50, 6: 45, 4: 45, 3: 65, 0: 65}
+
+        sin_corte = {dias: existencia_en(hoy - timedelta(days=dias)).get(self.producto.pk, 0) for dias in esperado}
+        self.assertEqual(sin_corte, esperado)
+
+        generar_corte(hoy - timedelta(days=5))
+        con_corte = {dias: existencia_en(hoy - timedelta(days=dias)).get(self.producto.pk, 0) for dias in esperado}
+        self.assertEqual(con_corte, esperado)
+        with self.assertRaises(ValueError):
+            generar_corte(hoy)
+
+    def test_conciliar_detecta_y_corrige(self):
+        Producto.objects.filter(pk=self.producto.pk).update(Existencia=70)
+        self.assertEqual(conciliar_existencias(), [(self.producto.pk, 70, 50)])
+        conciliar_existencias('proyeccion')
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.Existencia, 50)
+
+        Producto.objects.filter(pk=self.producto.pk).update(Existencia=60)
+        conciliar_existencias('bitacora')
+        self.assertEqual(conciliar_existencias(), [])
+
+
+class FranjasExistenciaTests(TestCase):
+    """Un producto con franjas vende sin bloquear su fila y nunca por encima de la existencia real."""
+
+    @classmethod
+    def setUpTestData(cls):
+        marca = Marca.objects.create(NombreMarca='Fortaleza')
+        categoria = Categoria.objects.create(NombreCategoria='Construcción')
+        cls.cliente = Cliente.objects.create(
+            PrimerNombre='Luis', SegundoNombre='', PrimerApellido='Pérez', SegundoApellido='',
+        )
+        cls.producto = Producto.objects.create(
+            NombreProducto='Cemento', Descripcion='Bulto 50 kg', Existencia=40,
+            Precio=Decimal('250.00'), Marca=marca, Categoria=categoria,
+        )
+
+    def setUp(self):
+        configurar_franjas(self.producto.pk, 4)
+
+    def _franjas(self):
+        return list(self.producto.franjas.order_by('Franja').values_list('Existencia', flat=True))
+
+    def test_venta_descuenta_de_una_franja(self):
+        self.assertEqual(self._franjas(), [10, 10, 10, 10])
+        version = Producto.objects.get(pk=self.producto.pk).Version
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_venta(Venta(Cliente=self.cliente), [(self.producto, 3)])
+        self.assertEqual(sorted(self._franjas()), [7, 10, 10, 10])
+        self.assertEqual(existencias_actuales([self.producto.pk]), {self.producto.pk: 37})
+        self.assertEqual(conciliar_existencias(), [])
+
+        # La fila del producto se refresca al confirmar la venta, sin esperar al reparto
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.Existencia, 37)
+        self.assertGreater(self.producto.Version, version)
+        repartir_franjas()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.Existencia, 37)
+        self.assertEqual(self._franjas(), [10, 9, 9, 9])
+
+    def test_venta_mayor_que_una_franja_y_sin_existencia(self):
+        registrar_venta(Venta(Cliente=self.cliente), [(self.producto, 25)])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.Existencia, 15)
+        self.assertEqual(sum(self._franjas()), 15)
+        with self.assertRaises(ValidationError):
+            registrar_venta(Venta(Cliente=self.cliente), [(self.producto, 16)])
+        self.assertEqual(sum(self._franjas()), 15)
+
+    def test_reparto_periodico_encola_cada_producto(self):
+        with mock.patch.object(inventario, 'encolar') as encolar:
+            tareas._REGISTRO['inventario.repartir_franjas'][0]()
+        encolar.assert_called_once_with(inventario.REPARTIR_PRODUCTO, producto=self.producto.pk)
+        self.assertIn('inventario.repartir_franjas', tareas._PERIODICAS)
+
+    def test_ajuste_y_desactivar(self):
+        fijar_existencia(self.producto.pk, 50)
+        self.assertEqual(self._franjas(), [13, 13, 12, 12])
+        configurar_franjas(self.producto.pk, 0)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.Franjas, self.producto.Existencia), (0, 50))
+        self.assertFalse(self.producto.franjas.exists())
+        self.assertEqual(conciliar_existencias(), [])
+
+
+class ReporteVentasTests(DatosBase, TestCase):
+    """El reporte agrupa por dimensión y periodo, y los periodos cerrados salen de la caché."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hoy = timezone.localdate()
+        cls.mes = cls.hoy.replace(day=1)
+        cls.mes_anterior = desplazar(cls.mes, 'mes', -1)
+        super().setUpTestData()
+        cls.herramientas = cls.categoria
+        cls.pinturas = Categoria.objects.create(NombreCategoria='Pinturas')
+        cls.martillo = cls._producto('Martillo', 100)
+        cls.brocha = cls._producto('Brocha', 100, '10.00', Categoria=cls.pinturas)
+        registrar_venta(Venta(Cliente=cls.cliente, Fecha_Venta=cls.mes_anterior), [(cls.martillo, 1)])
+        registrar_venta(Venta(Cliente=cls.cliente, Fecha_Venta=cls.hoy), [(cls.martillo, 2), (cls.brocha, 3)])
+
+    def setUp(self):
+        cache.clear()
+
+    def _reporte(self, **kwargs):
+        return reporte_ventas('categoria', 'mes', self.mes_anterior, self.hoy, **kwargs)
+
+    def test_celdas_subtotales_y_total(self):
+        reporte = self._reporte()
+        self.assertEqual(reporte['periodos'], [self.mes_anterior, self.mes])
+        filas = {fila['nombre']: fila for fila in reporte['filas']}
+        self.assertEqual([fila['nombre'] for fila in reporte['filas']], ['Herramientas', 'Pinturas'])
+        self.assertEqual([c['monto'] for c in filas['Herramientas']['celdas']], [Decimal('100.00'), Decimal('200.00')])
+        self.assertEqual(filas['Pinturas']['total'], {'unidades': 3, 'monto': Decimal('30.00'), 'tickets': 1})
+        # Una venta con dos categorías cuenta una sola vez en los subtotales
+        self.assertEqual([s['tickets'] for s in reporte['subtotales']], [1, 1])
+        self.assertEqual(reporte['total'], {'unidades': 6, 'monto': Decimal('330.00'), 'tickets': 2})
+
+    def test_comparar_con_periodo_anterior(self):
+        reporte = reporte_ventas('categoria', 'mes', self.mes, self.hoy, comparar=True)
+        self.assertEqual(reporte['anterior']['desde'], self.mes_anterior)
+        herramientas = reporte['filas'][0]
+        self.assertEqual(herramientas['anterior']['monto'], Decimal('100.00'))
+        self.assertEqual(herramientas['variacion'], Decimal('100.0'))
+        self.assertIsNone(reporte['filas'][1]['variacion'])
+
+    def test_periodos_cerrados_desde_la_cache(self):
+        self._reporte()
+        # Solo se consulta el mes en curso (tres agregaciones) y los nombres
+        with self.assertNumQueries(4):
+            self._reporte()
+
+        # Cambiar una venta de un día cerrado invalida lo guardado
+        venta = Venta.objects.get(Fecha_Venta=self.mes_anterior)
+        registrar_venta(venta, [(self.brocha, 1)])
+        reporte = self._reporte()
+        self.assertEqual(reporte['subtotales'][0]['monto'], Decimal('110.00'))
+
+    def test_detalles_siguen_la_fecha_de_su_venta(self):
+        venta = Venta.objects.get(Fecha_Venta=self.hoy)
+        self.assertEqual(set(venta.detalles.values_list('Fecha_Venta', flat=True)), {self.hoy})
+        venta.Fecha_Venta = self.mes_anterior
+        venta.save()
+        self.assertEqual(set(venta.detalles.values_list('Fecha_Venta', flat=True)), {self.mes_anterior})
+        self.assertEqual(self._reporte()['subtotales'][0]['monto'], Decimal('330.00'))
+
+    def test_vista_solo_superusuario(self):
+        usuario = Usuario.objects.create_user('cajero', None, 'Cajero123+')
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(reverse('reportes_ventas')).status_code, 403)
+        usuario.is_superuser = True
+        usuario.save()
+        respuesta = self.client.get(reverse('reportes_ventas') + '?dimension=cliente&periodo=semana&comparar=1')
+        self.assertContains(respuesta, 'Ana López')
+
+
+class ArchivoVentasTests(DatosBase, TestCase):
+    """Un año archivado sale de la base y se sigue leyendo desde el archivo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.anio = timezone.localdate().year - 4
+        super().setUpTestData()
+        cls.martillo = cls._producto('Martillo', 100)
+        cls.vieja = registrar_venta(Venta(Cliente=cls.cliente, Fecha_Venta=date(cls.anio, 3, 2)), [(cls.martillo, 2)])
+        registrar_venta(Venta(Cliente=cls.cliente, Fecha_Venta=timezone.localdate()), [(cls.martillo, 1)])
+
+    def setUp(self):
+        cache.clear()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(ARCHIVO_DIR=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _reporte(self):
+        return reporte_ventas('cliente', 'mes', date(self.anio, 1, 1), timezone.localdate())
+
+    def test_archivar_borra_y_se_lee_del_archivo(self):
+        antes = self._reporte()
+        archivar_anio(self.anio)
+        self.assertEqual(limite(), date(self.anio + 1, 1, 1))
+        self.assertEqual(borrar_archivado(self.anio), 1)
+        self.assertFalse(Venta.objects.filter(pk=self.vieja.pk).exists())
+        # Las ventas que quedan en la base no se tocan
+        self.assertEqual(Venta.objects.count(), 1)
+
+        venta, detalles = buscar_venta(self.vieja.pk)
+        self.assertEqual((venta.Fecha_Venta, venta.Total), (date(self.anio, 3, 2), Decimal('200.00')))
+        self.assertEqual([(d.Producto.NombreProducto, d.CantidadVendida) for d in detalles], [('Martillo', 2)])
+        self.assertIsNone(buscar_venta(self.vieja.pk + 100))
+
+        cache.clear()
+        despues = self._reporte()
+        self.assertEqual(despues['total'], antes['total'])
+        self.assertEqual(despues['subtotales'], antes['subtotales'])
+
+        usuario = Usuario.objects.create_superuser('admin', None, 'Admin123+')
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('ventas_detalle', args=[self.vieja.pk]))
+        self.assertContains(respuesta, 'Archivada')
+        self.assertContains(respuesta, 'Ana López')
+
+    def test_solo_anios_cerrados_y_en_orden(self):
+        with self.assertRaises(ValueError):
+            archivar_anio(timezone.localdate().year)
+        with self.assertRaises(ValueError):
+            archivar_anio(self.anio + 1)
+        archivar_anio(self.anio)
+        with self.assertRaises(ValueError):
+            archivar_anio(self.anio)
+
+
+class ParticionesTests(DatosBase, TestCase):
+    """La conversión a tablas particionadas conserva filas, llaves, índices y llaves foráneas (Postgres)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.martillo = cls._producto('Martillo', 100)
+        cls.pinza = cls._producto('Pinza', 100, '80.00')
+        cls.hoy = timezone.localdate()
+        cls.vieja = registrar_venta(Venta(Cliente=cls.cliente, Fecha_Venta=desplazar(cls.hoy.replace(day=1), 'mes', -2)),
+                                    [(cls.martillo, 2), (cls.pinza, 1)])
+        registrar_venta(Venta(Cliente=cls.cliente, Fecha_Venta=cls.hoy), [(cls.martillo, 1)])
+
+    def _particion(self, tabla, columna, valor):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT DISTINCT tableoid::regclass::text FROM {tabla} WHERE "{columna}" = %s', [valor])
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def _nombres(self, consulta, tabla):
+        with connection.cursor() as cursor:
+            cursor.execute(consulta, [tabla])
+            return {fila[0] for fila in cursor.fetchall()}
+
+    @skipUnless(connection.vendor == 'postgresql', "Solo Postgres particiona tablas")
+    def test_convertir_con_datos(self):
+        ventas, detalles = Venta.objects.count(), VentaDetalle.objects.count()
+        maxima = Venta.objects.order_by('-pk').values_list('pk', flat=True)[0]
+        consulta_indices = ("SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                            "WHERE i.indrelid = %s::regclass AND NOT i.indisunique")
+        indices = self._nombres(consulta_indices, DETALLE)
+
+        self.assertTrue(particionar())
+        self.assertTrue(esta_particionado())
+        self.assertFalse(particionar())
+        self.assertEqual((Venta.objects.count(), VentaDetalle.objects.count()), (ventas, detalles))
+        self.assertEqual(self._particion(VENTA, 'Id_Venta', self.vieja.pk),
+                         [nombre_particion(VENTA, self.vieja.Fecha_Venta)])
+        self.assertEqual(crear_particiones(), [])
+
+        # Los índices no únicos conservan su nombre; la llave foránea a la venta incluye la fecha
+        self.assertEqual(self._nombres(consulta_indices, DETALLE), indices)
+        llaves = self._nombres(
+            "SELECT confrelid::regclass::text FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", DETALLE,
+        )
+        self.assertEqual(llaves, {VENTA, Producto._meta.db_table})
+
+        # La secuencia sigue después de la llave más alta
+        nueva = registrar_venta(Venta(Cliente=self.cliente), [(self.pinza, 1)])
+        self.assertGreater(nueva.pk, maxima)
+
+        # Cambiar la fecha mueve la venta y sus líneas de partición
+        self.vieja.Fecha_Venta = self.hoy
+        self.vieja.save()
+        particion = nombre_particion(VENTA, self.hoy.replace(day=1))
+        self.assertEqual(self._particion(VENTA, 'Id_Venta', self.vieja.pk), [particion])
+        self.assertEqual(self._particion(DETALLE, 'Venta_id', self.vieja.pk),
+                         [nombre_particion(DETALLE, self.hoy.replace(day=1))])
+
+        # Una línea con otra fecha que su venta no cumple la llave foránea
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            VentaDetalle.objects.filter(Venta=self.vieja).update(Fecha_Venta=self.hoy - timedelta(days=400))
+            connection.cursor().execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+    def test_creacion_diaria_en_la_cola(self):
+        self.assertIn('particiones.crear', tareas._PERIODICAS)
+        # Sin tablas particionadas (o fuera de Postgres) no crea nada
+        self.assertFalse(esta_particionado())
+        self.assertEqual(tareas._REGISTRO['particiones.crear'][0](), [])
+
+
+class ImportarProductosTests(TestCase):
+    """El CSV de productos se importa por lotes: reporta filas malas, actualiza por código y sigue tras un lote fallido."""
+
+    ENCABEZADO = 'Codigo,NombreProducto,Descripcion,Precio,Existencia,Marca,Categoria\n'
+
+    def _importar(self, filas, **opciones):
+        return importar_productos(StringIO(self.ENCABEZADO + ''.join(f'{fila}\n' for fila in filas)), **opciones)
+
+    def test_filas_invalidas(self):
+        resultado = self._importar([
+            'M1,Martillo,,"1,234.50",5,Truper,Herramientas',
+            'M2,,,10,5,Truper,Herramientas',
+            'M3,Pinza,,NaN,5,Truper,Herramientas',
+            'M4,Llave,,"1.234,56",,truper,Herramientas',
+            'M1,Martillo,,10,5,Truper,Herramientas',
+            'M5,Broca,,10,x,Truper,Herramientas',
+            'M6,Lija,,Infinity,1,Truper,Herramientas',
+        ])
+        self.assertEqual((resultado.creados, resultado.actualizados), (2, 0))
+        self.assertEqual([linea for linea, _ in resultado.errores], [3, 4, 6, 7, 8])
+        self.assertIn('NombreProducto', resultado.errores[0][1])
+        self.assertIn('Precio inválido', resultado.errores[1][1])
+        self.assertIn('repetido', resultado.errores[2][1])
+        self.assertEqual(dict(Producto.objects.values_list('Codigo', 'Precio')),
+                         {'M1': Decimal('1234.50'), 'M4': Decimal('1234.56')})
+        # Las marcas se resuelven sin distinguir mayúsculas
+        self.assertEqual(Marca.objects.count(), 1)
+
+        sin_columnas = importar_productos(StringIO('Codigo,Precio\nM1,10\n'))
+        self.assertEqual(sin_columnas.errores[0][0], 1)
+
+    def test_actualiza_por_codigo(self):
+        self._importar(['M1,Martillo,,100,5,Truper,Herramientas'])
+        producto = Producto.objects.get(Codigo='M1')
+
+        resultado = self._importar(['M1,Martillo grande,,120,9,Truper,Carpintería',
+                                    'M2,Pinza,,80,3,Truper,Herramientas'])
+        self.assertEqual((resultado.creados, resultado.actualizados), (1, 1))
+        producto.refresh_from_db()
+        self.assertEqual((producto.NombreProducto, producto.Precio, producto.Existencia),
+                         ('Martillo grande', Decimal('120.00'), 5))
+        self.assertEqual(producto.Categoria.NombreCategoria, 'Carpintería')
+
+        self._importar(['M1,Martillo grande,,120,9,Truper,Carpintería'], actualizar_existencia=True)
+        self.assertEqual(existencias_actuales([producto.pk]), {producto.pk: 9})
+        self.assertEqual(existencia_en(timezone.localdate(), [producto.pk]), {producto.pk: 9})
+
+    def test_lote_fallido_no_detiene_la_importacion(self):
+        with mock.patch('ventas.importar.recalcular_stock_bajo', side_effect=[DatabaseError('sin conexión'), 0]):
+            resultado = self._importar(['M1,Martillo,,100,5,Truper,Herramientas',
+                                        'M2,Pinza,,80,3,Truper,Herramientas'], tamano_lote=1)
+        self.assertEqual(resultado.creados, 1)
+        self.assertEqual(resultado.errores, [(2, 'Error de base de datos en el lote: sin conexión')])
+        self.assertEqual(list(Producto.objects.values_list('Codigo', flat=True)), ['M2'])
+
+
+class MetricasTests(TestCase):
+    """El middleware cuenta las consultas de cada vista, también las hechas en los hilos de consultas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_superuser('admin', None, 'Admin123+')
+
+    def _muestra(self, nombre, **etiquetas):
+        return REGISTRY.get_sample_value(nombre, etiquetas) or 0
+
+    def test_middleware_cuenta_consultas(self):
+        self.client.force_login(self.usuario)
+        suma = self._muestra('geca_peticion_consultas_sql_sum', vista='productos_lista')
+        peticiones = self._muestra('geca_peticion_segundos_count', vista='productos_lista', metodo='GET', estado='200')
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('productos_lista'))
+        self.assertEqual(self._muestra('geca_peticion_consultas_sql_sum', vista='productos_lista') - suma,
+                         len(consultas))
+        self.assertEqual(
+            self._muestra('geca_peticion_segundos_count', vista='productos_lista', metodo='GET', estado='200'),
+            peticiones + 1,
+        )
+
+    def test_consultas_en_hilos(self):
+        def consultar():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+        medidor = _Medidor()
+        actual = _medidor_actual.set(medidor)
+        try:
+            contexto = contextvars.copy_context()
+        finally:
+            _medidor_actual.reset(actual)
+        with ThreadPoolExecutor(max_workers=1) as hilos:
+            hilos.submit(contexto.run, concurrente._en_hilo, consultar).result()
+            # Sin medidor en el contexto no se cuenta nada
+            hilos.submit(contextvars.copy_context().run, concurrente._en_hilo, consultar).result()
+        self.assertEqual(medidor.consultas, 1)
+
+    def test_exportar(self):
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('metricas'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'geca_peticion_segundos_bucket')
+        self.assertContains(respuesta, 'geca_tareas{estado="pendiente"} 0.0')
+
+        self.client.logout()
+        with override_settings(METRICAS_TOKEN='secreto'):
+            self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+            respuesta = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class ConsultasConcurrentesTests(DatosBase, TestCase):
+    """Las vistas asíncronas juntan consultas independientes; con SQLite o en una transacción van en serie."""
+
+    PUNTO_REORDEN = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.martillo = cls._producto('Martillo', 6)
+        cls.venta = registrar_venta(Venta(Cliente=cls.cliente), [(cls.martillo, 2)])
+        cls.usuario = Usuario.objects.create_superuser('admin', None, 'Admin123+')
+
+    def test_vistas_asincronas(self):
+        procesar_pendientes()  # resumen diario de la venta
+        self.client.force_login(self.usuario)
+        contexto = self.client.get(reverse('dashboard')).context
+        self.assertEqual((contexto['productos_bajo_stock'], contexto['clientes_activos']), (1, 1))
+        self.assertEqual(list(contexto['ultimas_ventas']), [self.venta])
+        self.assertEqual(contexto['ventas_hoy'], Decimal('200.00'))
+
+        respuesta = self.client.get(reverse('ventas_detalle', args=[self.venta.pk]))
+        self.assertEqual(respuesta.context['venta'], self.venta)
+        self.assertEqual([d.CantidadVendida for d in respuesta.context['detalles']], [2])
+        self.assertEqual(self.client.get(reverse('ventas_detalle', args=[self.venta.pk + 100])).status_code, 404)
+
+    def test_en_serie_con_sqlite_o_en_transaccion(self):
+        with mock.patch.object(concurrente, '_grupo') as grupo:
+            resultado = async_to_sync(consultas_concurrentes)(
+                productos=Producto.objects.count, clientes=Cliente.objects.count,
+            )
+        self.assertEqual(resultado, {'productos': 1, 'clientes': 1})
+        grupo.assert_not_called()
+
+    def test_en_hilos(self):
+        with mock.patch.object(concurrente, '_puede_paralelizar', return_value=True), \
+                mock.patch.object(concurrente, 'close_old_connections') as cerrar:
+            resultado = async_to_sync(consultas_concurrentes)(
+                a=lambda: threading.current_thread().name, b=lambda: 2,
+            )
+        self.assertTrue(resultado['a'].startswith('consultas'))
+        self.assertEqual(resultado['b'], 2)
+        # Cada tarea revisa la conexión de su hilo al empezar y al terminar
+        self.assertEqual(cerrar.call_count, 4)
+
+        with mock.patch.object(concurrente, 'close_old_connections') as cerrar, self.assertRaises(ZeroDivisionError):
+            concurrente._en_hilo(lambda: 1 / 0)
+        self.assertEqual(cerrar.call_count, 2)
+
+
+class PaginacionTests(TestCase):
+    """La paginación por llave recorre todo sin repetir, también con empates, y un cursor alterado vuelve al inicio."""
+
+    ORDEN = ['PrimerApellido', 'Id_Cliente']
+
+    @classmethod
+    def setUpTestData(cls):
+        # Tres apellidos para 25 clientes: las páginas cortan en medio de un empate
+        Cliente.objects.bulk_create([
+            Cliente(PrimerNombre=f'C{i}', SegundoNombre='', PrimerApellido=['Pérez', 'López', 'Ruiz'][i % 3],
+                    SegundoApellido='')
+            for i in range(25)
+        ])
+        cls.ordenados = list(Cliente.objects.order_by(*cls.ORDEN).values_list('pk', flat=True))
+
+    def _pagina(self, cursor=None):
+        parametros = {'tamano': 10, **({'cursor': cursor} if cursor else {})}
+        return paginar_keyset(RequestFactory().get('/', parametros), Cliente.objects.all(), self.ORDEN)
+
+    def test_siguiente_y_anterior(self):
+        paginas = [self._pagina()]
+        while paginas[-1].tiene_siguiente:
+            paginas.append(self._pagina(paginas[-1].cursor_siguiente))
+        self.assertEqual([len(p) for p in paginas], [10, 10, 5])
+        self.assertEqual([c.pk for p in paginas for c in p], self.ordenados)
+        self.assertFalse(paginas[0].tiene_anterior)
+
+        atras = self._pagina(paginas[2].cursor_anterior)
+        self.assertEqual([c.pk for c in atras], [c.pk for c in paginas[1]])
+        self.assertTrue(atras.tiene_siguiente)
+        primera = self._pagina(atras.cursor_anterior)
+        self.assertEqual([c.pk for c in primera], self.ordenados[:10])
+        self.assertFalse(primera.tiene_anterior)
+
+    def test_cursor_alterado_vuelve_a_la_primera(self):
+        primera = [c.pk for c in self._pagina()]
+        for cursor in ('basura', _codificar('sig', ['Pérez', 'abc']), _codificar('sig', ['Pérez']),
+                       _codificar('ant', [['Pérez'], 1]), _codificar('otra', ['Pérez', 1])):
+            pagina = self._pagina(cursor)
+            self.assertEqual([c.pk for c in pagina], primera)
+            self.assertFalse(pagina.tiene_anterior)
+
+        # Los números llegan como texto si el cursor se armó a mano
+        pagina = self._pagina(_codificar('sig', ['López', str(self.ordenados[0])]))
+        self.assertEqual([c.pk for c in pagina], self.ordenados[1:11])
+
+        usuario = Usuario.objects.create_superuser('admin', None, 'Admin123+')
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('ventas_lista'), {'cursor': _codificar('sig', ['x'])})
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class BusquedaProductosTests(TestCase):
+    """productos_buscar: todas las palabras deben coincidir, los nombres que empiezan con la consulta van primero."""
+
+    @classmethod
+    def setUpTestData(cls):
+        truper = Marca.objects.create(NombreMarca='Truper')
+        pretul = Marca.objects.create(NombreMarca='Pretul')
+        herramientas = Categoria.objects.create(NombreCategoria='Herramientas')
+        plomeria = Categoria.objects.create(NombreCategoria='Plomería')
+        productos = {}
+        for nombre, descripcion, marca, categoria, existencia in [
+            ('Pinza', 'Pinza con cabeza de martillo', truper, herramientas, 3),
+            ('Mini martillo', 'Martillo de bolsillo', pretul, herramientas, 8),
+            ('Martillo de uña', 'Mango de fibra', truper, herramientas, 5),
+            ('Llave perica', 'Llave ajustable', pretul, plomeria, 0),
+        ]:
+            productos[nombre] = Producto.objects.create(
+                NombreProducto=nombre, Descripcion=descripcion, Existencia=existencia,
+                Precio=Decimal('150.50'), Marca=marca, Categoria=categoria,
+            )
+        cls.productos = productos
+        cls.usuario = Usuario.objects.create_superuser('admin', None, 'Admin123+')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _buscar(self, **parametros):
+        respuesta = self.client.get(reverse('productos_buscar'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def _nombres(self, **parametros):
+        return [resultado['text'] for resultado in self._buscar(**parametros)['results']]
+
+    def test_relevancia(self):
+        # Empieza con la consulta, la contiene en el nombre, solo en la descripción
+        self.assertEqual(self._nombres(q='martillo'), ['Martillo de uña', 'Mini martillo', 'Pinza'])
+        # Cada palabra puede coincidir en otro campo, pero deben coincidir todas
+        self.assertEqual(self._nombres(q='martillo pretul'), ['Mini martillo'])
+        self.assertEqual(self._nombres(q='  PLOMER '), ['Llave perica'])
+        self.assertEqual(self._nombres(q='martillo plomería'), [])
+        self.assertEqual(self._nombres(), ['Llave perica', 'Martillo de uña', 'Mini martillo', 'Pinza'])
+
+    def test_formato_select2(self):
+        llave = self.productos['Llave perica']
+        self.assertEqual(self._buscar(q='llave'), {
+            'results': [{
+                'id': llave.pk,
+                'text': 'Llave perica',
+                'descripcion': 'Llave ajustable',
+                'marca': 'Pretul',
+                'categoria': 'Plomería',
+                'precio': '150.50',
+                'existencia': 0,
+                'disabled': True,
+            }],
+            'pagination': {'more': False},
+        })
+        self.assertFalse(self._buscar(q='uña')['results'][0]['disabled'])
+
+    def test_paginas(self):
+        marca, categoria = self.productos['Pinza'].Marca, self.productos['Pinza'].Categoria
+        Producto.objects.bulk_create([
+            Producto(NombreProducto=f'Tornillo {i:02}', Descripcion='Tornillo', Existencia=10,
+                     Precio=Decimal('2.00'), Marca=marca, Categoria=categoria)
+            for i in range(RESULTADOS_POR_PAGINA + 1)
+        ])
+        primera = self._buscar(q='tornillo')
+        self.assertEqual(len(primera['results']), RESULTADOS_POR_PAGINA)
+        self.assertTrue(primera['pagination']['more'])
+        segunda = self._buscar(q='tornillo', page=2)
+        self.assertEqual([r['text'] for r in segunda['results']], [f'Tornillo {RESULTADOS_POR_PAGINA:02}'])
+        self.assertFalse(segunda['pagination']['more'])
+        # Una página inválida es la primera
+        self.assertEqual(self._buscar(q='tornillo', page='x'), primera)
+        self.assertEqual(self._buscar(q='tornillo', page=0), primera)
+
+    def test_requiere_sesion(self):
+        self.client.logout()
+        respuesta = self.client.get(reverse('productos_buscar'), {'q': 'martillo'})
+        self.assertEqual(respuesta.status_code, 302)
+
+
+class ResumenesTests(DatosBase, TestCase):
+    """El resumen diario y los contadores por producto siguen a las ventas al editarlas, moverlas o borrarlas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.martillo = cls._producto('Martillo', 50)
+        cls.pinza = cls._producto('Pinza', 50, '80.00')
+        cls.hoy = timezone.localdate()
+        cls.ayer = cls.hoy - timedelta(days=1)
+
+    def _cuadra(self):
+        self.assertEqual((diferencias_resumen(), diferencias_productos()), ([], []))
+
+    def test_acumular_dia(self):
+        acumular_dia(self.hoy)
+        self.assertFalse(VentaResumenDiario.objects.exists())
+        acumular_dia(self.hoy, total=Decimal('10.50'), tickets=1, unidades=2)
+        acumular_dia(self.hoy, total=Decimal('-0.50'), unidades=-1)
+        resumen = VentaResumenDiario.objects.get(Fecha=self.hoy)
+        self.assertEqual((resumen.Total, resumen.Tickets, resumen.Unidades), (Decimal('10.00'), 1, 1))
+
+    def test_editar_mover_y_borrar(self):
+        venta = registrar_venta(Venta(Cliente=self.cliente, Fecha_Venta=self.hoy),
+                                [(self.martillo, 2), (self.pinza, 1)])
+        otra = registrar_venta(Venta(Cliente=self.cliente, Fecha_Venta=self.ayer), [(self.martillo, 1)])
+        procesar_pendientes()
+        self._cuadra()
+
+        detalle = venta.detalles.get(Producto=self.pinza)
+        detalle.CantidadVendida = 3
+        detalle.save()
+        self._cuadra()
+
+        # La venta cambia de día con todas sus líneas
+        venta.Fecha_Venta = self.ayer
+        venta.save()
+        self._cuadra()
+        self.assertFalse(VentaResumenDiario.objects.filter(Fecha=self.hoy, Tickets__gt=0).exists())
+
+        # Una línea pasa a otra venta de otro día
+        otra.Fecha_Venta = self.hoy
+        otra.save()
+        detalle.refresh_from_db()
+        detalle.Venta = otra
+        detalle.save()
+        self._cuadra()
+        venta.refresh_from_db()
+        self.assertEqual(venta.Total, Decimal('200.00'))
+
+        venta.detalles.get().delete()
+        self._cuadra()
+        otra.delete()
+        venta.delete()
+        self._cuadra()
+        self.assertEqual(VentaResumenDiario.objects.filter(Tickets__gt=0).count(), 0)
+
+    def test_reconstruir_resumen(self):
+        registrar_venta(Venta(Cliente=self.cliente, Fecha_Venta=self.ayer), [(self.martillo, 2)])
+        registrar_venta(Venta(Cliente=self.cliente, Fecha_Venta=self.hoy), [(self.pinza, 1)])
+        VentaResumenDiario.objects.create(Fecha=self.hoy - timedelta(days=5), Total=Decimal('1.00'), Tickets=1)
+
+        # Lo encolado del rango se descarta; lo de fuera del rango se conserva
+        self.assertEqual(reconstruir_resumen(self.ayer, self.hoy), 2)
+        self.assertEqual(procesar_pendientes(), 2)
+        self.assertEqual(len(diferencias_resumen()), 1)
+        self.assertEqual(reconstruir_resumen(), 2)
+        self._cuadra()
+        resumen = VentaResumenDiario.objects.get(Fecha=self.ayer)
+        self.assertEqual((resumen.Total, resumen.Tickets, resumen.Unidades), (Decimal('200.00'), 1, 2))
+
+    def test_top_productos(self):
+        desarmador = Producto.objects.create(
+            NombreProducto='Desarmador', Descripcion='Desarmador', Existencia=50,
+            Precio=Decimal('40.00'), Marca=self.martillo.Marca, Categoria=self.martillo.Categoria,
+        )
+        for fecha, producto, unidades in [
+            (self.hoy, self.martillo, 5), (self.ayer, self.martillo, 3), (self.hoy, self.pinza, 7),
+            # Lo devuelto se compensa y lo de fuera del rango no cuenta
+            (self.ayer, desarmador, 2), (self.hoy, desarmador, -2), (self.hoy - timedelta(days=10), desarmador, 100),
+        ]:
+            VentaProductoDiario.objects.create(Fecha=fecha, Producto=producto, Unidades=unidades)
+
+        exacto = top_productos(self.ayer, self.hoy)
+        self.assertEqual(exacto, [('Martillo', 8), ('Pinza', 7)])
+        self.assertEqual(top_productos(self.ayer, self.hoy, n=1), [('Martillo', 8)])
+        self.assertEqual(top_productos(self.hoy, self.hoy, n=1), [('Pinza', 7)])
+        # Con capacidad para todos los productos el aproximado es exacto
+        self.assertEqual(top_productos(self.ayer, self.hoy, n=2, aproximado=True), exacto)
+
+    def test_mas_vendidos_acota_el_error(self):
+        resumen = MasVendidos(2)
+        for clave, peso in [('a', 10), ('b', 1), ('c', 1), ('d', 5)]:
+            resumen.agregar(clave, peso)
+        # 'c' reemplaza a 'b' y 'd' a 'c', heredando su conteo como error
+        self.assertEqual(resumen.top(2), [('a', 10, 0), ('d', 7, 2)])
+
+        flujo = [(clave % 7, 1 + clave % 3) for clave in range(200)] + [(99, 80)] * 3
+        reales = Counter()
+        resumen = MasVendidos(5)
+        for clave, peso in flujo:
+            reales[clave] += peso
+            resumen.agregar(clave, peso)
+        self.assertEqual(len(resumen.contadores), 5)
+        for clave, conteo, error in resumen.top(5):
+            self.assertLessEqual(conteo - error, reales[clave])
+            self.assertGreaterEqual(conteo, reales[clave])
+        # Lo que supera total / capacidad no se pierde
+        umbral = sum(reales.values()) / 5
+        frecuentes = {clave for clave, unidades in reales.items() if unidades > umbral}
+        self.assertIn(99, frecuentes)
+        self.assertLessEqual(frecuentes, {clave for clave, _, _ in resumen.top(5)})
+
+
+class ExportarVentasTests(DatosBase, TestCase):
+    """El CSV de ventas se descarga en streaming desde la vista y desde el comando."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.martillo = cls._producto('Martillo', 10)
+        cls.hoy = timezone.localdate()
+        cls.vieja = registrar_venta(Venta(Cliente=cls.cliente, Fecha_Venta=cls.hoy - timedelta(days=10)),
+                                    [(cls.martillo, 1)])
+        cls.venta = registrar_venta(Venta(Cliente=cls.cliente, Fecha_Venta=cls.hoy), [(cls.martillo, 2)])
+
+    def _filas(self, contenido):
+        return list(csv.reader(StringIO(contenido)))
+
+    def test_vista(self):
+        self.assertEqual(self.client.get(reverse('ventas_exportar')).status_code, 302)
+        self.client.force_login(Usuario.objects.create_superuser('admin', None, 'Admin123+'))
+        respuesta = self.client.get(reverse('ventas_exportar'), {'tipo': 'detalles', 'desde': self.hoy.isoformat()})
+        self.assertIn(f'detalles_{self.hoy}_hoy.csv', respuesta['Content-Disposition'])
+        filas = self._filas(b''.join(respuesta.streaming_content).decode())
+        self.assertEqual(filas[0][:2], ['Id_Venta', 'Fecha_Venta'])
+        self.assertEqual([(int(f[0]), f[5], f[8], f[10]) for f in filas[1:]],
+                         [(self.venta.pk, 'Martillo', '2', '200.00')])
+
+        respuesta = self.client.get(reverse('ventas_exportar'), {'gzip': '1'})
+        filas = self._filas(gzip.decompress(b''.join(respuesta.streaming_content)).decode())
+        self.assertEqual([int(f[0]) for f in filas[1:]], [self.vieja.pk, self.venta.pk])
+        self.assertEqual(filas[1][3], 'Ana López')
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command('exportar_ventas', hasta=(self.hoy - timedelta(days=1)).isoformat(), stdout=salida)
+        filas = self._filas(salida.getvalue())
+        self.assertEqual(filas[0], ['Id_Venta', 'Fecha_Venta', 'Id_Cliente', 'Cliente', 'Total'])
+        self.assertEqual([int(f[0]) for f in filas[1:]], [self.vieja.pk])
+
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo = Path(directorio) / 'ventas.csv.gz'
+            call_command('exportar_ventas', salida=str(archivo), gzip=True, stdout=StringIO(), stderr=StringIO())
+            self.assertEqual(len(self._filas(gzip.decompress(archivo.read_bytes()).decode())), 3)
+        with self.assertRaises(CommandError):
+            call_command('exportar_ventas', gzip=True, stdout=StringIO())
+        # Una fecha mal escrita es un error, no un límite que se ignora
+        for fecha in ('2024-13-45', 'ayer'):
+            with self.assertRaisesMessage(CommandError, 'fecha inválida'):
+                call_command('exportar_ventas', '--desde', fecha, stdout=StringIO())
+
+
+class EstaticosTests(TestCase):
+    """Todo estático que nombran las plantillas existe, y las librerías del CDN tienen versión fija."""
+
+    plantillas = sorted((Path(__file__).resolve().parent / 'templates').rglob('*.html'))
+
+    def test_estaticos_de_plantillas_existen(self):
+        faltantes = [
+            (ruta.name, nombre) for ruta in self.plantillas
+            for nombre in re.findall(r"""{%\s*static\s+['"]([^'"]+)['"]""", ruta.read_text(encoding='utf-8'))
+            if not finders.find(nombre)
+        ]
+        self.assertEqual(faltantes, [])
+
+    def test_cdn_con_version_fija(self):
+        # Una URL sin versión (o con @latest) cambia de librería sin pasar por el repositorio
+        sueltas = [
+            (ruta.name, url) for ruta in self.plantillas
+            for url in re.findall(r'(?:src|href)="https://cdn\.jsdelivr\.net/npm/([^"]+)"', ruta.read_text(encoding='utf-8'))
+            if not re.match(r'(@[^/]+/)?[^@/]+@\d[^/]*/', url)
+        ]
+        self.assertEqual(sueltas, [])
+
+
+@override_settings(TERMINALES={'sucursal1': 'secreto'})
+class SincronizacionTerminalesTests(DatosBase, TestCase):
+    """Las terminales mandan lotes de ventas que nunca se duplican y piden solo el catálogo que cambió."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.martillo = cls._producto('Martillo', 10)
+        cls.pinza = cls._producto('Pinza', 5, '80.00')
+
+    def _venta(self, *lineas, clave=None):
+        return {
+            'clave': str(clave or uuid.uuid4()), 'fecha': timezone.localdate().isoformat(), 'cliente': self.cliente.pk,
+            'lineas': [{'producto': producto.pk, 'cantidad': cantidad} for producto, cantidad in lineas],
+        }
+
+    def _enviar(self, ventas, token='secreto'):
+        return self.client.post(reverse('terminal_ventas'), json.dumps({'ventas': ventas}),
+                                content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_lote_idempotente_con_faltantes(self):
+        primera = self._venta((self.martillo, 2))
+        lote = [primera, self._venta((self.pinza, 9)), self._venta((self.martillo, 1), (self.pinza, 1)), primera]
+        resultados = self._enviar(lote).json()['resultados']
+        self.assertEqual([r['estado'] for r in resultados], ['registrada', 'rechazada', 'registrada', 'duplicada'])
+        self.assertEqual(resultados[0]['total'], '200.00')
+        self.assertEqual(resultados[1]['faltantes'], [{'producto': self.pinza.pk, 'pedido': 9, 'existencia': 5}])
+        self.assertEqual(resultados[3]['venta'], resultados[0]['venta'])
+
+        # Reenviar el lote (la terminal perdió la respuesta) no registra nada nuevo;
+        # la rechazada no queda guardada y se vuelve a intentar
+        reenvio = registrar_lote('sucursal1', lote)
+        self.assertEqual([r['estado'] for r in reenvio], ['duplicada', 'rechazada', 'duplicada', 'duplicada'])
+        self.assertEqual(Venta.objects.count(), 2)
+        self.assertEqual(VentaTerminal.objects.filter(Terminal='sucursal1').count(), 2)
+        self.assertEqual(existencias_actuales([self.martillo.pk, self.pinza.pk]),
+                         {self.martillo.pk: 7, self.pinza.pk: 4})
+
+    def test_ventas_invalidas_y_autorizacion(self):
+        invalida = {**self._venta((self.martillo, 1)), 'fecha': (timezone.localdate() + timedelta(days=1)).isoformat()}
+        sin_cliente = {**self._venta((self.martillo, 1)), 'cliente': self.cliente.pk + 100}
+        resultados = registrar_lote('sucursal1', [invalida, sin_cliente, {'clave': 'x'}])
+        self.assertEqual([r['estado'] for r in resultados], ['rechazada'] * 3)
+        self.assertFalse(Venta.objects.exists())
+
+        self.assertEqual(self._enviar([self._venta((self.martillo, 1))], token='otro').status_code, 403)
+        usuario = Usuario.objects.create_superuser('admin', None, 'Admin123+')
+        self.client.force_login(usuario)
+        respuesta = self.client.post(reverse('terminal_ventas'), json.dumps({'ventas': []}),
+                                     content_type='application/json')
+        self.assertEqual(respuesta.status_code, 403)
+
+    def test_catalogo_incremental(self):
+        completo = catalogo_desde(limite_filas=1)
+        self.assertTrue(completo['mas'])
+        resto = catalogo_desde(completo['cursor'])
+        self.assertEqual({p['id'] for p in completo['productos'] + resto['productos']},
+                         {self.martillo.pk, self.pinza.pk})
+        self.assertFalse(resto['mas'])
+
+        # Con un cursor reciente solo llegan los productos que cambiaron después
+        Producto.objects.update(Version=F('Version') - 10 ** 9)
+        cursor = catalogo_desde()['cursor']
+        self.assertEqual(catalogo_desde(cursor)['productos'], [])
+        registrar_venta(Venta(Cliente=self.cliente), [(self.pinza, 2)])
+        cambios = catalogo_desde(cursor)['productos']
+        self.assertEqual([(p['id'], p['existencia']) for p in cambios], [(self.pinza.pk, 3)])
+
+        respuesta = self.client.get(reverse('terminal_catalogo'), {'desde': cursor},
+                                    HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual([p['id'] for p in respuesta.json()['productos']], [self.pinza.pk])
+        self.assertEqual(self.client.get(reverse('terminal_catalogo')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('terminal_catalogo'), {'desde': 'x'},
+                                         HTTP_AUTHORIZATION='Bearer secreto').status_code, 400)
+
+        # Una venta de un producto con franjas también cambia su versión al confirmarse
+        configurar_franjas(self.martillo.pk, 2)
+        Producto.objects.update(Version=F('Version') - 10 ** 9)
+        cursor = catalogo_desde()['cursor']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(registrar_lote('sucursal1', [self._venta((self.martillo, 1))])[0]['estado'], 'registrada')
+        cambios = catalogo_desde(cursor)['productos']
+        self.assertEqual([(p['id'], p['existencia']) for p in cambios], [(self.martillo.pk, 9)])
+        # El catálogo lee siempre de la primaria: con retraso de la réplica se saltaría filas
+        self.assertFalse(getattr(views.terminal_catalogo, 'solo_lectura', False))
+
+    def test_catalogo_con_eliminados(self):
+        clavo = Producto.objects.create(
+            NombreProducto='Clavo', Descripcion='Clavo', Existencia=100,
+            Precio=Decimal('1.00'), Marca=self.martillo.Marca, Categoria=self.martillo.Categoria,
+        )
+        Producto.objects.update(Version=F('Version') - 10 ** 9)
+        cursor = catalogo_desde()['cursor']
+        clavo_id = clavo.pk
+        clavo.delete()
+        self.pinza.save()
+
+        # El borrado y el cambio salen en orden de versión, también al paginar
+        primera = catalogo_desde(cursor, limite_filas=1)
+        self.assertEqual((primera['productos'], primera['eliminados'], primera['mas']), ([], [clavo_id], True))
+        segunda = catalogo_desde(primera['cursor'], limite_filas=1)
+        self.assertEqual(([p['id'] for p in segunda['productos']], segunda['eliminados']), ([self.pinza.pk], []))
+        self.assertEqual(catalogo_desde(segunda['cursor'])['eliminados'], [])
+
+        respuesta = self.client.get(reverse('terminal_catalogo'), {'desde': cursor},
+                                    HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.json()['eliminados'], [clavo_id])
+        # El catálogo completo no trae borrados: la terminal no tiene nada que quitar
+        self.assertEqual(catalogo_desde()['eliminados'], [])
+
+    def test_otra_violacion_no_es_duplicada(self):
+        # Solo es duplicada si la clave ya está registrada; otro error de integridad se propaga
+        with mock.patch.object(VentaTerminal.objects, 'create', side_effect=IntegrityError('check')), \
+                self.assertRaises(IntegrityError), transaction.atomic():
+            registrar_lote('sucursal1', [self._venta((self.pinza, 1))])
+        self.assertFalse(Venta.objects.exists())
+        self.pinza.refresh_from_db()
+        self.assertEqual(self.pinza.Existencia, 5)
+
+
+_fallos = []
+
+
+@tarea('pruebas.fallar', intentos=2)
+def _fallar(mensaje):
+    _fallos.append(mensaje)
+    raise RuntimeError(mensaje)
+
+
+@tarea('pruebas.periodica')
+def _periodica():
+    _fallos.append('periodica')
+
+
+@override_settings(TAREAS_ESPERA_BASE=0)
+class ColaTareasTests(DatosBase, TestCase):
+    """Los resúmenes de una venta se suman desde la cola, una sola vez, y lo que falla termina como muerta."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.martillo = cls._producto('Martillo', 10)
+
+    def test_venta_encola_sus_resumenes(self):
+        hoy = timezone.localdate()
+        registrar_venta(Venta(Cliente=self.cliente, Fecha_Venta=hoy), [(self.martillo, 2)])
+        self.assertFalse(VentaResumenDiario.objects.filter(Fecha=hoy).exists())
+        self.assertEqual(Tarea.objects.filter(Estado=Tarea.PENDIENTE).count(), 2)
+
+        self.assertEqual(procesar_pendientes(), 2)
+        resumen = VentaResumenDiario.objects.get(Fecha=hoy)
+        self.assertEqual((resumen.Total, resumen.Tickets, resumen.Unidades), (Decimal('200.00'), 1, 2))
+        self.assertEqual((diferencias_resumen(), diferencias_productos()), ([], []))
+        self.assertFalse(Tarea.objects.exists())
+
+        # Reconstruir descarta lo encolado para esos días: ya lo cuenta el recálculo
+        registrar_venta(Venta(Cliente=self.cliente, Fecha_Venta=hoy), [(self.martillo, 1)])
+        reconstruir_resumen(hoy, hoy)
+        procesar_pendientes()
+        self.assertEqual(VentaResumenDiario.objects.get(Fecha=hoy).Tickets, 2)
+        self.assertEqual(diferencias_resumen(), [])
+
+    def test_reintentos_y_muerta(self):
+        _fallos.clear()
+        encolar('pruebas.fallar', mensaje='sin papel')
+        with self.assertLogs('ventas.tareas', 'WARNING') as registro:
+            self.assertEqual([ejecutar(t) for t in tomar(10)], ['reintento'])
+            # Agotados los intentos queda muerta y nadie la vuelve a tomar
+            self.assertEqual(procesar_pendientes(), 1)
+            self.assertEqual(tomar(10), [])
+        self.assertEqual([r.levelname for r in registro.records], ['WARNING', 'ERROR'])
+        muerta = Tarea.objects.get()
+        self.assertEqual((muerta.Estado, muerta.Intentos, _fallos), (Tarea.MUERTA, 2, ['sin papel'] * 2))
+        self.assertIn('RuntimeError: sin papel', muerta.Error)
+
+    @mock.patch.dict(tareas._PERIODICAS, {'pruebas.periodica': 3600}, clear=True)
+    def test_periodicas(self):
+        _fallos.clear()
+        self.assertEqual(programar_periodicas(), ['pruebas.periodica'])
+        self.assertEqual(programar_periodicas(), [])
+        self.assertEqual(procesar_pendientes(), 1)
+        # Al ejecutarse queda encolada la siguiente, para dentro de una hora
+        siguiente = Tarea.objects.get(Nombre='pruebas.periodica')
+        self.assertGreater(siguiente.Disponible, timezone.now() + timedelta(minutes=59))
+        self.assertEqual((procesar_pendientes(), programar_periodicas(), _fallos), (0, [], ['periodica']))
+
+    @override_settings(TAREAS_SONDEO=0)
+    def test_trabajador_sobrevive_a_la_base(self):
+        caida = OperationalError('server closed the connection unexpectedly')
+        with mock.patch('ventas.tareas.tomar', side_effect=[caida, []]) as tomar_, \
+                self.assertLogs('ventas.tareas', 'ERROR') as registro:
+            trabajar(hilos=1, una_vez=True)
+        # La vuelta que falló se registra y el bucle sigue hasta vaciar la cola
+        self.assertEqual(tomar_.call_count, 2)
+        self.assertIn('OperationalError', registro.output[0])
+
+
+class StockBajoTests(DatosBase, TestCase):
+    """StockBajo sigue a la existencia al venderse o ajustarse, con el punto de reorden del producto o su categoría."""
+
+    PUNTO_REORDEN = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.martillo = cls._producto('Martillo', 8)
+        cls.pinza = cls._producto('Pinza', 8, '80.00', PuntoReorden=2)
+
+    def _bajos(self):
+        return set(Producto.objects.filter(StockBajo=True).values_list('NombreProducto', flat=True))
+
+    def test_venta_y_ajuste_cruzan_el_punto(self):
+        self.assertEqual(self._bajos(), set())
+        registrar_venta(Venta(Cliente=self.cliente), [(self.martillo, 3), (self.pinza, 3)])
+        self.assertEqual(self._bajos(), {'Martillo'})
+        avisos = Tarea.objects.filter(Nombre=AVISO_STOCK_BAJO).values_list('Argumentos', flat=True)
+        self.assertEqual(list(avisos), [{'producto': self.martillo.pk, 'existencia': 5, 'reorden': 5}])
+
+        fijar_existencia(self.martillo.pk, 20)
+        fijar_existencia(self.pinza.pk, 1)
+        self.assertEqual(self._bajos(), {'Pinza'})
+        with self.assertLogs('ventas.inventario', 'WARNING'):
+            procesar_pendientes([AVISO_STOCK_BAJO])
+        self.assertFalse(Tarea.objects.filter(Nombre=AVISO_STOCK_BAJO).exists())
+
+    def _avisos(self):
+        return list(Tarea.objects.filter(Nombre=AVISO_STOCK_BAJO).values_list('Argumentos', flat=True))
+
+    def test_producto_con_franjas_cruza_al_vender(self):
+        configurar_franjas(self.martillo.pk, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_venta(Venta(Cliente=self.cliente), [(self.martillo, 2)])
+        self.assertEqual(self._bajos(), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_venta(Venta(Cliente=self.cliente), [(self.martillo, 1)])
+        self.assertEqual(self._bajos(), {'Martillo'})
+        self.assertEqual(self._avisos(), [{'producto': self.martillo.pk, 'existencia': 5, 'reorden': 5}])
+
+    def test_guardar_el_producto_avisa(self):
+        self.pinza.PuntoReorden = 8
+        self.pinza.save(update_fields=['PuntoReorden'])
+        self.assertTrue(self.pinza.StockBajo)
+        self.assertEqual(self._bajos(), {'Pinza'})
+        self.assertEqual(self._avisos(), [{'producto': self.pinza.pk, 'existencia': 8, 'reorden': 8}])
+
+        # Un guardado completo con la instancia vieja no pisa StockBajo ni repite el aviso
+        vieja = Producto.objects.get(pk=self.martillo.pk)
+        Categoria.objects.filter(pk=self.categoria.pk).update(PuntoReorden=8)
+        recalcular_stock_bajo([self.martillo.pk])
+        vieja.Precio = Decimal('110.00')
+        vieja.save()
+        self.assertEqual(self._bajos(), {'Pinza', 'Martillo'})
+        self.assertEqual(len(self._avisos()), 2)
+
+    def test_punto_de_la_categoria_y_lista(self):
+        Categoria.objects.filter(pk=self.categoria.pk).update(PuntoReorden=8)
+        self.assertEqual(recalcular_stock_bajo(), 1)
+        self.assertEqual(self._bajos(), {'Martillo'})
+        self.assertEqual(Producto.objects.get(pk=self.martillo.pk).Reorden, 8)
+
+        usuario = Usuario.objects.create_superuser('admin', None, 'Admin123+')
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('productos_stock_bajo'))
+        self.assertEqual([p.NombreProducto for p in respuesta.context['productos']], ['Martillo'])
+        self.assertEqual(self.client.get(reverse('dashboard')).context['productos_bajo_stock'], 1)
+
+
+@override_settings(REPLICAS=['replica1'], REPLICA_FIJAR_SEGUNDOS=10)
+class ReplicasTests(SimpleTestCase):
+    """Las vistas de solo lectura leen de la réplica salvo justo después de que el navegador escribió."""
+
+    def _peticion(self, vista, metodo='get', **cookies):
+        leidas = []
+
+        def registrar(request):
+            leidas.append(RouterReplicas().db_for_read(Producto))
+            return HttpResponse()
+
+        registrar = solo_lectura(registrar) if vista == 'lectura' else registrar
+        request = getattr(RequestFactory(), metodo)('/')
+        request.COOKIES.update(cookies)
+
+        def manejador(request):
+            # Django llama a process_view dentro de la cadena de middlewares
+            middleware.process_view(request, registrar, (), {})
+            return registrar(request)
+
+        middleware = ReplicasMiddleware(manejador)
+        respuesta = middleware(request)
+        return leidas[0], respuesta
+
+    def test_lecturas_a_la_replica_y_escrituras_fijan_la_primaria(self):
+        self.assertEqual(self._peticion('lectura')[0], 'replica1')
+        self.assertIsNone(self._peticion('otra')[0])
+        self.assertIsNone(RouterReplicas().db_for_read(Producto))
+
+        leida, respuesta = self._peticion('lectura', metodo='post')
+        self.assertIsNone(leida)
+        self.assertEqual(respuesta.cookies[COOKIE_PRIMARIA]['max-age'], 10)
+        # Con la cookie vigente el mismo navegador sigue en la primaria
+        self.assertIsNone(self._peticion('lectura', **{COOKIE_PRIMARIA: '1'})[0])
+
+    def test_replicas_separadas_por_comas(self):
+        # Los settings se leen al arrancar: se cargan en otro proceso con REPLICA_URLS
+        codigo = ("import django, json; django.setup(); from django.conf import settings; "
+                  "print(json.dumps([(a, settings.DATABASES[a]['NAME']) for a in settings.REPLICAS]))")
+        entorno = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'ferreteria_GECA.settings',
+                   'REPLICA_URLS': 'sqlite:////tmp/replica_a.sqlite3, sqlite:////tmp/replica_b.sqlite3,'}
+        salida = subprocess.run([sys.executable, '-c', codigo], env=entorno, cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(json.loads(salida), [['replica1', '/tmp/replica_a.sqlite3'],
+                                              ['replica2', '/tmp/replica_b.sqlite3']])
+
+    @override_settings(REPLICAS=['replica1', 'replica2'])
+    def test_elige_entre_todas_las_replicas(self):
+        with mock.patch('ventas.replicas.random.choice', side_effect=lambda opciones: opciones[-1]) as elegir:
+            self.assertEqual(self._peticion('lectura')[0], 'replica2')
+        elegir.assert_called_once_with(['replica1', 'replica2'])
+        self.assertFalse(RouterReplicas().allow_migrate('replica2', 'ventas'))
+
+    def test_router_y_streaming(self):
+        router = RouterReplicas()
+        self.assertEqual(router.db_for_write(Producto), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'ventas'))
+        self.assertTrue(router.allow_migrate('default', 'ventas'))
+
+        def filas():
+            yield router.db_for_read(Producto)
+            yield router.db_for_read(Producto)
+
+        ficha = _replica.set('replica1')
+        iterador = conservar_replica(filas())
+        _replica.reset(ficha)
+        self.assertEqual(list(iterador), ['replica1', 'replica1'])
+
+
+class AccesosTests(TestCase):
+    """TemplateResource limita las secciones; el acceso se revisa en caché y se invalida con las señales."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.grupo = Group.objects.create(name='Cajeros')
+        cls.usuario = Usuario.objects.create_user('cajero', None, 'Cajero123+')
+        cls.usuario.groups.add(cls.grupo)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def _estado(self, nombre='productos_lista'):
+        return self.client.get(reverse(nombre)).status_code
+
+    def test_recursos_por_grupo_y_usuario(self):
+        # Sin TemplateResource la sección queda abierta
+        self.assertEqual(self._estado(), 200)
+        recurso = TemplateResource.objects.create(codename='productos', nombre='Productos')
+        self.assertEqual(self._estado(), 403)
+
+        recurso.groups.add(self.grupo)
+        self.assertEqual(self._estado(), 200)
+        self.usuario.groups.remove(self.grupo)
+        self.assertEqual(self._estado(), 403)
+        recurso.users.add(self.usuario)
+        self.assertEqual(self._estado(), 200)
+        self.grupo.user_set.add(self.usuario)
+        recurso.users.clear()
+        self.assertEqual(self._estado(), 200)
+        self.grupo.delete()
+        self.assertEqual(self._estado(), 403)
+
+        # Vista asíncrona, y el superusuario entra a todo
+        TemplateResource.objects.create(codename='dashboard', nombre='Tablero')
+        self.assertEqual(self._estado('dashboard'), 403)
+        self.client.force_login(Usuario.objects.create_superuser('admin', None, 'Admin123+'))
+        self.assertEqual(self._estado('dashboard'), 200)
+
+    def test_revision_en_cache_sin_consultas(self):
+        TemplateResource.objects.create(codename='ventas', nombre='Ventas').users.add(self.usuario)
+        TemplateResource.objects.create(codename='clientes', nombre='Clientes')
+        self.assertTrue(tiene_acceso(Usuario.objects.get(pk=self.usuario.pk), 'ventas'))
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(tiene_acceso(usuario, 'ventas'))
+            self.assertFalse(tiene_acceso(usuario, 'clientes'))
+            self.assertTrue(tiene_acceso(usuario, 'marcas'))
@@ -10,11 +10,19 @@ urlpatterns = [
     path("dashboard/", views.dashboard, name="dashboard"),
     path("productos/", views.productos_lista, name="productos_lista"),
     path("productos/registrar/", views.productos_registrar, name="productos_registrar"),
+    path("productos/buscar/", views.productos_buscar, name="productos_buscar"),
+    path("productos/stock-bajo/", views.productos_stock_bajo, name="productos_stock_bajo"),
     path("productos/marcas/", views.marca_lista, name="marca_lista"),
     path("productos/categorias/", views.categoria_lista, name="categoria_lista"),
     path("clientes/", views.clientes_lista, name="clientes_lista"),
     path('clientes/registrar/', views.clientes_registrar, name='clientes_registrar'),
     path("ventas/", views.ventas_lista, name="ventas_lista"),
+    path("ventas/exportar/", views.ventas_exportar, name="ventas_exportar"),
     path("ventas_registrar/", views.ventas_registrar, name="ventas_registrar"),
-    path('ventas/detalle/<int:pk>/', views.ventas_detalle, name='ventas_detalle')
+    path('ventas/detalle/<int:pk>/', views.ventas_detalle, name='ventas_detalle'),
+    path("reportes/ventas/", views.reportes_ventas, name="reportes_ventas"),
+    path("inventario/contencion/", views.inventario_contencion, name="inventario_contencion"),
+    path("metrics", views.metricas, name="metricas"),
+    path("api/terminal/ventas/", views.terminal_ventas, name="terminal_ventas"),
+    path("api/terminal/catalogo/", views.terminal_catalogo, name="terminal_catalogo"),
 ]
\ No newline at end of file
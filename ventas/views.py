@@ -1,18 +1,84 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse_lazy
+from django.http import Http404, JsonResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
 from django import forms
-from django.forms import formset_factory, ModelForm
-from django.db import transaction, IntegrityError, models
+from django.forms import formset_factory, ModelForm, BaseFormSet
 from django.core.exceptions import ValidationError
-from django.db.models import Sum, F, Value, Count
-from django.db.models.functions import Coalesce
 from datetime import timedelta
+from functools import partial
+from operator import attrgetter
+from decimal import Decimal
 from django.utils import timezone
-
-from .models import Cliente, Marca, Categoria, Producto, Venta, VentaDetalle
+from django.utils.dateparse import parse_date
+from django.utils.crypto import constant_time_compare
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+import json
+import uuid
+
+from .models import Cliente, Marca, Categoria, Producto, Venta, VentaDetalle, VentaTerminal
+from .paginacion import paginar_keyset
+from .resumenes import resumen_por_dia, top_productos, rango_ventana, VENTANAS
+from .busqueda import buscar_productos, producto_a_resultado
+from .exportar import generar_csv, comprimir_gzip, EXPORTACIONES
+from .inventario import registrar_venta, fijar_existencia, ejecutar_con_reintentos, contencion, recalcular_stock_bajo
+from .metricas import exportar_metricas
+from .listas import obtener_lista
+from .concurrente import consultas_concurrentes
+from .reportes import reporte_ventas, DIMENSIONES, desplazar, inicio_periodo, periodos_entre
+from .archivo import buscar_venta
+from .replicas import solo_lectura, conservar_replica
+from .accesos import requiere_recurso
+from .sincronizacion import registrar_lote, catalogo_desde, CATALOGO_LIMITE
+
+
+# Órdenes permitidos para las listas paginadas (el último campo siempre es único)
+ORDENES_PRODUCTOS = {
+    "id": ["Id_Producto"],
+    "nombre": ["NombreProducto", "Id_Producto"],
+}
+ORDENES_CLIENTES = {
+    "id": ["Id_Cliente"],
+    "apellido": ["PrimerApellido", "Id_Cliente"],
+}
+ORDENES_STOCK_BAJO = {
+    "existencia": ["Existencia", "Id_Producto"],
+    "nombre": ["NombreProducto", "Id_Producto"],
+}
+ORDENES_VENTAS = {
+    "id": ["-Id_Venta"],
+    "fecha": ["-Fecha_Venta", "-Id_Venta"],
+}
+
+# Reporte de ventas: periodos que se muestran si no se indica el rango, y límites de la tabla
+PERIODOS_REPORTE = {"dia": 14, "semana": 8, "mes": 6}
+COLUMNAS_REPORTE = 36
+FILAS_REPORTE = 100
+
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _fecha(valor):
+    try:
+        return parse_date(valor or "")
+    except ValueError:
+        return None
+
+
+async def _render_async(request, plantilla, contexto):
+    # login_required ya cargó el usuario con auser(); se reutiliza para que la plantilla no lo vuelva a consultar
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, plantilla, contexto)
 
 
 # Create your views here.
@@ -55,7 +121,9 @@ def user_logout(request):
     logout(request)
     return redirect("login")
 
+@solo_lectura
 @login_required
+@requiere_recurso('productos')
 def productos_lista(request):
     # Leer mensaje de éxito desde la sesión (y eliminarlo)
     mensaje_exito = request.session.pop('mensaje_exito', None)
@@ -72,19 +140,67 @@ def productos_lista(request):
 
         return redirect("productos_lista")
 
-    # Obtener todos los productos ordenados
-    productos = (
-        Producto.objects
-        .select_related("Marca", "Categoria")
-        .order_by("Id_Producto")
-    )
+    # Filtros del lado del servidor
+    productos = Producto.objects.select_related("Marca", "Categoria")
+    marca_id = _entero(request.GET.get("marca"))
+    categoria_id = _entero(request.GET.get("categoria"))
+    if marca_id:
+        productos = productos.filter(Marca_id=marca_id)
+    if categoria_id:
+        productos = productos.filter(Categoria_id=categoria_id)
+
+    # Paginación por llave: el costo por página no depende del tamaño de la tabla
+    orden = ORDENES_PRODUCTOS.get(request.GET.get("orden"), ORDENES_PRODUCTOS["id"])
+    pagina = paginar_keyset(request, productos, orden)
 
     return render(request, "productos.html", {
-        "productos": productos,
+        "productos": pagina,
+        "pagina": pagina,
+        # Opciones de los filtros desde la caché de listas, en orden alfabético
+        "marcas": sorted(obtener_lista("marcas"), key=attrgetter("NombreMarca")),
+        "categorias": sorted(obtener_lista("categorias"), key=attrgetter("NombreCategoria")),
+        "filtros": request.GET,
         "mensaje_exito": mensaje_exito,  # se pasa al template
     })
 
+@solo_lectura
+@login_required
+@requiere_recurso('productos')
+def productos_stock_bajo(request):
+    # Productos en su punto de reorden (StockBajo lo mantiene la capa de inventario);
+    # se recorren por el índice parcial, que solo tiene estas filas
+    productos = Producto.objects.filter(StockBajo=True).select_related("Marca", "Categoria")
+    categoria_id = _entero(request.GET.get("categoria"))
+    if categoria_id:
+        productos = productos.filter(Categoria_id=categoria_id)
+
+    orden = ORDENES_STOCK_BAJO.get(request.GET.get("orden"), ORDENES_STOCK_BAJO["existencia"])
+    pagina = paginar_keyset(request, productos, orden)
+
+    return render(request, "productos_stock_bajo.html", {
+        "productos": pagina,
+        "pagina": pagina,
+        "categorias": obtener_lista("categorias"),
+        "filtros": request.GET,
+    })
+
+@solo_lectura
+@login_required
+@requiere_recurso('productos')
+def productos_buscar(request):
+    # Búsqueda para el Select2 de ventas: relevancia, paginado, con precio y existencia
+    try:
+        pagina = int(request.GET.get("page", 1))
+    except ValueError:
+        pagina = 1
+    productos, hay_mas = buscar_productos(request.GET.get("q", ""), pagina)
+    return JsonResponse({
+        "results": [producto_a_resultado(p) for p in productos],
+        "pagination": {"more": hay_mas},
+    })
+
 @login_required
+@requiere_recurso('productos')
 def productos_registrar(request):
     producto = None
     editar_id = request.GET.get("editar")
@@ -99,25 +215,35 @@ def productos_registrar(request):
         precio = request.POST.get("Precio")
         marca_id = request.POST.get("Marca")
         categoria_id = request.POST.get("Categoria")
+        # Vacío = el punto de reorden de la categoría
+        punto_reorden = _entero(request.POST.get("PuntoReorden"))
+        if punto_reorden is not None and punto_reorden < 0:
+            punto_reorden = None
 
         # Validación básica por si acaso (además de la del front)
         if not (nombre and descripcion and existencia and precio and marca_id and categoria_id):
             # NO usamos mensaje_exito / mensaje_error aquí
             return render(request, "productos_registrar.html", {
                 "producto": producto,
-                "marcas": Marca.objects.filter(Activo=True),
-                "categorias": Categoria.objects.filter(Activo=True),
+                "marcas": obtener_lista("marcas"),
+                "categorias": obtener_lista("categorias"),
             })
 
         if producto:
-            # Actualizar
+            # Actualizar (la existencia se ajusta bajo bloqueo para no pisar ventas en curso)
             producto.NombreProducto = nombre
             producto.Descripcion = descripcion
-            producto.Existencia = existencia
             producto.Precio = precio
             producto.Marca_id = marca_id
             producto.Categoria_id = categoria_id
-            producto.save()
+            producto.PuntoReorden = punto_reorden
+
+            def actualizar():
+                producto.save(update_fields=['NombreProducto', 'Descripcion', 'Precio', 'Marca', 'Categoria',
+                                             'PuntoReorden'])
+                fijar_existencia(producto.pk, existencia)
+
+            ejecutar_con_reintentos(actualizar, operacion='productos_registrar')
 
             # Guardar mensaje de éxito en sesión
             request.session['mensaje_exito'] = "Producto actualizado correctamente."
@@ -130,6 +256,7 @@ def productos_registrar(request):
                 Precio=precio,
                 Marca_id=marca_id,
                 Categoria_id=categoria_id,
+                PuntoReorden=punto_reorden,
             )
 
             request.session['mensaje_exito'] = "Producto creado correctamente."
@@ -140,14 +267,15 @@ def productos_registrar(request):
     # GET normal
     return render(request, "productos_registrar.html", {
         "producto": producto,
-        "marcas": Marca.objects.filter(Activo=True),
-        "categorias": Categoria.objects.filter(Activo=True),
+        "marcas": obtener_lista("marcas"),
+        "categorias": obtener_lista("categorias"),
     })
 
 
 @login_required
+@requiere_recurso('marcas')
 def marca_lista(request):
-    marcas = Marca.objects.filter(Activo=True).order_by('Id_Marca')
+    marcas = obtener_lista('marcas')
     edit_mode = False
     marca_edit = None
     nombre_valor = ""
@@ -201,11 +329,13 @@ def marca_lista(request):
 
 
 @login_required
+@requiere_recurso('categorias')
 def categoria_lista(request):
-    categorias = Categoria.objects.filter(Activo=True).order_by('Id_Categoria')
+    categorias = obtener_lista('categorias')
     edit_mode = False
     categoria_edit = None
     nombre_valor = ""
+    reorden_valor = Categoria._meta.get_field('PuntoReorden').default
 
     # ELIMINAR (SOFT DELETE: Activo = False)
     if request.method == 'POST' and 'eliminar_id' in request.POST:
@@ -219,6 +349,9 @@ def categoria_lista(request):
     if request.method == 'POST' and 'eliminar_id' not in request.POST:
         categoria_id = request.POST.get('categoria_id')
         nombre = request.POST.get('NombreCategoria', '').strip()
+        punto_reorden = _entero(request.POST.get('PuntoReorden'))
+        if punto_reorden is None or punto_reorden < 0:
+            punto_reorden = Categoria._meta.get_field('PuntoReorden').default
 
         if not nombre:
             messages.error(request, 'El nombre de la categoría es requerido.')
@@ -232,11 +365,17 @@ def categoria_lista(request):
         else:
             if categoria_id:
                 categoria = get_object_or_404(Categoria, pk=categoria_id)
+                cambia_reorden = categoria.PuntoReorden != punto_reorden
                 categoria.NombreCategoria = nombre
+                categoria.PuntoReorden = punto_reorden
                 categoria.save()
+                if cambia_reorden:
+                    # Los productos sin punto propio toman el nuevo
+                    recalcular_stock_bajo(Producto.objects.filter(Categoria=categoria, PuntoReorden__isnull=True)
+                                          .values_list('pk', flat=True))
                 messages.success(request, 'Categoría actualizada correctamente.')
             else:
-                Categoria.objects.create(NombreCategoria=nombre, Activo=True)
+                Categoria.objects.create(NombreCategoria=nombre, Activo=True, PuntoReorden=punto_reorden)
                 messages.success(request, 'Categoría registrada correctamente.')
             return redirect('categoria_lista')
     else:
@@ -245,23 +384,17 @@ def categoria_lista(request):
             categoria_edit = get_object_or_404(Categoria, pk=editar_id)
             edit_mode = True
             nombre_valor = categoria_edit.NombreCategoria
+            reorden_valor = categoria_edit.PuntoReorden
 
     context = {
         'categorias': categorias,
         'edit_mode': edit_mode,
         'categoria_edit': categoria_edit,
         'nombre_valor': nombre_valor,
+        'reorden_valor': reorden_valor,
     }
     return render(request, "categorias.html", context)
 
-@login_required
-def clientes_lista(request):
-    return render(request, "clientes.html")
-
-@login_required
-def ventas_lista(request):
-    return render(request, "ventas.html")
-
 class ClienteForm(forms.ModelForm):
     class Meta:
         model = Cliente
@@ -281,9 +414,15 @@ class ClienteForm(forms.ModelForm):
             'Activo': 'Activo',
         }
 
+@solo_lectura
 @login_required
+@requiere_recurso('clientes')
 def clientes_lista(request):
-    clientes = Cliente.objects.all().order_by('Id_Cliente')
+    clientes = Cliente.objects.all()
+    activo = request.GET.get('activo')
+    if activo in ('1', '0'):
+        clientes = clientes.filter(Activo=(activo == '1'))
+    orden = ORDENES_CLIENTES.get(request.GET.get('orden'), ORDENES_CLIENTES['id'])
     cliente_edit = None
     edit_mode = False
 
@@ -323,15 +462,20 @@ def clientes_lista(request):
         else:
             form = ClienteForm()
 
+    pagina = paginar_keyset(request, clientes, orden)
+
     context = {
         'form': form,
-        'clientes': clientes,
+        'clientes': pagina,
+        'pagina': pagina,
+        'filtros': request.GET,
         'edit_mode': edit_mode,
         'cliente_edit': cliente_edit,
     }
     return render(request, "clientes.html", context)
 
 @login_required
+@requiere_recurso('clientes')
 def clientes_registrar(request):
     cliente_edit = None
     edit_mode = False
@@ -372,28 +516,113 @@ class VentaForm(ModelForm):
 
 
 
-class DetalleVentaForm(ModelForm):
-    class Meta:
-        model = VentaDetalle
-        fields = ['Producto', 'CantidadVendida']
-        widgets = {
-            'Producto': forms.Select(attrs={'class': 'form-select select2'}),
-            'CantidadVendida': forms.NumberInput(attrs={'class': 'form-control'}),
-        }
+class SelectBusqueda(forms.Select):
+    """Select que solo dibuja la opción elegida; las demás se buscan por AJAX (Select2)."""
+
+    def optgroups(self, name, value, attrs=None):
+        valores = [int(v) for v in value if v and str(v).isdigit()]
+        elegidos = []
+        if valores:
+            resolver = getattr(getattr(self.choices, 'field', None), 'resolver', None)
+            if resolver is not None:
+                encontrados = resolver()
+                elegidos = [(pk, str(encontrados[pk])) for pk in valores if pk in encontrados]
+            else:
+                elegidos = [(obj.pk, str(obj)) for obj in self.choices.queryset.filter(pk__in=valores)]
+        grupos = []
+        for indice, (valor, etiqueta) in enumerate([("", "Seleccione...")] + elegidos):
+            opcion = self.create_option(name, valor, etiqueta, str(valor) in value, indice, attrs=attrs)
+            grupos.append((None, [opcion], indice))
+        return grupos
+
+
+class ProductoChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField que toma el objeto de un diccionario compartido por todo el formset.
+
+    `resolver` es una función sin argumentos que devuelve {pk: Producto}; si no se
+    asigna, el campo se comporta como un ModelChoiceField normal.
+    """
+    resolver = None
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if self.resolver is None:
+            return super().to_python(value)
+        try:
+            objeto = self.resolver().get(int(value))
+        except (TypeError, ValueError):
+            objeto = None
+        if objeto is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return objeto
+
+
+class DetalleVentaForm(forms.Form):
+    # Formulario simple (no ModelForm): la línea la guarda registrar_venta, así que
+    # validar cada instancia contra la base solo agregaría consultas por línea.
+    Producto = ProductoChoiceField(
+        queryset=Producto.objects.all(),
+        widget=SelectBusqueda(attrs={
+            'class': 'form-select select2-productos',
+            'data-url': reverse_lazy('productos_buscar'),
+        }),
+    )
+    CantidadVendida = forms.IntegerField(
+        min_value=1,
+        max_value=999999,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+
+
+class BaseDetalleFormSet(BaseFormSet):
+    """Formset de líneas de venta que resuelve todos los productos con una sola consulta.
+
+    Sin esto cada formulario valida (y dibuja) su producto por separado y el costo
+    de la petición crece con el número de líneas.
+    """
+
+    def __init__(self, *args, productos=None, **kwargs):
+        self.productos = productos if productos is not None else Producto.objects.all()
+        self._elegidos = None
+        super().__init__(*args, **kwargs)
+
+    def productos_elegidos(self):
+        """{pk: Producto} de todos los productos enviados, con un solo in_bulk."""
+        if self._elegidos is None:
+            ids = set()
+            if self.is_bound:
+                for i in range(self.total_form_count()):
+                    valor = self.data.get(f"{self.add_prefix(i)}-Producto")
+                    if valor and str(valor).isdigit():
+                        ids.add(int(valor))
+            self._elegidos = self.productos.in_bulk(ids) if ids else {}
+        return self._elegidos
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        campo = form.fields["Producto"]
+        campo.queryset = self.productos
+        campo.resolver = self.productos_elegidos
+        return form
 
 @login_required
+@requiere_recurso('ventas')
 def ventas_registrar(request):
-    DetalleFormSet = formset_factory(DetalleVentaForm, extra=1)
-    clientes = Cliente.objects.filter(Activo=True)
+    DetalleFormSet = formset_factory(DetalleVentaForm, formset=BaseDetalleFormSet, extra=1)
+    # La lista para dibujar sale de la caché; la validación sigue consultando la base
+    clientes = obtener_lista("clientes")
     productos = Producto.objects.all()
 
     if request.method == "POST":
         venta_form = VentaForm(request.POST)
-        detalle_formset = DetalleFormSet(request.POST)
+        detalle_formset = DetalleFormSet(request.POST, productos=productos)
 
-        venta_form.fields["Cliente"].queryset = clientes
-        for form in detalle_formset:
-            form.fields["Producto"].queryset = productos
+        venta_form.fields["Cliente"].queryset = Cliente.objects.filter(Activo=True)
 
         if venta_form.is_valid() and detalle_formset.is_valid():
             detalles_data = []
@@ -407,21 +636,11 @@ def ventas_registrar(request):
                             "venta_form": venta_form,
                             "detalle_formset": detalle_formset,
                             "clientes": clientes,
-                            "productos": productos,
                         })
                     detalles_data.append((prod, qty))
 
             try:
-                with transaction.atomic():
-                    venta = venta_form.save()
-                    for prod, qty in detalles_data:
-                        detalle = VentaDetalle(
-                            Venta=venta,
-                            Producto=prod,
-                            CantidadVendida=qty,
-                            PrecioUnitario=prod.Precio
-                        )
-                        detalle.save()
+                registrar_venta(venta_form.save(commit=False), detalles_data)
                 messages.success(request, "Venta registrada correctamente.")
                 return redirect("ventas_lista")
             except ValidationError as e:
@@ -430,103 +649,268 @@ def ventas_registrar(request):
                     "venta_form": venta_form,
                     "detalle_formset": detalle_formset,
                     "clientes": clientes,
-                    "productos": productos,
                 })
         else:
             messages.error(request, "Por favor corrige los errores del formulario.")
 
     else:
         venta_form = VentaForm()
-        detalle_formset = DetalleFormSet()
-        venta_form.fields["Cliente"].queryset = clientes
-        for form in detalle_formset:
-            form.fields["Producto"].queryset = productos
+        detalle_formset = DetalleFormSet(productos=productos)
 
     return render(request, "ventas_registrar.html", {
         "venta_form": venta_form,
         "detalle_formset": detalle_formset,
         "clientes": clientes,
-        "productos": productos,
     })
 
+@solo_lectura
 @login_required
+@requiere_recurso('ventas')
 def ventas_lista(request):
-    ventas = Venta.objects.select_related('Cliente').annotate(
-        total_calculado=Coalesce(
-            Sum(F('detalles__CantidadVendida') * F('detalles__PrecioUnitario')),
-            Value(0.00),
-            output_field=models.DecimalField(max_digits=12, decimal_places=2) 
-        )
-    ).order_by('-Id_Venta')
+    # Venta.Total se mantiene al registrar la venta; no hace falta sumar los detalles
+    ventas = Venta.objects.select_related('Cliente')
+
+    desde = _fecha(request.GET.get('desde'))
+    hasta = _fecha(request.GET.get('hasta'))
+    cliente_id = _entero(request.GET.get('cliente'))
+    if desde:
+        ventas = ventas.filter(Fecha_Venta__gte=desde)
+    if hasta:
+        ventas = ventas.filter(Fecha_Venta__lte=hasta)
+    if cliente_id:
+        ventas = ventas.filter(Cliente_id=cliente_id)
+
+    orden = ORDENES_VENTAS.get(request.GET.get('orden'), ORDENES_VENTAS['id'])
+    pagina = paginar_keyset(request, ventas, orden)
 
     return render(request, "ventas.html", {
-        "ventas": ventas
+        "ventas": pagina,
+        "pagina": pagina,
+        "filtros": request.GET,
     })
 
+@solo_lectura
 @login_required
-def ventas_detalle(request, pk):
-    venta = get_object_or_404(Venta, pk=pk)
-    
-    detalles = venta.detalles.select_related('Producto').all()
+def ventas_exportar(request):
+    # CSV de ventas o de líneas de venta por rango de fechas, enviado en streaming
+    if not request.user.is_superuser:
+        return HttpResponseForbidden()
+
+    tipo = request.GET.get('tipo', 'ventas')
+    if tipo not in EXPORTACIONES:
+        tipo = 'ventas'
+    desde = _fecha(request.GET.get('desde'))
+    hasta = _fecha(request.GET.get('hasta'))
+
+    # El CSV se consulta al enviarse, después de que la vista devolvió la respuesta
+    contenido = conservar_replica(generar_csv(tipo, desde, hasta))
+    nombre = f"{tipo}_{desde or 'inicio'}_{hasta or 'hoy'}.csv"
+    if request.GET.get('gzip') == '1':
+        respuesta = StreamingHttpResponse(comprimir_gzip(contenido), content_type='application/gzip')
+        nombre += '.gz'
+    else:
+        respuesta = StreamingHttpResponse(contenido, content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return respuesta
 
-    return render(request, "ventas_detalle.html", {
-        "venta": venta,
-        "detalles": detalles
+@solo_lectura
+@login_required
+@requiere_recurso('ventas')
+async def ventas_detalle(request, pk):
+    # La venta y sus líneas no dependen una de otra: se consultan a la vez
+    datos = await consultas_concurrentes(
+        venta=Venta.objects.select_related('Cliente').filter(pk=pk).first,
+        detalles=lambda: list(VentaDetalle.objects.filter(Venta_id=pk).select_related('Producto__Marca')),
+    )
+    if datos['venta'] is None:
+        # Las ventas de años archivados ya no están en la base
+        archivada = await sync_to_async(buscar_venta)(pk)
+        if archivada is None:
+            raise Http404("No existe la venta.")
+        return await _render_async(request, "ventas_detalle.html", {
+            "venta": archivada[0],
+            "detalles": archivada[1],
+            "archivada": True,
+        })
+
+    return await _render_async(request, "ventas_detalle.html", {
+        "venta": datos['venta'],
+        "detalles": datos['detalles']
     })
 
+@solo_lectura
 @login_required
-def dashboard(request):
+@requiere_recurso('dashboard')
+async def dashboard(request):
     hoy = timezone.now().date()
     inicio_mes = hoy.replace(day=1)
     hace_7_dias = hoy - timedelta(days=7)
-    
+
+    # Top de productos de la ventana elegida, leído de los contadores diarios
+    periodo = request.GET.get('periodo')
+    if periodo not in VENTANAS:
+        periodo = '30d'
+    desde_top, hasta_top = rango_ventana(periodo, hoy)
+
+    # Las consultas son independientes: se ejecutan a la vez y la página tarda lo que la más lenta
+    datos = await consultas_concurrentes(
+        # Los totales salen del resumen diario: una sola consulta de a lo sumo ~38 filas
+        resumen=partial(resumen_por_dia, min(inicio_mes, hace_7_dias), hoy),
+        # Productos en su punto de reorden: cuenta sobre el índice parcial de StockBajo
+        productos_bajo_stock=Producto.objects.filter(StockBajo=True).count,
+        clientes_activos=Cliente.objects.filter(Activo=True).count,
+        top=partial(top_productos, desde_top, hasta_top, n=5),
+        ultimas_ventas=lambda: list(Venta.objects.select_related('Cliente').order_by('-Id_Venta')[:5]),
+    )
+    resumen = datos['resumen']
+
     # 1. Ventas de Hoy
-    ventas_hoy = Venta.objects.filter(Fecha_Venta=hoy).aggregate(total=Sum('Total'))['total'] or 0
+    ventas_hoy = resumen[hoy].Total if hoy in resumen else 0
     
     # 2. Ventas del Mes
-    ventas_mes = Venta.objects.filter(Fecha_Venta__gte=inicio_mes).aggregate(total=Sum('Total'))['total'] or 0
-    
-    # 3. Productos con Stock Crítico (Menos de 10 unidades)
-    productos_bajo_stock = Producto.objects.filter(Existencia__lte=10).count()
-    
-    # 4. Total de Clientes Activos
-    clientes_activos = Cliente.objects.filter(Activo=True).count()
+    ventas_mes = sum((r.Total for fecha, r in resumen.items() if fecha >= inicio_mes), Decimal('0.00'))
 
     fechas_grafico = []
     montos_grafico = []
 
     for i in range(6, -1, -1):
         fecha = hoy - timedelta(days=i)
-        venta_dia = Venta.objects.filter(Fecha_Venta=fecha).aggregate(total=Sum('Total'))['total'] or 0
+        venta_dia = resumen[fecha].Total if fecha in resumen else 0
         fechas_grafico.append(fecha.strftime('%d/%m'))
         montos_grafico.append(float(venta_dia))
 
-    top_productos_query = (
-        VentaDetalle.objects
-        .values('Producto__NombreProducto')
-        .annotate(total_vendido=Sum('CantidadVendida'))
-        .order_by('-total_vendido')[:5]
-    )
-
     labels_productos = []
     data_productos = []
     
-    for item in top_productos_query:
-        labels_productos.append(item['Producto__NombreProducto'])
-        data_productos.append(item['total_vendido'])
-
-    ultimas_ventas = Venta.objects.select_related('Cliente').order_by('-Id_Venta')[:5]
+    for nombre, unidades in datos['top']:
+        labels_productos.append(nombre)
+        data_productos.append(unidades)
 
     context = {
         'ventas_hoy': ventas_hoy,
         'ventas_mes': ventas_mes,
-        'productos_bajo_stock': productos_bajo_stock,
-        'clientes_activos': clientes_activos,
+        'productos_bajo_stock': datos['productos_bajo_stock'],
+        'clientes_activos': datos['clientes_activos'],
         'fechas_grafico': fechas_grafico,
         'montos_grafico': montos_grafico,
         'labels_productos': labels_productos,
         'data_productos': data_productos,
-        'ultimas_ventas': ultimas_ventas
+        'periodo': periodo,
+        'ultimas_ventas': datos['ultimas_ventas']
     }
 
-    return render(request, 'index.html', context)
\ No newline at end of file
+    return await _render_async(request, 'index.html', context)
+
+
+@solo_lectura
+@login_required
+def reportes_ventas(request):
+    # Ventas por categoría, marca, producto o cliente y por día, semana o mes
+    if not request.user.is_superuser:
+        return HttpResponseForbidden()
+
+    dimension = request.GET.get('dimension')
+    if dimension not in DIMENSIONES:
+        dimension = 'categoria'
+    periodo = request.GET.get('periodo')
+    if periodo not in PERIODOS_REPORTE:
+        periodo = 'mes'
+
+    hasta = _fecha(request.GET.get('hasta')) or timezone.localdate()
+    desde = _fecha(request.GET.get('desde'))
+    if desde is None:
+        desde = desplazar(inicio_periodo(hasta, periodo), periodo, 1 - PERIODOS_REPORTE[periodo])
+    desde, hasta = min(desde, hasta), max(desde, hasta)
+    # Cada periodo es una columna; un rango muy largo se recorta a los últimos periodos
+    if len(periodos_entre(desde, hasta, periodo)) > COLUMNAS_REPORTE:
+        desde = desplazar(inicio_periodo(hasta, periodo), periodo, 1 - COLUMNAS_REPORTE)
+
+    reporte = reporte_ventas(
+        dimension, periodo, desde, hasta,
+        comparar=request.GET.get('comparar') == '1', limite=FILAS_REPORTE,
+    )
+    return render(request, 'reportes_ventas.html', {
+        'reporte': reporte,
+        'dimensiones': list(DIMENSIONES),
+        'periodos': list(PERIODOS_REPORTE),
+    })
+
+@login_required
+def inventario_contencion(request):
+    # Reintentos y esperas por bloqueo de este proceso, para detectar productos "calientes"
+    if not request.user.is_superuser:
+        return HttpResponseForbidden()
+    return JsonResponse(contencion.resumen())
+
+
+def metricas(request):
+    # Formato de texto de Prometheus. Con METRICAS_TOKEN se exige "Authorization: Bearer <token>";
+    # sin él solo un superusuario con sesión puede verlas.
+    token = settings.METRICAS_TOKEN
+    if token:
+        autorizado = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        autorizado = request.user.is_superuser
+    if not autorizado:
+        return HttpResponseForbidden()
+    contenido, tipo = exportar_metricas()
+    return HttpResponse(contenido, content_type=tipo)
+
+
+def _terminal(request):
+    # Nombre de la terminal dueña del token Bearer, o None
+    autorizacion = request.headers.get('Authorization', '')
+    for nombre, token in settings.TERMINALES.items():
+        if constant_time_compare(autorizacion, f'Bearer {token}'):
+            return nombre
+    return None
+
+
+@csrf_exempt
+def terminal_ventas(request):
+    # POST: lote de ventas de una terminal (solo con token). GET: estado de las claves
+    # indicadas en ?claves=, o de las últimas recibidas; también para un superusuario.
+    terminal = _terminal(request)
+    if request.method == 'POST':
+        if terminal is None:
+            return HttpResponseForbidden()
+        try:
+            ventas = json.loads(request.body).get('ventas')
+        except (ValueError, AttributeError):
+            ventas = None
+        if not isinstance(ventas, list):
+            return JsonResponse({'error': 'Se esperaba {"ventas": [...]}.'}, status=400)
+        if len(ventas) > settings.SINCRONIZACION_MAX_VENTAS:
+            return JsonResponse({'error': f'Máximo {settings.SINCRONIZACION_MAX_VENTAS} ventas por lote.'},
+                                status=413)
+        return JsonResponse({'resultados': registrar_lote(terminal, ventas)})
+
+    if terminal is None and not request.user.is_superuser:
+        return HttpResponseForbidden()
+    recibidas = VentaTerminal.objects.order_by('-Recibida')
+    if terminal is not None:
+        recibidas = recibidas.filter(Terminal=terminal)
+    if request.GET.get('claves'):
+        try:
+            claves = [uuid.UUID(clave) for clave in request.GET['claves'].split(',')[:settings.SINCRONIZACION_MAX_VENTAS]]
+        except ValueError:
+            return JsonResponse({'error': 'Clave inválida.'}, status=400)
+        recibidas = recibidas.filter(pk__in=claves)
+    else:
+        recibidas = recibidas[:50]
+    return JsonResponse({'recibidas': [
+        {'clave': str(r.Clave), 'terminal': r.Terminal, 'venta': r.Venta, 'total': str(r.Total),
+         'recibida': r.Recibida.isoformat()}
+        for r in recibidas
+    ]})
+
+
+def terminal_catalogo(request):
+    # Catálogo incremental: ?desde=<cursor de la respuesta anterior>; sin él, el catálogo completo
+    if _terminal(request) is None and not request.user.is_superuser:
+        return HttpResponseForbidden()
+    try:
+        return JsonResponse(catalogo_desde(request.GET.get('desde'),
+                                           _entero(request.GET.get('limite')) or CATALOGO_LIMITE))
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)